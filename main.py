@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from tkb_planner.ui.main_window import MainWindow
 
@@ -10,5 +11,7 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # Cần cho tìm kiếm song song (ProcessPoolExecutor) khi đóng gói thành file .exe trên Windows
+    multiprocessing.freeze_support()
     main()
 
@@ -0,0 +1,317 @@
+"""
+Kiểm tra hồi quy bằng cách đối chiếu với liệt kê vét cạn trên các danh mục nhỏ cố định: mọi cách chọn
+một gói lớp (lớp cùng các lớp ràng buộc) cho mỗi môn, giữ các cách không trùng giờ nhau và không trùng
+giờ bận. Các engine (tuần tự, song song, KhongGianTKB, top-K, Pareto, ràng buộc và bộ lọc) phải cho
+đúng kết quả đó.
+"""
+import random
+import unittest
+from collections import Counter
+from itertools import chain, product
+from unittest import mock
+
+from tkb_planner import parallel_search, scheduler
+from tkb_planner.constraints import BoLocLop, RangBuocTKB
+from tkb_planner.counting import tao_khong_gian_tkb
+from tkb_planner.models import LichBan, LopHoc, MonHoc
+from tkb_planner.parallel_search import iter_mau_thoi_khoa_bieu_song_song
+from tkb_planner.scheduler import iter_mau_thoi_khoa_bieu, iter_thoi_khoa_bieu, kiem_tra_xung_dot_gio
+from tkb_planner.scoring import (
+    TieuChiTKB, cham_diem_tkb, tim_thoi_khoa_bieu_pareto, tim_thoi_khoa_bieu_tot_nhat,
+)
+
+SO_MON = 5
+CAC_SEED = range(8)
+# Giờ bắt đầu các tiết (dùng cho giờ bận)
+GIO_BAT_DAU_TIET = {1: (7, 0), 2: (7, 55), 3: (8, 50), 4: (9, 50), 5: (10, 45), 6: (11, 40),
+                    7: (13, 30), 8: (14, 25), 9: (15, 20), 10: (16, 20)}
+
+
+class _Gio:
+    """Giờ phút tối thiểu thay cho QTime khi tạo LichBan trong kiểm tra"""
+
+    def __init__(self, gio, phut):
+        self._gio = gio
+        self._phut = phut
+
+    def hour(self):
+        return self._gio
+
+    def minute(self):
+        return self._phut
+
+
+def tao_gio_ban(thu, tiet_tu, tiet_den, stt=0):
+    return LichBan(thu, _Gio(*GIO_BAT_DAU_TIET[tiet_tu]), _Gio(*GIO_BAT_DAU_TIET[tiet_den]), "Bận", stt)
+
+
+def tao_danh_muc(seed, so_mon=SO_MON):
+    """
+    so_mon môn trong 6 ngày (thứ 2-7), các lớp trùng giờ nhau nhiều. Khoảng một nửa số môn có lớp
+    Lý thuyết và Bài tập (Bài tập ràng buộc một lớp Lý thuyết), một số lớp có bản sao cùng giờ khác
+    giáo viên để các engine phải gộp thành mẫu TKB.
+    """
+    rng = random.Random(seed)
+    cac_mon = {}
+    for i in range(so_mon):
+        mon = MonHoc(f"M{i}", f"Môn {i}")
+
+        def tao_lop(loai_lop, cac_gio):
+            lop = LopHoc(f"M{i}_{len(mon.cac_lop_hoc)}", f"GV {rng.randint(1, 4)}", mon.ma_mon, mon.ten_mon,
+                         loai_lop=loai_lop)
+            for thu, tiet_tu, tiet_den in cac_gio:
+                lop.them_khung_gio(thu, tiet_tu, tiet_den)
+            mon.them_lop_hoc(lop)
+            return lop
+
+        def gio_ngau_nhien():
+            # Một hoặc hai buổi ở các ngày khác nhau (các buổi của một lớp không trùng giờ nhau)
+            cac_gio = []
+            for thu in rng.sample(range(2, 8), rng.randint(1, 2)):
+                tiet_tu = rng.randint(1, 9)
+                cac_gio.append((thu, tiet_tu, tiet_tu + rng.randint(0, 2)))
+            return cac_gio
+
+        if rng.random() < 0.5:
+            cac_ly_thuyet = [tao_lop("Lý thuyết", gio_ngau_nhien()) for _ in range(rng.randint(1, 2))]
+            for _ in range(rng.randint(2, 3)):
+                tao_lop("Bài tập", gio_ngau_nhien()).lop_rang_buoc.append(rng.choice(cac_ly_thuyet).get_id())
+        else:
+            for _ in range(rng.randint(2, 4)):
+                tao_lop("Lớp", gio_ngau_nhien())
+        for lop in list(mon.cac_lop_hoc):
+            if rng.random() < 0.3:
+                ban_sao = tao_lop(lop.loai_lop, [(gio.thu, gio.tiet_bat_dau, gio.tiet_ket_thuc)
+                                                 for gio in lop.cac_khung_gio])
+                ban_sao.lop_rang_buoc = list(lop.lop_rang_buoc)
+        cac_mon[mon.ma_mon] = mon
+    return cac_mon
+
+
+def tao_danh_muc_rong(so_mon=6, so_lop=6):
+    """Danh mục ít trùng giờ (mỗi lớp một buổi ngắn): hàng chục nghìn mẫu TKB, hàng chục nghìn nút tìm kiếm"""
+    rng = random.Random(0)
+    cac_mon = {}
+    for i in range(so_mon):
+        mon = MonHoc(f"M{i}", f"Môn {i}")
+        for j in range(so_lop):
+            lop = LopHoc(f"M{i}_{j}", f"GV {j}", mon.ma_mon, mon.ten_mon)
+            tiet_tu = rng.randint(1, 10)
+            lop.them_khung_gio(rng.randint(2, 7), tiet_tu, tiet_tu + rng.randint(0, 2))
+            mon.them_lop_hoc(lop)
+        cac_mon[mon.ma_mon] = mon
+    return cac_mon
+
+
+def liet_ke(cac_mon, gio_ban=()):
+    """
+    Liệt kê vét cạn: list các cách chọn hợp lệ, mỗi cách là tuple các gói lớp (tuple LopHoc, lớp chính
+    trước) theo thứ tự môn
+    """
+    theo_id = {lop.get_id(): lop for mon in cac_mon.values() for lop in mon.cac_lop_hoc}
+    cac_gio_ban = [lich_ban.to_thoi_gian_hoc() for lich_ban in gio_ban]
+    cac_goi_theo_mon = []
+    for mon in cac_mon.values():
+        cac_goi = {}
+        for lop in mon.cac_lop_hoc:
+            goi = [lop] + [theo_id[lop_id] for lop_id in lop.lop_rang_buoc if theo_id[lop_id] is not lop]
+            cac_goi.setdefault(frozenset(map(id, goi)), tuple(goi))
+        cac_goi_theo_mon.append(list(cac_goi.values()))
+
+    ket_qua = []
+    for cach_chon in product(*cac_goi_theo_mon):
+        cac_gio = [gio for lop in chain.from_iterable(cach_chon) for gio in lop.cac_khung_gio]
+        if any(kiem_tra_xung_dot_gio(cac_gio[a], cac_gio[b])
+               for a in range(len(cac_gio)) for b in range(a + 1, len(cac_gio))):
+            continue
+        if any(kiem_tra_xung_dot_gio(gio, gio_ban) for gio in cac_gio for gio_ban in cac_gio_ban):
+            continue
+        ket_qua.append(cach_chon)
+    return ket_qua
+
+
+def _tkb(cach_chon):
+    return tuple(chain.from_iterable(cach_chon))
+
+
+def _tap_lop(tkb):
+    return frozenset(id(lop) for lop in tkb)
+
+
+def _khoa_mau(cach_chon):
+    """Các TKB cùng mẫu (chỉ khác giáo viên/phòng) có cùng các tiết học của từng môn"""
+    return tuple(frozenset((gio.thu, tiet) for lop in goi for gio in lop.cac_khung_gio
+                           for tiet in range(gio.tiet_bat_dau, gio.tiet_ket_thuc + 1))
+                 for goi in cach_chon)
+
+
+def _thoa_rang_buoc(tkb, rang_buoc):
+    """Kiểm tra RangBuocTKB trực tiếp trên các khung giờ của TKB"""
+    cac_tiet = {(gio.thu, tiet) for lop in tkb for gio in lop.cac_khung_gio
+                for tiet in range(gio.tiet_bat_dau, gio.tiet_ket_thuc + 1)}
+    cac_ngay = {thu for thu, _ in cac_tiet}
+    if cac_ngay & set(rang_buoc.ngay_nghi):
+        return False
+    if rang_buoc.tiet_ket_thuc_toi_da is not None and any(tiet > rang_buoc.tiet_ket_thuc_toi_da
+                                                          for _, tiet in cac_tiet):
+        return False
+    if any(tiet in rang_buoc.tiet_nghi for _, tiet in cac_tiet):
+        return False
+    if rang_buoc.so_ngay_toi_da is not None and len(cac_ngay) > rang_buoc.so_ngay_toi_da:
+        return False
+    if rang_buoc.so_tiet_lien_tiep_toi_da is not None:
+        for thu, tiet in cac_tiet:
+            if (thu, tiet - 1) not in cac_tiet:
+                do_dai = 1
+                while (thu, tiet + do_dai) in cac_tiet:
+                    do_dai += 1
+                if do_dai > rang_buoc.so_tiet_lien_tiep_toi_da:
+                    return False
+    return True
+
+
+class _DoiChieu(unittest.TestCase):
+    def setUp(self):
+        # Cache tra lớp theo ID nhận diện danh mục bằng object, không để danh mục của lần chạy trước lẫn vào
+        scheduler.clear_lop_id_cache()
+        self.cac_danh_muc = [tao_danh_muc(seed) for seed in CAC_SEED]
+
+    def cac_truong_hop(self):
+        """(seed, danh mục, giờ bận, môn bắt buộc) cho mọi danh mục, có và không có giờ bận"""
+        for seed, cac_mon in zip(CAC_SEED, self.cac_danh_muc):
+            yield seed, cac_mon, [], []
+            yield seed, cac_mon, [tao_gio_ban(3, 1, 2), tao_gio_ban(5, 9, 10, 1)], ["M0", "M3"]
+
+
+class TestLietKe(_DoiChieu):
+    def test_iter_thoi_khoa_bieu(self):
+        tong = 0
+        for seed, cac_mon, gio_ban, bat_buoc in self.cac_truong_hop():
+            with self.subTest(seed=seed, gio_ban=len(gio_ban)):
+                mong_doi = Counter(_tap_lop(_tkb(cach_chon)) for cach_chon in liet_ke(cac_mon, gio_ban))
+                thuc_te = Counter(map(_tap_lop, iter_thoi_khoa_bieu(list(cac_mon.values()), gio_ban, bat_buoc,
+                                                                    all_courses=cac_mon)))
+                self.assertEqual(thuc_te, mong_doi)
+                tong += len(mong_doi)
+        # Điều kiện của bộ dữ liệu: đủ TKB để phép đối chiếu có ý nghĩa
+        self.assertGreater(tong, 100)
+
+    def test_khong_gian_giong_thu_tu_tim_kiem(self):
+        for seed, cac_mon, gio_ban, bat_buoc in self.cac_truong_hop():
+            with self.subTest(seed=seed, gio_ban=len(gio_ban)):
+                chon = list(cac_mon.values())
+                cac_tkb = list(iter_thoi_khoa_bieu(chon, gio_ban, bat_buoc, all_courses=cac_mon))
+                so_mau = sum(1 for _ in iter_mau_thoi_khoa_bieu(chon, gio_ban, bat_buoc, all_courses=cac_mon))
+                khong_gian = tao_khong_gian_tkb(chon, gio_ban, bat_buoc, all_courses=cac_mon)
+                self.assertEqual((khong_gian.so_mau, khong_gian.so_tkb), (so_mau, len(cac_tkb)))
+                self.assertEqual([tuple(khong_gian[k]) for k in range(khong_gian.so_tkb)], cac_tkb)
+                if cac_tkb:
+                    self.assertEqual(tuple(khong_gian[-1]), cac_tkb[-1])
+
+    def _so_sanh_song_song(self, cac_mon, gio_ban, bat_buoc):
+        def ma_hoa(mau):
+            return tuple(tuple(tuple(map(id, phuong_an)) for phuong_an in o) for o in mau.cac_o)
+
+        chon = list(cac_mon.values())
+        tuan_tu = [ma_hoa(mau) for mau in iter_mau_thoi_khoa_bieu(chon, gio_ban, bat_buoc, all_courses=cac_mon)]
+        song_song = [ma_hoa(mau) for mau in iter_mau_thoi_khoa_bieu_song_song(
+            chon, gio_ban, bat_buoc, all_courses=cac_mon, so_tien_trinh=2)]
+        # Không so sánh cả list bằng assertEqual: diff của hàng chục nghìn mẫu rất chậm
+        self.assertEqual(len(song_song), len(tuan_tu))
+        lech = next((k for k, (a, b) in enumerate(zip(song_song, tuan_tu)) if a != b), None)
+        self.assertIsNone(lech, "Kết quả song song khác thứ tự tìm tuần tự")
+
+    def test_song_song_giong_tuan_tu(self):
+        # Danh mục nhỏ vẫn chạy song song. Ngân sách nút chỉ được kiểm tra mỗi _CHU_KY_KIEM_TRA nút nên
+        # danh mục nhỏ chỉ thử phần chia việc ban đầu; danh mục rộng không chia trước (_DO_SAU_CHIA = 0)
+        # buộc tiến trình con hết ngân sách và trả phần còn lại để chia tiếp
+        with mock.patch.object(parallel_search, "PARALLEL_MIN_COURSES", 2), \
+                mock.patch.object(parallel_search, "_NGAN_SACH_NUT", 1):
+            for seed, cac_mon, gio_ban, bat_buoc in self.cac_truong_hop():
+                if seed not in (0, 5):
+                    continue  # Mỗi lượt tìm song song tạo process pool mới, chỉ chạy vài danh mục có TKB
+                with self.subTest(seed=seed, gio_ban=len(gio_ban)):
+                    self._so_sanh_song_song(cac_mon, gio_ban, bat_buoc)
+            with self.subTest(danh_muc="rộng"), mock.patch.object(parallel_search, "_DO_SAU_CHIA", 0):
+                self._so_sanh_song_song(tao_danh_muc_rong(), [], [])
+
+
+class TestRangBuocVaBoLoc(_DoiChieu):
+    def test_rang_buoc_giong_loc_sau(self):
+        cac_rang_buoc = (RangBuocTKB(ngay_nghi=(5,)), RangBuocTKB(tiet_ket_thuc_toi_da=8),
+                         RangBuocTKB(tiet_nghi=(6,)), RangBuocTKB(so_ngay_toi_da=3),
+                         RangBuocTKB(so_tiet_lien_tiep_toi_da=3))
+        for seed, cac_mon, gio_ban, bat_buoc in self.cac_truong_hop():
+            cac_tkb = [_tkb(cach_chon) for cach_chon in liet_ke(cac_mon, gio_ban)]
+            for rang_buoc in cac_rang_buoc:
+                with self.subTest(seed=seed, gio_ban=len(gio_ban), rang_buoc=rang_buoc.mo_ta()):
+                    mong_doi = Counter(_tap_lop(tkb) for tkb in cac_tkb if _thoa_rang_buoc(tkb, rang_buoc))
+                    thuc_te = Counter(map(_tap_lop, iter_thoi_khoa_bieu(
+                        list(cac_mon.values()), gio_ban, bat_buoc, all_courses=cac_mon, rang_buoc=rang_buoc)))
+                    self.assertEqual(thuc_te, mong_doi)
+
+    def test_bo_loc_giong_loc_sau(self):
+        for seed, cac_mon, gio_ban, bat_buoc in self.cac_truong_hop():
+            cac_bo_loc = (BoLocLop(giao_vien_loai_tru=["GV 1"]), BoLocLop(loai_lop=["Lớp", "Bài tập"]),
+                          BoLocLop(khung_tiet=(2, 8)), BoLocLop(chi_giao_vien={"M1": ["GV 2", "GV 3"]}),
+                          BoLocLop(chi_lop={"M2": [cac_mon["M2"].cac_lop_hoc[-1].get_id()]}))
+            cac_cach_chon = liet_ke(cac_mon, gio_ban)
+            for bo_loc in cac_bo_loc:
+                with self.subTest(seed=seed, gio_ban=len(gio_ban), bo_loc=bo_loc.mo_ta()):
+                    mong_doi = Counter(_tap_lop(_tkb(cach_chon)) for cach_chon in cac_cach_chon
+                                       if all(map(bo_loc.nhan_goi, cach_chon)))
+                    thuc_te = Counter(map(_tap_lop, iter_thoi_khoa_bieu(
+                        list(cac_mon.values()), gio_ban, bat_buoc, all_courses=cac_mon, bo_loc=bo_loc)))
+                    self.assertEqual(thuc_te, mong_doi)
+
+
+class TestTopKVaPareto(_DoiChieu):
+    TIEU_CHI = TieuChiTKB(so_ngay=2.0, tiet_trong=1.0, ket_thuc_muon=0.5, bat_dau_som=0.25, giao_vien=1.0,
+                          giao_vien_uu_tien=["GV 1"], giao_vien_tranh=["GV 4"])
+
+    def test_top_k_giong_vet_can(self):
+        for seed, cac_mon, gio_ban, bat_buoc in self.cac_truong_hop():
+            cac_cach_chon = liet_ke(cac_mon, gio_ban)
+            hop_le = {_tap_lop(_tkb(cach_chon)) for cach_chon in cac_cach_chon}
+            # Mỗi mẫu chỉ được đại diện bởi TKB có điểm tốt nhất
+            diem_theo_mau = {}
+            for cach_chon in cac_cach_chon:
+                diem = cham_diem_tkb(_tkb(cach_chon), self.TIEU_CHI)[0]
+                khoa = _khoa_mau(cach_chon)
+                diem_theo_mau[khoa] = min(diem, diem_theo_mau.get(khoa, diem))
+            for so_luong in (1, 5, 1000):
+                with self.subTest(seed=seed, gio_ban=len(gio_ban), so_luong=so_luong):
+                    ket_qua, loi, _ = tim_thoi_khoa_bieu_tot_nhat(list(cac_mon.values()), gio_ban, bat_buoc,
+                                                                  all_courses=cac_mon, tieu_chi=self.TIEU_CHI,
+                                                                  so_luong=so_luong)
+                    if not hop_le:
+                        self.assertEqual(ket_qua, [])
+                        continue
+                    self.assertIsNone(loi)
+                    self.assertTrue(all(_tap_lop(tkb) in hop_le for tkb in ket_qua))
+                    self.assertEqual([cham_diem_tkb(tkb, self.TIEU_CHI)[0] for tkb in ket_qua],
+                                     sorted(diem_theo_mau.values())[:so_luong])
+
+    def test_pareto_giong_vet_can(self):
+        for seed, cac_mon, gio_ban, bat_buoc in self.cac_truong_hop():
+            cac_tkb = [_tkb(cach_chon) for cach_chon in liet_ke(cac_mon, gio_ban)]
+            hop_le = set(map(_tap_lop, cac_tkb))
+            for chi_so in (('so_ngay', 'tiet_trong', 'ket_thuc_muon'), ('so_ngay', 'giao_vien'),
+                           ('bat_dau_som', 'ket_thuc_muon')):
+                with self.subTest(seed=seed, gio_ban=len(gio_ban), chi_so=chi_so):
+                    cac_vec = {tuple(cham_diem_tkb(tkb, self.TIEU_CHI)[1][ten] for ten in chi_so)
+                               for tkb in cac_tkb}
+                    bien = {vec for vec in cac_vec
+                            if not any(khac != vec and all(a <= b for a, b in zip(khac, vec)) for khac in cac_vec)}
+                    ket_qua, _, _ = tim_thoi_khoa_bieu_pareto(list(cac_mon.values()), gio_ban, bat_buoc,
+                                                              all_courses=cac_mon, chi_so=chi_so,
+                                                              tieu_chi=self.TIEU_CHI)
+                    self.assertTrue(all(_tap_lop(tkb) in hop_le for tkb in ket_qua))
+                    vec_ket_qua = [tuple(cham_diem_tkb(tkb, self.TIEU_CHI)[1][ten] for ten in chi_so)
+                                   for tkb in ket_qua]
+                    self.assertEqual(len(vec_ket_qua), len(set(vec_ket_qua)))
+                    self.assertEqual(set(vec_ket_qua), bien)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Kiểm tra hồi quy cho ràng buộc lớp chéo môn: cùng một tập lớp đến được qua nhiều nhánh tìm kiếm
+(lớp vừa được môn của nó chọn, vừa được thêm qua ràng buộc của môn khác).
+"""
+import unittest
+from collections import Counter
+from unittest import mock
+
+from tkb_planner import counting
+from tkb_planner.constraints import BoLocLop
+from tkb_planner.counting import lay_mau_thoi_khoa_bieu, tao_khong_gian_tkb
+from tkb_planner.models import LopHoc, MonHoc
+from tkb_planner.refinement import loc_ket_qua
+from tkb_planner.scheduler import DanhSachTKB, iter_mau_thoi_khoa_bieu, iter_thoi_khoa_bieu, tim_thoi_khoa_bieu
+from tkb_planner.scoring import tim_thoi_khoa_bieu_tot_nhat
+
+
+def _tap_lop(tkb):
+    return frozenset(id(lop) for lop in tkb)
+
+
+def _tao_ba_mon():
+    """Ba môn A, B, C mỗi môn hai lớp (A1, A2, ...) không trùng giờ, mỗi lớp một giáo viên riêng"""
+    cac_mon = {}
+    for ma_mon, thu in (("A", 2), ("B", 3), ("C", 4)):
+        mon = MonHoc(ma_mon, f"Môn {ma_mon}")
+        for k in (1, 2):
+            lop = LopHoc(f"{ma_mon}{k}", f"GV {ma_mon}{k}", ma_mon, mon.ten_mon)
+            lop.them_khung_gio(thu, 3 * k, 3 * k + 1)
+            mon.them_lop_hoc(lop)
+        cac_mon[ma_mon] = mon
+    return cac_mon
+
+
+def tao_danh_muc():
+    """
+    Lớp B1 ràng buộc A2 và lớp C1 ràng buộc A1. Tập {A1, A2, B1, C1} đến được qua hai nhánh
+    (A chọn A1 hoặc A2), nên engine liệt kê 8 TKB nhưng chỉ có 7 TKB khác nhau.
+    """
+    cac_mon = _tao_ba_mon()
+    a1, a2 = cac_mon["A"].cac_lop_hoc
+    cac_mon["B"].cac_lop_hoc[0].lop_rang_buoc.append(a2.get_id())
+    cac_mon["C"].cac_lop_hoc[0].lop_rang_buoc.append(a1.get_id())
+    return cac_mon
+
+
+def tao_danh_muc_loc():
+    """
+    Lớp B1 ràng buộc A2, lớp C1 ràng buộc cả A1 và A2. Khi A1 đã có trong lịch, ô của gói C1 chỉ
+    còn (C1, A2) và khi A2 đã có thì ô của gói B1 chỉ còn (B1,), trong khi engine lọc trên cả gói.
+    """
+    cac_mon = _tao_ba_mon()
+    a1, a2 = cac_mon["A"].cac_lop_hoc
+    cac_mon["B"].cac_lop_hoc[0].lop_rang_buoc.append(a2.get_id())
+    cac_mon["C"].cac_lop_hoc[0].lop_rang_buoc.extend([a1.get_id(), a2.get_id()])
+    return cac_mon
+
+
+class TestRangBuocCheoMon(unittest.TestCase):
+    def setUp(self):
+        self.cac_mon = tao_danh_muc()
+        self.chon = list(self.cac_mon.values())
+        cac_tkb = list(iter_thoi_khoa_bieu(self.chon, [], [], all_courses=self.cac_mon))
+        self.khac_nhau = set(map(_tap_lop, cac_tkb))
+        # Điều kiện của bộ dữ liệu: engine thật sự gặp TKB trùng
+        self.assertEqual((len(cac_tkb), len(self.khac_nhau)), (8, 7))
+
+    def test_khong_gian_bao_co_the_trung(self):
+        khong_gian = tao_khong_gian_tkb(self.chon, [], [], all_courses=self.cac_mon)
+        self.assertTrue(khong_gian.co_the_trung)
+        self.assertGreaterEqual(len(khong_gian), len(self.khac_nhau))
+        self.assertEqual(set(map(_tap_lop, khong_gian.cac_tkb_khac_nhau())), self.khac_nhau)
+
+    def test_canh_bao_tong_so_la_can_tren(self):
+        ket_qua, _, canh_bao = tim_thoi_khoa_bieu(self.chon, [], [], all_courses=self.cac_mon, max_results=3)
+        self.assertEqual(ket_qua.so_mau, 3)
+        self.assertIn("tối đa", canh_bao)
+
+    def test_lay_mau_khong_trung(self):
+        for so_luong in (1, 3, 6, 7, 20):
+            ket_qua, loi, _ = lay_mau_thoi_khoa_bieu(self.chon, [], [], all_courses=self.cac_mon,
+                                                      so_luong=so_luong, seed=so_luong)
+            self.assertIsNone(loi)
+            cac_tap = [_tap_lop(tkb) for tkb in ket_qua]
+            self.assertEqual(len(cac_tap), len(set(cac_tap)))
+            self.assertEqual(len(cac_tap), min(so_luong, len(self.khac_nhau)))
+            self.assertTrue(set(cac_tap) <= self.khac_nhau)
+
+    def test_lay_mau_deu_tren_tkb_khac_nhau(self):
+        khong_gian = tao_khong_gian_tkb(self.chon, [], [], all_courses=self.cac_mon)
+        # TKB lặp lại hai lần trong không gian không được rút trúng nhiều gấp đôi
+        so_lan = [khong_gian._bo_dem.so_lan_lap(tkb) for tkb in khong_gian]
+        self.assertEqual(sorted(so_lan), [1] * 6 + [2, 2])
+        dem = Counter()
+        # Không gian nhỏ được liệt kê hết, ép dùng cách rút rồi loại như với không gian lớn
+        with mock.patch.object(counting, "_HE_SO_LIET_KE", 0):
+            for seed in range(7000):
+                for tkb in khong_gian.lay_mau(1, seed=seed):
+                    dem[_tap_lop(tkb)] += 1
+        self.assertEqual(set(dem), self.khac_nhau)
+        self.assertLess(max(dem.values()), 1.25 * min(dem.values()))
+
+    def test_tot_nhat_khong_trung(self):
+        for so_luong in (1, 7, 20):
+            ket_qua, loi, _ = tim_thoi_khoa_bieu_tot_nhat(self.chon, [], [], all_courses=self.cac_mon,
+                                                          so_luong=so_luong)
+            self.assertIsNone(loi)
+            cac_tap = [_tap_lop(tkb) for tkb in ket_qua]
+            self.assertEqual(len(cac_tap), len(set(cac_tap)))
+            self.assertEqual(len(cac_tap), min(so_luong, len(self.khac_nhau)))
+
+
+
+class TestLocKetQua(unittest.TestCase):
+    def test_loc_giong_tim_lai(self):
+        cac_mon = tao_danh_muc_loc()
+        chon = list(cac_mon.values())
+        ket_qua = DanhSachTKB(iter_mau_thoi_khoa_bieu(chon, [], [], all_courses=cac_mon))
+        # Các bộ lọc giữ nguyên thứ tự môn của engine (A vẫn xếp đầu), xem refinement.py
+        for bo_loc in (BoLocLop(chi_giao_vien={"A": ["GV A1"]}),
+                       BoLocLop(giao_vien_loai_tru=["GV A2"]),
+                       BoLocLop(chi_lop={"A": [cac_mon["A"].cac_lop_hoc[0].get_id()]})):
+            with self.subTest(bo_loc=bo_loc.mo_ta()):
+                tim_lai = DanhSachTKB(iter_mau_thoi_khoa_bieu(chon, [], [], all_courses=cac_mon, bo_loc=bo_loc))
+                self.assertEqual(set(map(_tap_lop, loc_ket_qua(ket_qua, bo_loc=bo_loc))),
+                                 set(map(_tap_lop, tim_lai)))
+
+
+if __name__ == "__main__":
+    unittest.main()
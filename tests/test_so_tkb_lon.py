@@ -0,0 +1,103 @@
+"""
+Kiểm tra hồi quy cho không gian TKB rất lớn: số TKB cụ thể (tích các lớp cùng giờ của các môn) vượt quá
+sys.maxsize và cả 64 bit, nhưng vẫn phải đếm, truy cập và lọc được như số nguyên Python.
+"""
+import sys
+import unittest
+
+from tkb_planner.constraints import BoLocLop
+from tkb_planner.counting import dem_thoi_khoa_bieu, lay_mau_thoi_khoa_bieu, tao_khong_gian_tkb
+from tkb_planner.models import LopHoc, MonHoc
+from tkb_planner.refinement import loc_ket_qua
+from tkb_planner.scheduler import tim_thoi_khoa_bieu
+
+# 14 môn x 24 lớp cùng giờ: 24**14 > 2**64 TKB cụ thể trong một mẫu
+SO_MON = 14
+SO_LOP = 24
+
+
+def tao_danh_muc(them_mon_hai_gio=True):
+    """
+    SO_MON môn, mỗi môn SO_LOP lớp cùng giờ khác giáo viên; thêm môn X có hai lớp khác giờ để có hai mẫu
+    (lớp X1 rơi vào một ngày đã có lớp nên mẫu thứ hai ít ngày hơn)
+    """
+    cac_mon = {}
+    for i in range(SO_MON):
+        mon = MonHoc(f"M{i}", f"Môn {i}")
+        for j in range(SO_LOP):
+            lop = LopHoc(f"M{i}_{j}", f"GV {j}", mon.ma_mon, mon.ten_mon)
+            lop.them_khung_gio(2 + i % 6, 1 + i // 6 * 2, 1 + i // 6 * 2)
+            mon.them_lop_hoc(lop)
+        cac_mon[mon.ma_mon] = mon
+    if them_mon_hai_gio:
+        mon = MonHoc("X", "Môn X")
+        for j, thu in enumerate((8, 7)):
+            lop = LopHoc(f"X{j}", "GV X", "X", mon.ten_mon)
+            lop.them_khung_gio(thu, 10, 10)
+            mon.them_lop_hoc(lop)
+        cac_mon["X"] = mon
+    return cac_mon
+
+
+class TestSoTKBLon(unittest.TestCase):
+    def setUp(self):
+        self.cac_mon = tao_danh_muc()
+        self.ket_qua, error_msg, _ = tim_thoi_khoa_bieu(list(self.cac_mon.values()), [], [],
+                                                        all_courses=self.cac_mon)
+        self.assertIsNone(error_msg)
+
+    def test_dem_va_truy_cap(self):
+        ket_qua = self.ket_qua
+        self.assertEqual(ket_qua.so_mau, 2)
+        self.assertEqual(ket_qua.so_tkb, 2 * SO_LOP ** SO_MON)
+        self.assertEqual(ket_qua.mau_thu(0).so_tkb, SO_LOP ** SO_MON)
+        # len() chỉ nhận số nguyên cỡ C nên bị chặn
+        self.assertEqual(len(ket_qua), sys.maxsize)
+        # TKB đầu của mẫu thứ hai (chỉ số vượt 64 bit) và TKB cuối cùng
+        tkb = ket_qua[SO_LOP ** SO_MON]
+        self.assertIn("X1", [lop.ma_lop for lop in tkb])
+        self.assertTrue(all(lop.ma_lop.endswith(f"_{SO_LOP - 1}") for lop in ket_qua[-1] if lop.ma_mon != "X"))
+
+    def test_loc_ket_qua(self):
+        da_loc = loc_ket_qua(self.ket_qua, bo_loc=BoLocLop(chi_giao_vien={"M0": ["GV 1"]}))
+        self.assertEqual(da_loc.so_tkb, 2 * SO_LOP ** (SO_MON - 1))
+        sap_xep = loc_ket_qua(self.ket_qua, sap_xep_theo=('so_ngay',))
+        self.assertEqual(sap_xep.so_tkb, self.ket_qua.so_tkb)
+        self.assertEqual(list(sap_xep[SO_LOP ** SO_MON]), list(self.ket_qua[0]))
+
+    def test_khong_gian(self):
+        khong_gian = tao_khong_gian_tkb(list(self.cac_mon.values()), [], [], all_courses=self.cac_mon)
+        self.assertEqual(khong_gian.so_mau, 2)
+        self.assertEqual(khong_gian.so_tkb, self.ket_qua.so_tkb)
+        self.assertEqual(len(khong_gian), sys.maxsize)
+        for k in (0, SO_LOP ** SO_MON - 1, SO_LOP ** SO_MON, khong_gian.so_tkb - 1):
+            self.assertEqual(list(khong_gian[k]), list(self.ket_qua[k]))
+
+    def test_dem(self):
+        self.assertEqual(dem_thoi_khoa_bieu(list(self.cac_mon.values()), [], [], all_courses=self.cac_mon),
+                         (2, 2 * SO_LOP ** SO_MON))
+
+    def test_lay_mau(self):
+        cac_mon = list(self.cac_mon.values())
+        ket_qua, error_msg, warning_msg = lay_mau_thoi_khoa_bieu(cac_mon, [], [], all_courses=self.cac_mon,
+                                                                 so_luong=20, seed=1)
+        self.assertIsNone(error_msg)
+        self.assertIn(f"{2 * SO_LOP ** SO_MON:,}", warning_msg)
+        self.assertEqual(len(ket_qua), 20)
+        self.assertEqual(len({frozenset(lop.ma_lop for lop in tkb) for tkb in ket_qua}), 20)
+        self.assertTrue(all(len(tkb) == SO_MON + 1 for tkb in ket_qua))
+        # Cùng seed cho cùng kết quả
+        lai, _, _ = lay_mau_thoi_khoa_bieu(cac_mon, [], [], all_courses=self.cac_mon, so_luong=20, seed=1)
+        self.assertEqual([list(tkb) for tkb in lai], [list(tkb) for tkb in ket_qua])
+
+    def test_canh_bao_khi_cat_bot(self):
+        # Chỉ lấy một mẫu: tổng số trong cảnh báo là số chính xác từ KhongGianTKB
+        ket_qua, error_msg, warning_msg = tim_thoi_khoa_bieu(list(self.cac_mon.values()), [], [],
+                                                             all_courses=self.cac_mon, max_results=1)
+        self.assertIsNone(error_msg)
+        self.assertEqual(ket_qua.so_mau, 1)
+        self.assertIn(f"{2 * SO_LOP ** SO_MON:,}", warning_msg)
+
+
+if __name__ == "__main__":
+    unittest.main()
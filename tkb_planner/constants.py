@@ -31,7 +31,33 @@ MAX_COURSES = 15
 
 # Giới hạn số lượng TKB tối đa có thể tìm được (để tránh treo ứng dụng)
 MAX_RESULTS = 1000
+# Giới hạn trên khi người dùng tự nâng giới hạn số TKB (TKB → Giới hạn số TKB...). Kết quả được lưu gọn
+# dưới dạng chỉ số (DanhSachTKB) nên 1 triệu mẫu TKB chỉ tốn vài chục MB
+MAX_RESULTS_LIMIT = 1000000
+
+# Số TKB tốt nhất lấy ra khi tìm theo điểm (scoring.tim_thoi_khoa_bieu_tot_nhat)
+TOP_K_RESULTS = 20
 
 # Timeout cho quá trình tìm kiếm TKB (giây)
 SEARCH_TIMEOUT = 30
 
+# Thời gian tối đa (giây) để đếm chính xác tổng số TKB khi kết quả tìm kiếm bị cắt bớt
+COUNT_TIMEOUT = 2
+
+# Thời gian tối đa (giây) để tự động giải thích vì sao không có TKB nào (diagnosis.giai_thich_khong_co_tkb)
+DIAGNOSIS_TIMEOUT = 1
+
+# Số trạng thái không có TKB (nogood) tối đa được nhớ trong một lượt tìm kiếm (bỏ trạng thái lâu không dùng nhất khi đầy)
+NOGOOD_CACHE_SIZE = 100000
+
+# Bộ nhớ đệm kết quả tìm TKB (search_cache.py): thư mục đặt cạnh DATA_FILE, dung lượng tối đa (byte)
+# của tầng trong bộ nhớ và tầng trên đĩa (bỏ kết quả lâu không dùng nhất khi vượt)
+SEARCH_CACHE_DIR = "tkb_cache"
+SEARCH_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+SEARCH_CACHE_DISK_BYTES = 256 * 1024 * 1024
+
+# Số tiến trình tìm kiếm song song (None = số nhân CPU)
+PARALLEL_WORKERS = None
+# Chỉ tìm song song khi chọn từ số môn này trở lên (ít môn thì tìm tuần tự nhanh hơn chi phí tạo tiến trình)
+PARALLEL_MIN_COURSES = 6
+
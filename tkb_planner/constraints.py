@@ -0,0 +1,219 @@
+"""
+Ràng buộc hình dạng thời khóa biểu (ví dụ "không học Thứ 7/Chủ Nhật", "kết thúc trước tiết 10",
+"tối đa 4 ngày", "không quá 5 tiết liên tiếp", "để trống tiết 6") và bộ lọc lớp cho một lượt tìm
+kiếm (ví dụ "bỏ giáo viên X", "chỉ phòng nhà A", "chỉ các lớp bắt đầu từ tiết 4").
+
+Ràng buộc được biên dịch sang bitmask tuần của engine:
+- Các tiết bị cấm (ngày nghỉ, tiết sau tiết kết thúc muộn nhất, tiết nghỉ) được coi như giờ bận,
+  nên gói lớp chạm vào chúng bị loại khỏi miền ngay từ đầu.
+- Số ngày và số tiết liên tiếp phụ thuộc vào cả lịch đang xếp, được kiểm tra ngay khi xếp mỗi
+  gói lớp (cắt nhánh vi phạm) thay vì lọc kết quả sau khi tìm xong.
+
+Bộ lọc lớp được áp dụng một lần khi biên dịch gói lớp, trước khi tìm kiếm: gói có lớp bị loại
+không bao giờ vào miền ứng viên, nên không cần xóa lớp khỏi dữ liệu chung để có hiệu ứng này.
+"""
+from .constants import MIN_THU, MAX_THU, MIN_TIET, MAX_TIET, TEN_THU_TRONG_TUAN
+from .errors import ValidationError
+from .models import chuan_hoa_ten_giao_vien
+from .scheduler import _SO_BIT_MOI_NGAY
+
+_SO_NGAY = MAX_THU - MIN_THU + 1
+_MASK_MOT_NGAY = (1 << _SO_BIT_MOI_NGAY) - 1
+# Bitmask từng ngày trong tuần
+_MASK_NGAY = tuple(_MASK_MOT_NGAY << (d * _SO_BIT_MOI_NGAY) for d in range(_SO_NGAY))
+# Tất cả các bit trừ tiết cuối của mỗi ngày (chuỗi tiết liên tiếp không nối sang ngày sau)
+_KHONG_CUOI_NGAY = sum(_MASK_NGAY) & ~sum(1 << ((d + 1) * _SO_BIT_MOI_NGAY - 1) for d in range(_SO_NGAY))
+
+
+class RangBuocTKB:
+    """
+    Các ràng buộc cứng về hình dạng TKB (None / rỗng = không ràng buộc):
+    - ngay_nghi: các thứ không được có lớp (MIN_THU..MAX_THU, ví dụ (7, 8) = Thứ 7 và Chủ Nhật)
+    - tiet_ket_thuc_toi_da: tiết kết thúc muộn nhất được phép (ví dụ 9 = kết thúc trước tiết 10)
+    - tiet_nghi: các tiết phải để trống ở mọi ngày (ví dụ (6,) = nghỉ trưa tiết 6)
+    - so_ngay_toi_da: số ngày lên trường tối đa trong tuần
+    - so_tiet_lien_tiep_toi_da: số tiết học liên tiếp tối đa trong một ngày
+    """
+
+    def __init__(self, ngay_nghi=(), tiet_ket_thuc_toi_da=None, tiet_nghi=(), so_ngay_toi_da=None,
+                 so_tiet_lien_tiep_toi_da=None):
+        for thu in ngay_nghi:
+            if not (MIN_THU <= thu <= MAX_THU):
+                raise ValidationError(f"Thứ phải từ {MIN_THU}-{MAX_THU}, nhận được: {thu}")
+        for tiet in tiet_nghi:
+            if not (MIN_TIET <= tiet <= MAX_TIET):
+                raise ValidationError(f"Tiết phải từ {MIN_TIET}-{MAX_TIET}, nhận được: {tiet}")
+        if tiet_ket_thuc_toi_da is not None and not (MIN_TIET <= tiet_ket_thuc_toi_da <= MAX_TIET):
+            raise ValidationError(f"Tiết kết thúc phải từ {MIN_TIET}-{MAX_TIET}, nhận được: {tiet_ket_thuc_toi_da}")
+        if so_ngay_toi_da is not None and not (1 <= so_ngay_toi_da <= _SO_NGAY):
+            raise ValidationError(f"Số ngày tối đa phải từ 1-{_SO_NGAY}, nhận được: {so_ngay_toi_da}")
+        if so_tiet_lien_tiep_toi_da is not None and not (1 <= so_tiet_lien_tiep_toi_da <= _SO_BIT_MOI_NGAY):
+            raise ValidationError(
+                f"Số tiết liên tiếp tối đa phải từ 1-{_SO_BIT_MOI_NGAY}, nhận được: {so_tiet_lien_tiep_toi_da}")
+
+        self.ngay_nghi = tuple(sorted(set(ngay_nghi)))
+        self.tiet_ket_thuc_toi_da = tiet_ket_thuc_toi_da
+        self.tiet_nghi = tuple(sorted(set(tiet_nghi)))
+        self.so_ngay_toi_da = so_ngay_toi_da
+        self.so_tiet_lien_tiep_toi_da = so_tiet_lien_tiep_toi_da
+
+        # Các tiết bị cấm trong tuần (engine coi như giờ bận)
+        mot_ngay = 0
+        for tiet in self.tiet_nghi:
+            mot_ngay |= 1 << (tiet - MIN_TIET)
+        if tiet_ket_thuc_toi_da is not None:
+            mot_ngay |= _MASK_MOT_NGAY & ~((1 << (tiet_ket_thuc_toi_da - MIN_TIET + 1)) - 1)
+        self.mask_cam = 0
+        for d in range(_SO_NGAY):
+            if MIN_THU + d in self.ngay_nghi:
+                self.mask_cam |= _MASK_NGAY[d]
+            else:
+                self.mask_cam |= mot_ngay << (d * _SO_BIT_MOI_NGAY)
+
+        # Ràng buộc phụ thuộc vào lịch đang xếp (phải kiểm tra ở mỗi bước xếp gói lớp)
+        self.co_trang_thai = so_ngay_toi_da is not None or so_tiet_lien_tiep_toi_da is not None
+
+    def __bool__(self):
+        return bool(self.mask_cam) or self.co_trang_thai
+
+    def vi_pham(self, mask_lop):
+        """
+        Các tiết học (mask_lop, không gồm giờ bận) vi phạm số ngày hoặc số tiết liên tiếp tối đa.
+        Chỉ cần kiểm tra trên lịch hiện tại: thêm lớp không bao giờ làm giảm số ngày hay chuỗi tiết.
+        """
+        if self.so_ngay_toi_da is not None and self.so_ngay(mask_lop) > self.so_ngay_toi_da:
+            return True
+        if self.so_tiet_lien_tiep_toi_da is not None:
+            # Sau k bước, bit p còn lại khi và chỉ khi các tiết p..p+k cùng ngày đều có lớp
+            con_lai = mask_lop
+            for _ in range(self.so_tiet_lien_tiep_toi_da):
+                con_lai &= (con_lai >> 1) & _KHONG_CUOI_NGAY
+                if not con_lai:
+                    break
+            if con_lai:
+                return True
+        return False
+
+    def so_ngay(self, mask_lop):
+        """Số ngày có tiết học trong mask"""
+        return sum(1 for mask_ngay in _MASK_NGAY if mask_lop & mask_ngay)
+
+    def mask_ngay_khong_dung(self, mask_lop):
+        """
+        Khi đã dùng hết số ngày tối đa: bitmask các ngày chưa có lớp (các môn còn lại không được
+        xếp vào đó, dùng để lọc miền). Trả về 0 nếu còn được thêm ngày.
+        """
+        if self.so_ngay_toi_da is None:
+            return 0
+        khong_dung = 0
+        so_ngay = 0
+        for mask_ngay in _MASK_NGAY:
+            if mask_lop & mask_ngay:
+                so_ngay += 1
+            else:
+                khong_dung |= mask_ngay
+        return khong_dung if so_ngay >= self.so_ngay_toi_da else 0
+
+    def mo_ta(self):
+        """Danh sách mô tả ngắn gọn các ràng buộc (hiển thị trên giao diện)"""
+        cac_mo_ta = []
+        if self.ngay_nghi:
+            cac_mo_ta.append("không học " + ", ".join(TEN_THU_TRONG_TUAN[thu] for thu in self.ngay_nghi))
+        if self.tiet_ket_thuc_toi_da is not None and self.tiet_ket_thuc_toi_da < MAX_TIET:
+            cac_mo_ta.append(f"kết thúc trước tiết {self.tiet_ket_thuc_toi_da + 1}")
+        if self.tiet_nghi:
+            cac_mo_ta.append("để trống tiết " + ", ".join(str(tiet) for tiet in self.tiet_nghi))
+        if self.so_ngay_toi_da is not None:
+            cac_mo_ta.append(f"tối đa {self.so_ngay_toi_da} ngày")
+        if self.so_tiet_lien_tiep_toi_da is not None:
+            cac_mo_ta.append(f"không quá {self.so_tiet_lien_tiep_toi_da} tiết liên tiếp")
+        return cac_mo_ta
+
+
+class BoLocLop:
+    """
+    Bộ lọc lớp cho một lượt tìm kiếm (None / rỗng = không lọc):
+    - giao_vien_loai_tru: tên các giáo viên không muốn học
+    - tien_to_phong: chỉ nhận lớp có phòng học (ma_lop) bắt đầu bằng một trong các tiền tố
+      (không phân biệt hoa thường, ví dụ ("A",) = chỉ các phòng nhà A)
+    - loai_lop: chỉ nhận các loại lớp này ("Lý thuyết", "Bài tập", "Lớp")
+    - khung_tiet: (tiet_tu, tiet_den) mọi khung giờ của lớp phải nằm trong các tiết này
+    - chi_lop: {ma_mon: các ID lớp (LopHoc.get_id())} chỉ nhận các lớp này của môn; gói lớp
+      (lớp chính cùng các lớp ràng buộc) được nhận khi có ít nhất một lớp của môn nằm trong danh sách
+    - chi_giao_vien: {ma_mon: tên các giáo viên} chỉ học môn với các giáo viên này; gói lớp được nhận
+      khi có ít nhất một lớp của môn do một trong các giáo viên đó dạy
+    """
+
+    def __init__(self, giao_vien_loai_tru=(), tien_to_phong=(), loai_lop=(), khung_tiet=None, chi_lop=None,
+                 chi_giao_vien=None):
+        if khung_tiet is not None:
+            tiet_tu, tiet_den = khung_tiet
+            if not (MIN_TIET <= tiet_tu <= tiet_den <= MAX_TIET):
+                raise ValidationError(
+                    f"Khung tiết phải nằm trong {MIN_TIET}-{MAX_TIET} và tiết đầu <= tiết cuối, "
+                    f"nhận được: {tiet_tu}-{tiet_den}")
+            khung_tiet = (tiet_tu, tiet_den)
+
+        self.giao_vien_loai_tru = {chuan_hoa_ten_giao_vien(ten) for ten in giao_vien_loai_tru if ten}
+        self.tien_to_phong = tuple(tien_to.strip().upper() for tien_to in tien_to_phong if tien_to.strip())
+        self.loai_lop = frozenset(loai_lop)
+        self.khung_tiet = khung_tiet
+        self.chi_lop = {ma_mon: frozenset(cac_id) for ma_mon, cac_id in (chi_lop or {}).items()}
+        self.chi_giao_vien = {
+            ma_mon: frozenset(chuan_hoa_ten_giao_vien(ten) for ten in cac_ten if ten)
+            for ma_mon, cac_ten in (chi_giao_vien or {}).items()
+        }
+
+    def __bool__(self):
+        return bool(self.giao_vien_loai_tru or self.tien_to_phong or self.loai_lop
+                    or self.khung_tiet or self.chi_lop or self.chi_giao_vien)
+
+    def nhan_lop(self, lop):
+        """Lớp thỏa các điều kiện theo từng lớp (giáo viên, phòng, loại lớp, khung tiết)"""
+        if self.giao_vien_loai_tru and chuan_hoa_ten_giao_vien(lop.ten_giao_vien) in self.giao_vien_loai_tru:
+            return False
+        if self.tien_to_phong and not (lop.ma_lop or "").upper().startswith(self.tien_to_phong):
+            return False
+        if self.loai_lop and lop.loai_lop not in self.loai_lop:
+            return False
+        if self.khung_tiet is not None:
+            tiet_tu, tiet_den = self.khung_tiet
+            for gio in lop.cac_khung_gio:
+                if gio.tiet_bat_dau < tiet_tu or gio.tiet_ket_thuc > tiet_den:
+                    return False
+        return True
+
+    def nhan_goi(self, cac_lop):
+        """
+        Gói lớp (các LopHoc được xếp cùng nhau) được giữ lại: mọi lớp thỏa nhan_lop(), và với mỗi môn
+        có trong chi_lop (chi_giao_vien), ít nhất một lớp của môn đó trong gói nằm trong danh sách
+        (do giáo viên trong danh sách dạy)
+        """
+        if not all(self.nhan_lop(lop) for lop in cac_lop):
+            return False
+        cac_mon = {lop.ma_mon for lop in cac_lop}
+        for ma_mon in cac_mon & self.chi_lop.keys():
+            if not any(lop.get_id() in self.chi_lop[ma_mon] for lop in cac_lop if lop.ma_mon == ma_mon):
+                return False
+        for ma_mon in cac_mon & self.chi_giao_vien.keys():
+            if not any(chuan_hoa_ten_giao_vien(lop.ten_giao_vien) in self.chi_giao_vien[ma_mon]
+                       for lop in cac_lop if lop.ma_mon == ma_mon):
+                return False
+        return True
+
+    def mo_ta(self):
+        """Danh sách mô tả ngắn gọn các điều kiện lọc (hiển thị trên giao diện)"""
+        cac_mo_ta = []
+        if self.giao_vien_loai_tru:
+            cac_mo_ta.append("bỏ giáo viên " + ", ".join(sorted(self.giao_vien_loai_tru)))
+        if self.tien_to_phong:
+            cac_mo_ta.append("chỉ phòng " + ", ".join(f"{tien_to}..." for tien_to in self.tien_to_phong))
+        if self.loai_lop:
+            cac_mo_ta.append("chỉ lớp " + ", ".join(sorted(self.loai_lop)))
+        if self.khung_tiet is not None:
+            cac_mo_ta.append(f"chỉ lớp trong tiết {self.khung_tiet[0]}-{self.khung_tiet[1]}")
+        for ma_mon, cac_id in sorted(self.chi_lop.items()):
+            cac_mo_ta.append(f"môn {ma_mon} chỉ {len(cac_id)} lớp đã chọn")
+        for ma_mon, cac_ten in sorted(self.chi_giao_vien.items()):
+            cac_mo_ta.append(f"môn {ma_mon} chỉ giáo viên " + ", ".join(sorted(cac_ten)))
+        return cac_mo_ta
@@ -0,0 +1,461 @@
+"""
+Đếm chính xác số thời khóa biểu hợp lệ mà không cần liệt kê từng TKB.
+
+Sau khi xếp xong các môn trước đó, phần còn lại của cây tìm kiếm chỉ phụ thuộc vào môn đang xét
+và miền ứng viên (các gói lớp còn xếp được) của các môn còn lại; khi có ràng buộc chéo môn thì phụ
+thuộc vào các tiết đã bị chiếm và các lớp đã được kéo vào qua ràng buộc.
+Vì vậy số TKB của mỗi cây con được tính một lần rồi nhớ lại (quy hoạch động có nhớ),
+nhiều nhánh khác nhau dẫn tới cùng một trạng thái chỉ tốn một lần đếm.
+
+Các trạng thái đã nhớ cùng số TKB của từng nhánh con tạo thành một DAG, nhờ đó có thể giải mã
+trực tiếp TKB thứ k trong toàn bộ không gian (KhongGianTKB) mà không lưu hay liệt kê các TKB trước nó.
+"""
+import random
+import sys
+from collections.abc import Sequence
+
+from .constants import COUNT_TIMEOUT, MAX_RESULTS
+from .errors import ValidationError
+from .scheduler import (
+    ThongKeTimKiem, MauTKB, _kiem_tra_dau_vao, _bien_dich_mask, _chuan_bi_tim_kiem, _loc_mien_con_lai,
+    _CHU_KY_KIEM_TRA,
+)
+
+
+# Lấy mẫu khi không gian có TKB lặp lại (ràng buộc lớp chéo môn), xem KhongGianTKB.lay_mau()
+_HE_SO_LIET_KE = 20
+_SO_LAN_RUT_TOI_DA = 50
+
+
+class _DungDem(Exception):
+    """Dừng đếm giữa chừng (hết thời gian hoặc bị hủy)"""
+
+
+class BoDemTKB:
+    """
+    Bộ đếm TKB trên danh sách môn đã biên dịch (theo thứ tự sắp xếp tĩnh của engine).
+
+    Kết quả đếm ở mỗi trạng thái là (số mẫu TKB, số TKB cụ thể): mẫu TKB là các TKB khác nhau
+    về giờ học như iter_mau_thoi_khoa_bieu() trả về, TKB cụ thể tính cả các lớp cùng giờ thay thế
+    được cho nhau. Số đếm bằng đúng số kết quả engine tuần tự liệt kê được trước khi bỏ trùng.
+
+    Khi có ràng buộc lớp chéo môn (co_the_trung), cùng một tập lớp có thể đến qua nhiều nhánh
+    (lớp đích vừa được môn của nó chọn, vừa được thêm qua ràng buộc của môn khác), nên số đếm
+    chỉ là cận trên của số TKB khác nhau mà DanhSachTKB giữ lại.
+
+    Mỗi trạng thái nhớ thêm các nhánh con có kết quả: (chỉ số gói, số mẫu, số TKB cụ thể của nhánh),
+    theo đúng thứ tự engine duyệt, dùng để giải mã TKB theo thứ tự (tkb_thu()).
+    """
+
+    def __init__(self, danh_sach_mon, trang_thai):
+        self.danh_sach_mon = danh_sach_mon
+        self.trang_thai = trang_thai
+        self.thong_ke = trang_thai.thong_ke
+
+        # Lớp là đích ràng buộc chéo môn: việc chúng đã có trong lịch hay chưa quyết định
+        # môn nào đã được phủ và gói nào còn xếp được, nên phải nằm trong khóa nhớ
+        self._id_lop_dich = frozenset(
+            id(lop) for mon in danh_sach_mon for goi in mon.cac_goi for lop, _ in goi.ngoai
+        )
+        self.co_the_trung = bool(self._id_lop_dich)
+
+        # _con_lai[i]: các tiết mà gói lớp của môn i trở về sau có thể chiếm. Tiết ngoài tập này
+        # không ảnh hưởng phần cây còn lại nên được bỏ khỏi khóa nhớ, giúp gộp nhiều trạng thái hơn.
+        self._con_lai = [0] * (len(danh_sach_mon) + 1)
+        for i in range(len(danh_sach_mon) - 1, -1, -1):
+            mask = self._con_lai[i + 1]
+            for goi in danh_sach_mon[i].cac_goi:
+                mask |= goi.mask
+                for _, mask_ngoai in goi.ngoai:
+                    mask |= mask_ngoai
+            self._con_lai[i] = mask
+        self._nho = {}
+
+    def _khoa(self, i):
+        """Khóa nhớ của trạng thái hiện tại khi đang xét môn thứ i"""
+        trang_thai = self.trang_thai
+        if trang_thai.rang_buoc is not None:
+            # Ràng buộc số ngày/số tiết liên tiếp phụ thuộc vào mọi tiết đã xếp, không chỉ miền
+            # hay các tiết mà các môn còn lại có thể chiếm
+            return (i, trang_thai.mask, frozenset(self._id_lop_dich & trang_thai._id_trong_lich))
+        if not self._id_lop_dich:
+            # Không có ràng buộc chéo môn: miền của các môn còn lại quyết định toàn bộ cây con
+            # (nhiều cách chiếm tiết khác nhau cho cùng miền được gộp làm một)
+            mien = trang_thai.mien
+            return (i,) + tuple(mien[mon.chi_so] for mon in self.danh_sach_mon[i:])
+        return (i, trang_thai.mask & self._con_lai[i],
+                frozenset(self._id_lop_dich & trang_thai._id_trong_lich))
+
+    def dem(self, i=0):
+        """
+        Đếm số TKB của cây con bắt đầu từ môn thứ i với trạng thái hiện tại.
+
+        Returns:
+            Tuple (so_mau, so_tkb)
+
+        Raises:
+            _DungDem: Nếu hết thời gian hoặc bị hủy (kiểm tra theo chu kỳ số trạng thái)
+        """
+        return self._dem_nut(i)[:2]
+
+    def _dem_nut(self, i):
+        """Nút DAG của trạng thái hiện tại: (so_mau, so_tkb, cac_nhanh), tính và nhớ nếu chưa có"""
+        khoa = self._khoa(i)
+        ket_qua = self._nho.get(khoa)
+        if ket_qua is not None:
+            return ket_qua
+
+        thong_ke = self.thong_ke
+        thong_ke.so_nut += 1
+        if not thong_ke.so_nut % _CHU_KY_KIEM_TRA and thong_ke.kiem_tra_dung():
+            raise _DungDem()
+
+        trang_thai = self.trang_thai
+        if i == len(self.danh_sach_mon):
+            # Môn bắt buộc ngoài danh sách phải đã được thêm qua ràng buộc
+            if all(trang_thai.co_mon(ma_mon) for ma_mon in trang_thai.bat_buoc_ngoai):
+                ket_qua = (1, 1, ())
+            else:
+                ket_qua = (0, 0, ())
+        else:
+            mon = self.danh_sach_mon[i]
+            if not mon.cac_lop or trang_thai.co_mon(mon.ma_mon):
+                # Giống engine: bỏ qua môn không có lớp hoặc đã được phủ qua ràng buộc
+                ket_qua = self._dem_nut(i + 1)
+            else:
+                so_mau = so_tkb = 0
+                cac_nhanh = []
+                mien = trang_thai.mien[mon.chi_so]
+                for j, goi in enumerate(mon.cac_goi):
+                    if not (mien >> j) & 1:
+                        continue
+                    if goi.ngoai and not trang_thai.xep_duoc_lop_ngoai(goi):
+                        continue
+                    moc = trang_thai.danh_dau()
+                    mask_truoc = trang_thai.mask
+                    trang_thai.push_goi(goi)
+                    # Forward checking như engine: môn còn lại rỗng miền thì cây con không có TKB
+                    mien_moi = _loc_mien_con_lai(self.danh_sach_mon, i, trang_thai,
+                                                 trang_thai.mask & ~mask_truoc)
+                    if mien_moi is None:
+                        mau_con = tkb_con = 0
+                    else:
+                        mien_cu = trang_thai.mien
+                        trang_thai.mien = mien_moi
+                        mau_con, tkb_con, _ = self._dem_nut(i + 1)
+                        trang_thai.mien = mien_cu
+                    trang_thai.hoan_tac_goi(moc)
+                    if not mau_con:
+                        continue
+                    # Mỗi mẫu con nhân với số phương án cùng giờ của gói
+                    tkb_con *= len(goi.phuong_an)
+                    cac_nhanh.append((j, mau_con, tkb_con))
+                    so_mau += mau_con
+                    so_tkb += tkb_con
+                ket_qua = (so_mau, so_tkb, tuple(cac_nhanh))
+
+        self._nho[khoa] = ket_qua
+        return ket_qua
+
+    def _chon_goi(self, i, goi):
+        """Thêm gói vào lịch và lọc miền các môn còn lại (giống một bước của engine)"""
+        trang_thai = self.trang_thai
+        mask_truoc = trang_thai.mask
+        trang_thai.push_goi(goi)
+        trang_thai.mien = _loc_mien_con_lai(self.danh_sach_mon, i, trang_thai,
+                                            trang_thai.mask & ~mask_truoc)
+
+    def _giai_ma(self, i, k):
+        """
+        Đi theo DAG tới TKB cụ thể thứ k (từ 0) của cây con tại môn i, để lại các gói đã chọn
+        trong trạng thái (người gọi hoàn tác).
+
+        Engine liệt kê theo từng mẫu TKB, trong mỗi mẫu ô trước đổi chậm hơn ô sau, nên nhánh
+        của gói có w phương án chứa w TKB liên tiếp cho mỗi TKB của cây con bên dưới.
+
+        Returns:
+            Vị trí của TKB trong mẫu TKB chứa nó
+        """
+        if i == len(self.danh_sach_mon):
+            return 0
+        mon = self.danh_sach_mon[i]
+        if not mon.cac_lop or self.trang_thai.co_mon(mon.ma_mon):
+            return self._giai_ma(i + 1, k)
+
+        for j, _, tkb_nhanh in self._dem_nut(i)[2]:
+            if k >= tkb_nhanh:
+                k -= tkb_nhanh
+                continue
+            goi = self.danh_sach_mon[i].cac_goi[j]
+            so_phuong_an = len(goi.phuong_an)
+            self._chon_goi(i, goi)
+            # TKB thứ u của cây con nằm trong mẫu bắt đầu tại TKB thứ (u - vi_tri) của cây con
+            u = k // so_phuong_an
+            vi_tri = self._giai_ma(i + 1, u)
+            return k - so_phuong_an * (u - vi_tri)
+        raise IndexError("Chỉ số TKB vượt quá số TKB của cây con")
+
+    def tkb_thu(self, k):
+        """TKB cụ thể thứ k (từ 0) theo đúng thứ tự engine tuần tự liệt kê"""
+        trang_thai = self.trang_thai
+        moc = trang_thai.danh_dau()
+        mien_cu = trang_thai.mien
+        so_o = len(trang_thai.cac_o)
+        try:
+            vi_tri = self._giai_ma(0, k)
+            return MauTKB(tuple(trang_thai.cac_o[so_o:]))[vi_tri]
+        finally:
+            trang_thai.hoan_tac_ve(moc)
+            del trang_thai.cac_o[so_o:]
+            trang_thai.mien = mien_cu
+
+    def _dem_lap(self, i, id_lop, so_lop):
+        """
+        Số TKB cụ thể của cây con tại môn i có đúng tập lớp id_lop, khi lịch đã có so_lop lớp
+        của tập. Chỉ đi vào các gói (phương án) nằm trọn trong tập nên chỉ duyệt vài nhánh.
+        """
+        if i == len(self.danh_sach_mon):
+            return 1 if so_lop == len(id_lop) else 0
+        trang_thai = self.trang_thai
+        mon = self.danh_sach_mon[i]
+        if not mon.cac_lop or trang_thai.co_mon(mon.ma_mon):
+            return self._dem_lap(i + 1, id_lop, so_lop)
+
+        tong = 0
+        for j, _, _ in self._dem_nut(i)[2]:
+            goi = mon.cac_goi[j]
+            if goi.ngoai:
+                if any(id(lop) not in id_lop for lop, _ in goi.cac_lop):
+                    continue
+                so_cach = 1
+                so_them = sum(1 for lop, _ in goi.cac_lop if not trang_thai.co_lop(lop))
+            else:
+                # Gói gộp không chứa lớp đích ràng buộc nên các lớp của nó chỉ vào lịch qua
+                # đúng gói này, đếm theo phương án cùng giờ nằm trong tập
+                so_cach = sum(1 for phuong_an in goi.phuong_an if all(id(lop) in id_lop for lop in phuong_an))
+                if not so_cach:
+                    continue
+                so_them = len(goi.cac_lop)
+            moc = trang_thai.danh_dau()
+            mien_cu = trang_thai.mien
+            self._chon_goi(i, goi)
+            tong += so_cach * self._dem_lap(i + 1, id_lop, so_lop + so_them)
+            trang_thai.hoan_tac_goi(moc)
+            trang_thai.mien = mien_cu
+        return tong
+
+    def so_lan_lap(self, tkb):
+        """
+        Số TKB cụ thể trong không gian có cùng tập lớp với tkb: 1 nếu không bị trùng, lớn hơn
+        khi tập lớp đến được qua nhiều nhánh do ràng buộc lớp chéo môn (chỉ xảy ra khi tkb
+        có lớp là đích ràng buộc chéo môn).
+        """
+        id_lop = frozenset(id(lop) for lop in tkb)
+        if self._id_lop_dich.isdisjoint(id_lop):
+            return 1
+        trang_thai = self.trang_thai
+        moc = trang_thai.danh_dau()
+        mien_cu = trang_thai.mien
+        so_o = len(trang_thai.cac_o)
+        try:
+            return self._dem_lap(0, id_lop, 0)
+        finally:
+            trang_thai.hoan_tac_ve(moc)
+            del trang_thai.cac_o[so_o:]
+            trang_thai.mien = mien_cu
+
+
+class KhongGianTKB(Sequence):
+    """
+    Toàn bộ không gian TKB hợp lệ, dùng như danh sách chỉ đọc theo thứ tự tìm kiếm tuần tự.
+    Truy cập TKB thứ k giải mã trực tiếp trên DAG của BoDemTKB (O(số môn x số gói mỗi môn)),
+    bộ nhớ chỉ phụ thuộc vào số trạng thái của DAG chứ không phụ thuộc vào số TKB.
+
+    co_the_trung = True (có ràng buộc lớp chéo môn): không gian có thể chứa cùng một TKB nhiều lần
+    và độ dài chỉ là cận trên, nên không dùng thay cho DanhSachTKB đã bỏ trùng.
+
+    Như DanhSachTKB, tổng số TKB là so_tkb (số nguyên Python, có thể vượt 64 bit) còn len() bị chặn
+    ở sys.maxsize; mọi TKB vẫn truy cập được theo chỉ số.
+    """
+
+    def __init__(self, bo_dem):
+        self._bo_dem = bo_dem
+        # Thống kê của lượt dựng (ví dụ các môn không thể xếp phát hiện khi tiền xử lý)
+        self.thong_ke = bo_dem.thong_ke
+        self.so_mau, self._so_tkb = bo_dem.dem()
+        self.co_the_trung = bo_dem.co_the_trung
+
+    @property
+    def so_tkb(self):
+        """Tổng số TKB cụ thể của không gian (số nguyên Python, không bị chặn như len())"""
+        return self._so_tkb
+
+    def __len__(self):
+        return min(self._so_tkb, sys.maxsize)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._so_tkb))]
+        if index < 0:
+            index += self._so_tkb
+        if not 0 <= index < self._so_tkb:
+            raise IndexError("KhongGianTKB index out of range")
+        return self._bo_dem.tkb_thu(index)
+
+    def cac_tkb_khac_nhau(self):
+        """Mọi TKB khác nhau của không gian theo thứ tự tìm kiếm (bỏ các lần lặp lại)"""
+        theo_tap_lop = {}
+        for tkb in self:
+            theo_tap_lop.setdefault(frozenset(id(lop) for lop in tkb), tkb)
+        return list(theo_tap_lop.values())
+
+    def lay_mau(self, so_luong, seed=None):
+        """
+        Lấy ngẫu nhiên đều so_luong TKB khác nhau trong toàn bộ không gian
+        (mỗi TKB có cùng xác suất được chọn, cùng seed cho cùng kết quả).
+
+        Khi co_the_trung, TKB lặp lại m lần trong không gian được rút trúng nhiều gấp m lần, nên
+        chỉ được nhận với xác suất 1/m (BoDemTKB.so_lan_lap()) và TKB đã rút thì rút lại.
+        Không gian nhỏ (tối đa _HE_SO_LIET_KE x so_luong) được liệt kê hết rồi rút trên các
+        TKB khác nhau; không gian lớn rút tối đa _SO_LAN_RUT_TOI_DA x so_luong lần nên có thể
+        trả về ít hơn so_luong TKB nếu phần lớn không gian là TKB lặp lại.
+
+        Returns:
+            List các TKB (tuple LopHoc) theo thứ tự được rút
+        """
+        rng = random.Random(seed)
+        if not self.co_the_trung:
+            if self._so_tkb <= sys.maxsize:
+                chi_so = rng.sample(range(self._so_tkb), min(so_luong, self._so_tkb))
+            else:
+                # range() quá sys.maxsize không dùng được với sample(); không gian lớn hơn so_luong rất
+                # nhiều nên rút lại khi trùng chỉ số gần như không bao giờ xảy ra
+                chi_so = {}
+                while len(chi_so) < so_luong:
+                    chi_so.setdefault(rng.randrange(self._so_tkb))
+            return [self._bo_dem.tkb_thu(k) for k in chi_so]
+
+        if self._so_tkb <= so_luong * _HE_SO_LIET_KE:
+            khac_nhau = self.cac_tkb_khac_nhau()
+            return rng.sample(khac_nhau, min(so_luong, len(khac_nhau)))
+
+        ket_qua = []
+        da_rut = set()
+        for _ in range(so_luong * _SO_LAN_RUT_TOI_DA):
+            if len(ket_qua) >= so_luong:
+                break
+            tkb = self._bo_dem.tkb_thu(rng.randrange(self._so_tkb))
+            tap_lop = frozenset(id(lop) for lop in tkb)
+            if tap_lop in da_rut:
+                continue
+            so_lan = self._bo_dem.so_lan_lap(tkb)
+            if so_lan > 1 and rng.randrange(so_lan):
+                continue
+            da_rut.add(tap_lop)
+            ket_qua.append(tkb)
+        return ket_qua
+
+
+def tao_khong_gian_tkb(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, timeout=None, huy=None, rang_buoc=None, bo_loc=None):
+    """
+    Dựng toàn bộ không gian TKB hợp lệ (tham số giống tim_thoi_khoa_bieu()) để truy cập ngẫu nhiên.
+
+    Args:
+        timeout: Thời gian dựng tối đa (giây), None = dùng COUNT_TIMEOUT mặc định
+        huy: HuyTimKiem (tùy chọn) để dừng từ thread khác
+        rang_buoc, bo_loc: RangBuocTKB, BoLocLop (tùy chọn), giống tim_thoi_khoa_bieu()
+
+    Returns:
+        KhongGianTKB, hoặc None nếu hết thời gian/bị hủy trước khi đếm xong
+
+    Raises:
+        ValidationError: Nếu đầu vào không hợp lệ (quá số môn, thiếu môn tiên quyết, ...)
+    """
+    if timeout is None:
+        timeout = COUNT_TIMEOUT
+
+    error_msg = _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses)
+    if error_msg:
+        raise ValidationError(error_msg)
+
+    thong_ke = ThongKeTimKiem(huy)
+    thong_ke.timeout = timeout
+    bang_mask, mask_gio_ban = _bien_dich_mask(danh_sach_mon_hoc, danh_sach_gio_ban, rang_buoc)
+    danh_sach_mon, trang_thai = _chuan_bi_tim_kiem(
+        danh_sach_mon_hoc, bang_mask, mask_gio_ban, mon_bat_buoc, all_courses, False, thong_ke,
+        rang_buoc, bo_loc)
+
+    try:
+        return KhongGianTKB(BoDemTKB(danh_sach_mon, trang_thai))
+    except _DungDem:
+        return None
+
+
+def dem_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, timeout=None, huy=None, rang_buoc=None, bo_loc=None):
+    """
+    Đếm chính xác số TKB hợp lệ mà không liệt kê chúng (tham số giống tao_khong_gian_tkb()).
+    Có ràng buộc lớp chéo môn thì số đếm là cận trên (xem BoDemTKB); cần biết điều này thì
+    dùng tao_khong_gian_tkb() và xem KhongGianTKB.co_the_trung.
+
+    Returns:
+        Tuple (so_mau, so_tkb): số TKB khác nhau về giờ học và số TKB cụ thể (tính cả các lớp
+        cùng giờ khác giáo viên/phòng, số nguyên Python có thể vượt 64 bit), hoặc None nếu hết thời gian/bị hủy trước khi đếm xong
+
+    Raises:
+        ValidationError: Nếu đầu vào không hợp lệ (quá số môn, thiếu môn tiên quyết, ...)
+    """
+    khong_gian = tao_khong_gian_tkb(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc,
+                                    completed_courses, all_courses, timeout, huy, rang_buoc, bo_loc)
+    if khong_gian is None:
+        return None
+    return khong_gian.so_mau, khong_gian.so_tkb
+
+
+def lay_mau_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, so_luong=None, seed=None, timeout=None, huy=None, rang_buoc=None, bo_loc=None):
+    """
+    Lấy mẫu ngẫu nhiên đều các TKB hợp lệ thay vì lấy các TKB đầu tiên theo thứ tự tìm kiếm
+    (các TKB đầu tiên thường chỉ khác nhau ở vài môn cuối).
+
+    Args:
+        danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses, all_courses, rang_buoc, bo_loc:
+            Giống tim_thoi_khoa_bieu()
+        so_luong: Số TKB cần lấy (None = dùng MAX_RESULTS mặc định)
+        seed: Seed cho bộ sinh số ngẫu nhiên (cùng seed cho cùng kết quả)
+        timeout: Thời gian đếm tối đa (giây), None = dùng COUNT_TIMEOUT mặc định
+        huy: HuyTimKiem (tùy chọn) để dừng từ thread khác
+
+    Returns:
+        Tuple (ket_qua, error_msg, warning_msg) giống tim_thoi_khoa_bieu(). Nếu tổng số TKB
+        không vượt quá so_luong thì ket_qua là toàn bộ không gian (KhongGianTKB, theo thứ tự tìm kiếm;
+        có ràng buộc lớp chéo môn thì là list các TKB khác nhau, xem KhongGianTKB.co_the_trung).
+    """
+    if so_luong is None:
+        so_luong = MAX_RESULTS
+
+    try:
+        khong_gian = tao_khong_gian_tkb(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc,
+                                        completed_courses, all_courses, timeout, huy, rang_buoc, bo_loc)
+    except ValidationError as e:
+        return [], str(e), None
+
+    if khong_gian is None:
+        if huy is not None and huy.da_huy:
+            return [], None, "Đã hủy lấy mẫu TKB."
+        return [], None, ("Không gian TKB quá lớn để đếm hết trong thời gian cho phép, "
+                          "hãy thêm giờ bận hoặc bớt môn rồi thử lại.")
+    error_msg = khong_gian.thong_ke.thong_bao_khong_xep_duoc()
+    if error_msg:
+        return [], error_msg, None
+    if khong_gian.co_the_trung:
+        # Không gian có thể lặp lại TKB: chỉ trả về các TKB khác nhau, tổng số là cận trên
+        if khong_gian.so_tkb <= so_luong:
+            return khong_gian.cac_tkb_khac_nhau(), None, None
+        ket_qua = khong_gian.lay_mau(so_luong, seed)
+        return ket_qua, None, (
+            f"Đã lấy ngẫu nhiên {len(ket_qua)} TKB khác nhau trong tổng số tối đa {khong_gian.so_tkb:,} TKB "
+            f"(có thể tính trùng do ràng buộc lớp chéo môn).")
+    if khong_gian.so_tkb <= so_luong:
+        return khong_gian, None, None
+    return khong_gian.lay_mau(so_luong, seed), None, (
+        f"Đã lấy ngẫu nhiên {so_luong} trong tổng số {khong_gian.so_tkb:,} TKB "
+        f"({khong_gian.so_mau:,} TKB khác nhau về giờ học).")
@@ -0,0 +1,198 @@
+"""
+Giải thích vì sao không có thời khóa biểu nào: tìm một tập con tối thiểu các môn đã chọn và giờ bận
+(cùng ràng buộc TKB / bộ lọc lớp nếu có) mà riêng nó đã không thể xếp được, ví dụ
+"môn A, môn B và giờ bận 'Đi làm' không thể xếp cùng nhau".
+
+Tập được thu gọn bằng cách bỏ dần (deletion-based): bắt đầu từ toàn bộ các thành phần, lần lượt thử
+bỏ từng thành phần; nếu phần còn lại vẫn không xếp được thì bỏ hẳn thành phần đó. Kết quả là một tập
+không xếp được mà bỏ bất kỳ thành phần nào cũng xếp được.
+
+Mỗi lần kiểm tra chỉ cần biết có tồn tại một TKB hay không, trên bitmask tuần đã biên dịch một lần cho
+cả lượt chẩn đoán. Phần lớn các tập không xếp được bị tiền xử lý (_lan_truyen_cung()) bác bỏ ngay mà
+không cần tìm kiếm, nên cả lượt chẩn đoán cho 15 môn chỉ mất vài chục mili giây.
+"""
+import time
+
+from .constants import DIAGNOSIS_TIMEOUT
+from .errors import ValidationError
+from .scheduler import (
+    ThongKeTimKiem, _kiem_tra_dau_vao, _bien_dich_mask, _mask_lich_ban, _chuan_bi_tim_kiem,
+    _tim_kiem_lap,
+)
+
+# Loại thành phần trong tập xung đột: (loại, đối tượng)
+THANH_PHAN_MON = "mon"
+THANH_PHAN_GIO_BAN = "gio_ban"
+THANH_PHAN_RANG_BUOC = "rang_buoc"
+THANH_PHAN_BO_LOC = "bo_loc"
+
+
+class _KiemTraXepDuoc:
+    """
+    Kiểm tra nhanh một tập thành phần có xếp được TKB hay không.
+    Bitmask của các lớp và từng giờ bận được biên dịch một lần, dùng lại cho mọi lần kiểm tra.
+    """
+
+    def __init__(self, danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, all_courses, timeout, huy):
+        self.bang_mask, _ = _bien_dich_mask(danh_sach_mon_hoc, [])
+        # Giờ bận không quy đổi được sang tiết (engine báo ValidationError) không chiếm bit nào
+        self.mask_gio_ban = {}
+        self.gio_ban_loi = []
+        for lich_ban in danh_sach_gio_ban:
+            try:
+                self.mask_gio_ban[id(lich_ban)] = _mask_lich_ban(lich_ban)
+            except ValidationError:
+                self.mask_gio_ban[id(lich_ban)] = 0
+                self.gio_ban_loi.append(lich_ban)
+        self.ma_mon_duoc_chon = {mon.ma_mon for mon in danh_sach_mon_hoc}
+        self.mon_bat_buoc = list(mon_bat_buoc or [])
+        self.all_courses = all_courses
+        self.bat_dau = time.time()
+        self.timeout = timeout
+        self.huy = huy
+        # Các môn tiền xử lý báo không xếp được ở lần kiểm tra gần nhất
+        self.mon_khong_xep_duoc = []
+
+    def xep_duoc(self, tap):
+        """
+        Returns:
+            True nếu có ít nhất một TKB, False nếu chắc chắn không có,
+            None nếu chưa kết luận được (hết thời gian chẩn đoán hoặc bị hủy)
+        """
+        cac_mon = [doi_tuong for loai, doi_tuong in tap if loai == THANH_PHAN_MON]
+        rang_buoc = next((doi_tuong for loai, doi_tuong in tap if loai == THANH_PHAN_RANG_BUOC), None)
+        bo_loc = next((doi_tuong for loai, doi_tuong in tap if loai == THANH_PHAN_BO_LOC), None)
+        mask_gio_ban = rang_buoc.mask_cam if rang_buoc else 0
+        for loai, doi_tuong in tap:
+            if loai == THANH_PHAN_GIO_BAN:
+                mask_gio_ban |= self.mask_gio_ban[id(doi_tuong)]
+        # Môn đã chọn nhưng bị bỏ khỏi tập thì cũng không còn bắt buộc; môn bắt buộc chưa được
+        # chọn (phải có qua lớp ràng buộc) vẫn là điều kiện nền của mọi lần kiểm tra
+        ma_mon_trong_tap = {mon.ma_mon for mon in cac_mon}
+        mon_bat_buoc = [ma_mon for ma_mon in self.mon_bat_buoc
+                        if ma_mon in ma_mon_trong_tap or ma_mon not in self.ma_mon_duoc_chon]
+
+        thong_ke = ThongKeTimKiem(self.huy)
+        thong_ke.bat_dau = self.bat_dau
+        thong_ke.timeout = self.timeout
+        if thong_ke.kiem_tra_dung():
+            return None
+        danh_sach_mon, trang_thai = _chuan_bi_tim_kiem(
+            cac_mon, self.bang_mask, mask_gio_ban, mon_bat_buoc, self.all_courses, True, thong_ke,
+            rang_buoc, bo_loc)
+        self.mon_khong_xep_duoc = thong_ke.mon_khong_xep_duoc
+        if thong_ke.mon_khong_xep_duoc:
+            return False
+        for _ in _tim_kiem_lap(danh_sach_mon, trang_thai):
+            return True
+        return None if thong_ke.da_dung else False
+
+
+def tim_tap_xung_dot_toi_thieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None,
+                               all_courses=None, rang_buoc=None, bo_loc=None, timeout=None, huy=None):
+    """
+    Tìm một tập con tối thiểu các môn, giờ bận, ràng buộc TKB và bộ lọc lớp không thể xếp cùng nhau.
+
+    Args:
+        danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses, all_courses,
+        rang_buoc, bo_loc: Giống tim_thoi_khoa_bieu()
+        timeout: Thời gian tối đa cho cả lượt chẩn đoán (giây, None = DIAGNOSIS_TIMEOUT)
+        huy: HuyTimKiem (tùy chọn) để dừng chẩn đoán từ bên ngoài
+
+    Returns:
+        Tuple (tap_xung_dot, toi_thieu):
+        - tap_xung_dot: danh sách (loại, đối tượng) với loại là THANH_PHAN_MON (MonHoc),
+          THANH_PHAN_GIO_BAN (LichBan), THANH_PHAN_RANG_BUOC (RangBuocTKB) hoặc THANH_PHAN_BO_LOC (BoLocLop)
+        - toi_thieu: False nếu hết thời gian trước khi thu gọn xong (tập vẫn không xếp được
+          nhưng có thể còn thành phần thừa)
+        Trả về None nếu đầu vào không hợp lệ, thực ra vẫn xếp được, hoặc chưa kết luận được.
+    """
+    if timeout is None:
+        timeout = DIAGNOSIS_TIMEOUT
+    if _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses):
+        return None
+
+    kiem_tra = _KiemTraXepDuoc(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, all_courses, timeout, huy)
+    if kiem_tra.gio_ban_loi:
+        return None
+    # Môn không có lớp bị engine bỏ qua và giờ bận ngoài khung tiết không chiếm bit nào,
+    # nên chúng không bao giờ góp phần gây xung đột
+    tap = [(THANH_PHAN_MON, mon) for mon in danh_sach_mon_hoc if mon.cac_lop_hoc]
+    tap += [(THANH_PHAN_GIO_BAN, lich_ban) for lich_ban in danh_sach_gio_ban
+            if kiem_tra.mask_gio_ban[id(lich_ban)]]
+    if rang_buoc:
+        tap.append((THANH_PHAN_RANG_BUOC, rang_buoc))
+    if bo_loc:
+        tap.append((THANH_PHAN_BO_LOC, bo_loc))
+
+    if kiem_tra.xep_duoc(tap) is not False:
+        return None
+
+    # Tiền xử lý thường chỉ ra luôn cặp môn xung đột: thử ngay tập chỉ gồm các môn đó (cùng mọi
+    # thành phần không phải môn), đúng thì bắt đầu thu gọn từ tập nhỏ này thay vì từ tất cả
+    ma_mon_nghi_ngo = set()
+    for ma_mon, _, ma_mon_xung_dot in kiem_tra.mon_khong_xep_duoc:
+        ma_mon_nghi_ngo.update((ma_mon, ma_mon_xung_dot))
+    tap_nho = [(loai, doi_tuong) for loai, doi_tuong in tap
+               if loai != THANH_PHAN_MON or doi_tuong.ma_mon in ma_mon_nghi_ngo]
+    if len(tap_nho) < len(tap) and kiem_tra.xep_duoc(tap_nho) is False:
+        tap = tap_nho
+
+    # Thu gọn bằng cách bỏ dần: thành phần nào bỏ đi mà vẫn không xếp được thì không cần thiết
+    toi_thieu = True
+    i = 0
+    while i < len(tap):
+        ket_qua = kiem_tra.xep_duoc(tap[:i] + tap[i + 1:])
+        if ket_qua is False:
+            del tap[i]
+            continue
+        if ket_qua is None:
+            if kiem_tra.huy is not None and kiem_tra.huy.da_huy:
+                return None
+            toi_thieu = False
+        i += 1
+    return tap, toi_thieu
+
+
+def mo_ta_xung_dot(tap_xung_dot, toi_thieu=True):
+    """Câu giải thích cho tập xung đột, ví dụ "Môn 'A (MA)' và giờ bận 'Đi làm' không thể xếp cùng nhau." """
+    cac_phan = []
+    for loai, doi_tuong in tap_xung_dot:
+        if loai == THANH_PHAN_MON:
+            cac_phan.append(f"môn '{doi_tuong.ten_mon} ({doi_tuong.ma_mon})'")
+        elif loai == THANH_PHAN_GIO_BAN:
+            cac_phan.append(f"giờ bận '{doi_tuong.ly_do or doi_tuong}'")
+        elif loai == THANH_PHAN_RANG_BUOC:
+            cac_phan.append(f"ràng buộc TKB ({', '.join(doi_tuong.mo_ta())})")
+        else:
+            cac_phan.append(f"bộ lọc lớp ({', '.join(doi_tuong.mo_ta())})")
+
+    if not cac_phan:
+        return ("Không thể xếp TKB kể cả khi bỏ hết các môn đã chọn và giờ bận: "
+                "các môn bắt buộc chưa chọn không có lớp ràng buộc nào đưa vào được.")
+    if len(cac_phan) == 1:
+        thong_bao = f"{cac_phan[0]} không thể xếp được"
+    else:
+        thong_bao = f"{', '.join(cac_phan[:-1])} và {cac_phan[-1]} không thể xếp cùng nhau"
+    thong_bao = thong_bao[0].upper() + thong_bao[1:]
+    if toi_thieu:
+        if len(cac_phan) > 1:
+            thong_bao += " (bỏ hoặc đổi bất kỳ một thành phần nào trong số này là có thể xếp được)"
+    else:
+        thong_bao += " (chưa thu gọn hết trong thời gian cho phép)"
+    return thong_bao + "."
+
+
+def giai_thich_khong_co_tkb(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None,
+                            all_courses=None, rang_buoc=None, bo_loc=None, timeout=None, huy=None):
+    """
+    Câu giải thích khi không tìm được TKB nào (tham số giống tim_tap_xung_dot_toi_thieu()).
+
+    Returns:
+        Chuỗi giải thích, None nếu không chẩn đoán được
+    """
+    ket_qua = tim_tap_xung_dot_toi_thieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses,
+                                         all_courses, rang_buoc, bo_loc, timeout, huy)
+    if ket_qua is None:
+        return None
+    return mo_ta_xung_dot(*ket_qua)
@@ -0,0 +1,274 @@
+"""
+Tìm kiếm thời khóa biểu song song trên nhiều tiến trình (ProcessPoolExecutor).
+
+Cây tìm kiếm được chia theo lựa chọn lớp của một/hai môn đầu tiên thành các phần việc (_PhanViec).
+Mỗi tiến trình chạy một phần việc với ngân sách số nút; hết ngân sách thì dừng và trả về phần còn lại
+để giao cho tiến trình đang rảnh (chia việc động cho các cây con lệch).
+Kết quả được ghép lại theo đúng thứ tự duyệt tuần tự nên đầu ra giống hệt iter_mau_thoi_khoa_bieu().
+Tiến trình con được tạo bằng "spawn" nên hàm main của chương trình phải được bảo vệ bởi if __name__ == "__main__".
+"""
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .constants import SEARCH_TIMEOUT, PARALLEL_WORKERS, PARALLEL_MIN_COURSES
+from .errors import ValidationError
+from .scheduler import (
+    ThongKeTimKiem, HuyTimKiem, MauTKB, _PhanViec, iter_mau_thoi_khoa_bieu, _kiem_tra_dau_vao,
+    _bien_dich_mask, _chuan_bi_tim_kiem, _tim_kiem_lap,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chia cây theo lựa chọn của bao nhiêu môn (mức phân nhánh) đầu tiên
+_DO_SAU_CHIA = 2
+# Số nút tối đa một tiến trình duyệt cho một phần việc trước khi trả phần còn lại để chia tiếp
+_NGAN_SACH_NUT = 20000
+# Thời gian chờ tối đa (giây) giữa hai lần kiểm tra hủy/timeout và báo tiến độ ở tiến trình chính
+_CHU_KY_CHO = 0.1
+
+
+class _NguCanh:
+    """
+    Dữ liệu cố định của một lượt tìm kiếm, dựng lại một lần trong mỗi tiến trình con.
+    Lớp học được truyền giữa các tiến trình bằng chỉ số trong danh_muc (object bị sao chép khi pickle).
+    Danh sách môn đã biên dịch và trạng thái gốc (sau tiền xử lý AC-3) chỉ tính ở phần việc đầu tiên rồi
+    dùng lại cho các phần việc sau, kể cả bảng nogood (xem _TrangThaiTimKiem.ban_sao()).
+    """
+
+    def __init__(self, danh_sach_mon_hoc, mask_gio_ban, mon_bat_buoc, all_courses, sap_xep_dong, rang_buoc, bo_loc):
+        self.danh_sach_mon_hoc = danh_sach_mon_hoc
+        self.mask_gio_ban = mask_gio_ban
+        self.mon_bat_buoc = mon_bat_buoc
+        self.all_courses = all_courses
+        self.sap_xep_dong = sap_xep_dong
+        self.rang_buoc = rang_buoc
+        self.bo_loc = bo_loc
+        self.bang_mask = _bien_dich_mask(danh_sach_mon_hoc, [])[0]
+
+        # Danh mục lớp theo thứ tự cố định, giống nhau ở mọi tiến trình
+        self.danh_muc = []
+        for mon in list(danh_sach_mon_hoc) + list((all_courses or {}).values()):
+            self.danh_muc.extend(mon.cac_lop_hoc)
+        self.chi_so = {}
+        for j, lop in enumerate(self.danh_muc):
+            self.chi_so.setdefault(id(lop), j)
+        self._da_chuan_bi = None
+
+    def tim_kiem(self, phan_viec, thong_ke, do_sau_cat=None):
+        """Generator duyệt đúng phần cây ứng với phan_viec, yield các MauTKB"""
+        thong_ke.muc_goc = len(phan_viec.tien_to)
+        if self._da_chuan_bi is None:
+            self._da_chuan_bi = _chuan_bi_tim_kiem(
+                self.danh_sach_mon_hoc, self.bang_mask, self.mask_gio_ban, self.mon_bat_buoc,
+                self.all_courses, self.sap_xep_dong, thong_ke, self.rang_buoc, self.bo_loc)
+        danh_sach_mon, trang_thai_goc = self._da_chuan_bi
+        # Danh sách môn bị hoán đổi tại chỗ khi chọn môn động: mỗi lượt duyệt dùng bản sao riêng
+        danh_sach_mon = list(danh_sach_mon)
+        trang_thai = trang_thai_goc.ban_sao(thong_ke)
+        trang_thai.loc_nhanh = phan_viec.mask_loc_nhanh()
+        trang_thai.do_sau_cat = do_sau_cat
+        return _tim_kiem_lap(danh_sach_mon, trang_thai)
+
+    def ma_hoa(self, mau):
+        """MauTKB -> (các ô dưới dạng tuple chỉ số lớp, co_the_trung) để gửi giữa các tiến trình"""
+        chi_so = self.chi_so
+        return (tuple(tuple(tuple(chi_so[id(lop)] for lop in phuong_an) for phuong_an in o)
+                      for o in mau.cac_o), mau.co_the_trung)
+
+    def giai_ma(self, ma):
+        """Ngược lại của ma_hoa()"""
+        cac_o, co_the_trung = ma
+        danh_muc = self.danh_muc
+        return MauTKB(tuple(tuple(tuple(danh_muc[j] for j in phuong_an) for phuong_an in o)
+                            for o in cac_o), co_the_trung)
+
+
+# Ngữ cảnh của tiến trình con (khởi tạo một lần cho mỗi tiến trình)
+_NGU_CANH = None
+_HUY = None
+
+
+def _khoi_tao_tien_trinh(du_lieu, su_kien_huy):
+    """Initializer của ProcessPoolExecutor: nhận dữ liệu tìm kiếm một lần cho mỗi tiến trình"""
+    global _NGU_CANH, _HUY
+    _NGU_CANH = _NguCanh(*du_lieu)
+    _HUY = HuyTimKiem(su_kien_huy)
+
+
+def _chay_phan_viec(phan_viec, bat_dau, timeout, ngan_sach_nut):
+    """
+    Chạy một phần việc trong tiến trình con.
+
+    Returns:
+        Tuple (ket_qua, phan_con_lai, so_nut, het_gio):
+        - ket_qua: các mẫu TKB đã mã hóa bằng chỉ số lớp trong danh mục (_NguCanh.ma_hoa)
+        - phan_con_lai: các phần việc chưa duyệt (vị trí tính tương đối trong phan_viec)
+    """
+    thong_ke = ThongKeTimKiem(_HUY)
+    thong_ke.bat_dau = bat_dau
+    thong_ke.timeout = timeout
+    thong_ke.ngan_sach_nut = ngan_sach_nut
+    ket_qua = [_NGU_CANH.ma_hoa(mau) for mau in _NGU_CANH.tim_kiem(phan_viec, thong_ke)]
+    return ket_qua, thong_ke.phan_con_lai, thong_ke.so_nut, thong_ke.het_gio
+
+
+class _O:
+    """Một ô trong hàng đợi kết quả: phần việc (đang chạy/đã xong) hoặc mẫu TKB tìm được khi chia việc"""
+
+    __slots__ = ('phan_viec', 'future', 'xong', 'ket_qua', 'con')
+
+    def __init__(self, phan_viec=None, ket_qua=None):
+        self.phan_viec = phan_viec
+        self.future = None
+        self.xong = ket_qua is not None
+        self.ket_qua = ket_qua
+        self.con = ()
+
+
+def iter_mau_thoi_khoa_bieu_song_song(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, timeout=None, sap_xep_dong=False, thong_ke=None, rang_buoc=None, bo_loc=None, so_tien_trinh=None):
+    """
+    Phiên bản song song của iter_mau_thoi_khoa_bieu(): cùng tham số, cùng kết quả và thứ tự.
+    Tự động tìm tuần tự khi chỉ có một nhân CPU hoặc chọn ít hơn PARALLEL_MIN_COURSES môn.
+
+    Args:
+        so_tien_trinh: Số tiến trình (None = PARALLEL_WORKERS, mặc định là số nhân CPU)
+
+    Raises:
+        ValidationError: Nếu đầu vào không hợp lệ
+    """
+    if so_tien_trinh is None:
+        so_tien_trinh = PARALLEL_WORKERS or os.cpu_count() or 1
+    if so_tien_trinh <= 1 or len(danh_sach_mon_hoc) < PARALLEL_MIN_COURSES:
+        yield from iter_mau_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses,
+                                           all_courses, timeout, sap_xep_dong, thong_ke, rang_buoc, bo_loc)
+        return
+
+    if timeout is None:
+        timeout = SEARCH_TIMEOUT
+    if thong_ke is None:
+        thong_ke = ThongKeTimKiem()
+    thong_ke.timeout = timeout
+
+    error_msg = _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses)
+    if error_msg:
+        raise ValidationError(error_msg)
+
+    mask_gio_ban = _bien_dich_mask(danh_sach_mon_hoc, danh_sach_gio_ban, rang_buoc)[1]
+    du_lieu = (danh_sach_mon_hoc, mask_gio_ban, mon_bat_buoc, all_courses, sap_xep_dong, rang_buoc, bo_loc)
+    ngu_canh = _NguCanh(*du_lieu)
+
+    try:
+        # Bước 1: duyệt các mức đầu ngay tại tiến trình này để chia cây thành các phần việc.
+        # Mẫu TKB hoàn chỉnh gặp trước mức chia được giữ nguyên vị trí trong thứ tự kết quả.
+        hang = deque()
+        for muc in ngu_canh.tim_kiem(_PhanViec(()), thong_ke, _DO_SAU_CHIA):
+            hang.append(_O(muc) if isinstance(muc, _PhanViec) else _O(ket_qua=[muc]))
+        thong_ke.tien_do_them = 1.0 - sum(o.phan_viec.trong_so for o in hang if not o.xong)
+        if thong_ke.da_dung:
+            return
+
+        # Bước 2: giao các phần việc cho process pool, ghép kết quả theo thứ tự của hàng đợi
+        yield from _chay_song_song(hang, ngu_canh, du_lieu, thong_ke, so_tien_trinh)
+    finally:
+        thong_ke.ket_thuc = time.time()
+
+
+def _chay_song_song(hang, ngu_canh, du_lieu, thong_ke, so_tien_trinh):
+    """Chạy các ô trong hàng đợi trên process pool và yield mẫu TKB theo đúng thứ tự"""
+    dang_chay = {}
+    pool = None
+    su_kien_huy = None
+    try:
+        # Luôn tạo tiến trình con bằng "spawn": fork từ QThread của giao diện có thể bị treo
+        # (khóa do luồng khác đang giữ bị sao chép sang tiến trình con) và bị cảnh báo từ Python 3.12
+        ngu_canh_mp = multiprocessing.get_context("spawn")
+        su_kien_huy = ngu_canh_mp.Event()
+        pool = ProcessPoolExecutor(so_tien_trinh, mp_context=ngu_canh_mp, initializer=_khoi_tao_tien_trinh,
+                                   initargs=(du_lieu, su_kien_huy))
+    except (OSError, ImportError, NotImplementedError):
+        # Môi trường không hỗ trợ đa tiến trình: mọi phần việc sẽ chạy tại chỗ
+        logger.warning("Không thể tạo process pool, tìm kiếm tuần tự", exc_info=True)
+
+    def giao(o):
+        if pool is None:
+            return
+        try:
+            o.future = pool.submit(_chay_phan_viec, o.phan_viec, thong_ke.bat_dau,
+                                   thong_ke.timeout, _NGAN_SACH_NUT)
+            dang_chay[o.future] = o
+        except Exception:
+            logger.warning("Không thể giao phần việc cho process pool", exc_info=True)
+            o.future = None
+
+    def nhan(o, future):
+        try:
+            ket_qua, phan_con_lai, so_nut, het_gio = future.result()
+        except Exception:
+            # Tiến trình con lỗi: phần việc sẽ được chạy lại tại chỗ khi đến lượt
+            logger.warning("Phần việc tìm kiếm song song bị lỗi, chạy lại tại chỗ", exc_info=True)
+            o.future = None
+            return
+        pv = o.phan_viec
+        o.ket_qua = [ngu_canh.giai_ma(mau) for mau in ket_qua]
+        # Đổi vị trí phần còn lại từ tương đối (trong phần việc) sang toàn cây, rồi giao tiếp
+        o.con = [_O(_PhanViec(con.tien_to, con.tu, pv.bat_dau + pv.trong_so * con.bat_dau,
+                              pv.trong_so * con.trong_so))
+                 for con in phan_con_lai]
+        for con in o.con:
+            giao(con)
+        o.xong = True
+        thong_ke.so_nut += so_nut
+        thong_ke.so_ket_qua += len(ket_qua)
+        thong_ke.tien_do_them += pv.trong_so * (phan_con_lai[0].bat_dau if phan_con_lai else 1.0)
+        if het_gio:
+            thong_ke.het_gio = True
+
+    try:
+        for o in hang:
+            if not o.xong:
+                giao(o)
+
+        while hang and not thong_ke.da_dung:
+            dau = hang[0]
+            if dau.xong:
+                hang.popleft()
+                hang.extendleft(reversed(dau.con))
+                yield from dau.ket_qua
+                continue
+            if dau.future is None:
+                # Không chạy được trên process pool: duyệt phần việc ngay tại tiến trình này
+                hang.popleft()
+                yield from _chay_tai_cho(dau.phan_viec, ngu_canh, thong_ke)
+                continue
+            if thong_ke.kiem_tra_dung():
+                break
+            xong, _ = wait(dang_chay, timeout=_CHU_KY_CHO, return_when=FIRST_COMPLETED)
+            for future in xong:
+                nhan(dang_chay.pop(future), future)
+    finally:
+        # Dừng các tiến trình con (hủy, hết giờ, hoặc người gọi ngừng lặp khi đủ kết quả)
+        if su_kien_huy is not None:
+            su_kien_huy.set()
+        for future in dang_chay:
+            future.cancel()
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def _chay_tai_cho(phan_viec, ngu_canh, thong_ke):
+    """Duyệt một phần việc tại tiến trình hiện tại (dự phòng khi process pool không dùng được)"""
+    thong_ke_con = ThongKeTimKiem(thong_ke.huy)
+    thong_ke_con.bat_dau = thong_ke.bat_dau
+    thong_ke_con.timeout = thong_ke.timeout
+    try:
+        yield from ngu_canh.tim_kiem(phan_viec, thong_ke_con)
+    finally:
+        thong_ke.so_nut += thong_ke_con.so_nut
+        thong_ke.so_ket_qua += thong_ke_con.so_ket_qua
+        thong_ke.tien_do_them += phan_viec.trong_so
+        thong_ke.het_gio = thong_ke.het_gio or thong_ke_con.het_gio
+        thong_ke.da_huy = thong_ke.da_huy or thong_ke_con.da_huy
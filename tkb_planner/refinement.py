@@ -0,0 +1,290 @@
+"""
+Lọc và sắp xếp lại kết quả đã tìm mà không phải tìm lại, ví dụ "chỉ các TKB không học Thứ 7",
+"ít ngày nhất lên trước", "môn X học giáo viên Y".
+
+Điều kiện lọc dùng lại đúng RangBuocTKB (hình dạng TKB) và BoLocLop (điều kiện theo lớp) của lượt tìm
+kiếm, nên lọc kết quả cho cùng các TKB như tìm lại với điều kiện đó (trong phạm vi các TKB đã tìm).
+Với ràng buộc lớp chéo môn, kết quả vẫn có thể lệch ít so với tìm lại: BoLocLop làm đổi kích thước miền
+nên đổi thứ tự môn của engine, mà thứ tự này quyết định lớp ràng buộc được thêm qua môn nào; mẫu trùng
+cũng chỉ còn nhánh tìm thấy đầu tiên, nhánh đó bị lọc thì TKB bị bỏ dù nhánh khác có thể được nhận.
+
+Mọi phép tính chạy theo cột trên toàn bộ kết quả cùng lúc thay vì từng TKB: DanhSachTKB.cot_ngay() cho
+bitmask tiết học từng ngày của mọi mẫu (mỗi ngày một array), các chỉ số (tiết trống, ...) là các bảng
+tra 4096 phần tử theo bitmask một ngày, gộp giữa các ngày bằng map(add/max, ...); riêng số ngày học
+được tính trên cả bảng tiết học như một số nguyên lớn. Các cột được nhớ trong danh sách
+(DanhSachTKB.cot_da_tinh()).
+BoLocLop được áp dụng trên danh mục ô (vài chục ô khác nhau) thay vì trên từng TKB; khi mọi mẫu có cùng
+số ô, số TKB cụ thể chỉ được tính lại trên các cột chỉ số ô có ô bị bớt phương án.
+
+Thời gian đo trên 200.000 mẫu (819 triệu TKB cụ thể), một lõi CPU: lọc theo số ngày tối đa khoảng 20 ms
+(100 ms lần đầu, phải tính cột), ngày nghỉ 65 ms, sắp xếp theo một chỉ số đã có cột 70-80 ms, theo hai
+chỉ số khoảng 130 ms, lọc giáo viên một môn khoảng 110 ms (200 ms lần đầu). Lần đầu dùng chỉ số tra
+bảng (tiết trống, ...) tốn thêm khoảng 150-200 ms để tính cột. Phần lớn thời gian còn lại là dựng danh
+sách con (tap_con()) và sorted(), đều tỉ lệ với số mẫu.
+"""
+import sys
+from array import array
+from functools import reduce
+from itertools import compress, repeat
+from operator import add, floordiv, gt, mul, not_, or_
+
+from .constants import MIN_TIET, MAX_TIET
+from .errors import ValidationError
+from .scheduler import DanhSachTKB, _SO_BIT_MOI_NGAY, _SO_O_NGAY, _gian_mask_ngay
+
+# Chỉ số sắp xếp được (càng nhỏ càng lên trước), cùng ý nghĩa với scoring.CAC_CHI_SO
+CAC_CHI_SO_SAP_XEP = ('so_ngay', 'tiet_trong', 'ket_thuc_muon', 'bat_dau_som')
+
+_MASK_MOT_NGAY = (1 << _SO_BIT_MOI_NGAY) - 1
+
+
+def _tao_bang_tra():
+    """Các bảng tra theo bitmask tiết học một ngày (0.._MASK_MOT_NGAY)"""
+    co_hoc, tiet_trong, cuoi, som, chuoi = [], [], [], [], []
+    for ngay in range(_MASK_MOT_NGAY + 1):
+        co_hoc.append(1 if ngay else 0)
+        if not ngay:
+            tiet_trong.append(0)
+            cuoi.append(0)
+            som.append(0)
+            chuoi.append(0)
+            continue
+        dau = (ngay & -ngay).bit_length() - 1
+        ket_thuc = ngay.bit_length()
+        tiet_trong.append(bin((((1 << ket_thuc) - 1) >> dau << dau) & ~ngay).count("1"))
+        cuoi.append(ket_thuc - 1 + MIN_TIET)
+        som.append(MAX_TIET - (dau + MIN_TIET))
+        dai_nhat = 0
+        con_lai = ngay
+        while con_lai:
+            con_lai &= con_lai >> 1
+            dai_nhat += 1
+        chuoi.append(dai_nhat)
+    return co_hoc, tiet_trong, cuoi, som, chuoi
+
+
+# - co_hoc: 1 nếu ngày có tiết học
+# - tiet_trong: số tiết trống nằm giữa hai tiết học
+# - cuoi: tiết kết thúc muộn nhất (0 nếu không học)
+# - som: MAX_TIET - tiết bắt đầu sớm nhất (0 nếu không học), gộp bằng max cho bat_dau_som
+# - chuoi: số tiết học liên tiếp dài nhất
+_CO_HOC, _TIET_TRONG, _CUOI, _SOM, _CHUOI = _tao_bang_tra()
+
+
+# Cách gộp giá trị các ngày (tổng hoặc max) và bảng tra của từng chỉ số
+_CACH_TINH = {
+    'so_ngay': (sum, _CO_HOC),
+    'tiet_trong': (sum, _TIET_TRONG),
+    'ket_thuc_muon': (max, _CUOI),
+    'bat_dau_som': (max, _SOM),
+    'chuoi': (max, _CHUOI),
+}
+
+
+# Bảng translate: byte khác 0 thành 1
+_KHAC_0 = bytes([0]) + bytes([1]) * 255
+
+
+def _tinh_so_ngay(danh_sach):
+    """
+    Cột số ngày học của mọi mẫu, tính trên cả bảng tiết học như một số nguyên lớn thay vì tra bảng
+    từng ngày: đánh dấu byte khác 0, OR hai byte của mỗi ngày, rồi cộng dồn các ngày của mỗi mẫu
+    (_SO_O_NGAY ngày, 16 byte) về byte đầu của mẫu bằng ba phép dịch.
+    """
+    bang = danh_sach.bang_ngay().tobytes()
+    if not bang:
+        return array('B')
+    x = int.from_bytes(bang.translate(_KHAC_0), 'little')
+    # OR hai byte của một ngày không phụ thuộc thứ tự byte của máy
+    x = (x | (x >> 8)) & int.from_bytes(b'\x01\x00' * (len(bang) // 2), 'little')
+    so_byte_mau = 2 * _SO_O_NGAY
+    dich = 8 * so_byte_mau // 2
+    while dich >= 16:
+        x += x >> dich
+        dich //= 2
+    return array('B', x.to_bytes(len(bang), 'little')[::so_byte_mau])
+
+
+def cot_chi_so(danh_sach, ten):
+    """
+    Giá trị một chỉ số hình dạng (CAC_CHI_SO_SAP_XEP, hoặc 'chuoi' = số tiết liên tiếp dài nhất) của
+    mọi mẫu trong danh sách, cùng cách tính với scoring._chi_so_mask(). Cột được nhớ lại trong danh
+    sách nên các lần lọc/sắp xếp sau chỉ còn các phép so sánh trên cột.
+
+    Returns:
+        array('B') các giá trị theo thứ tự mẫu
+    """
+    if ten not in _CACH_TINH:
+        raise ValidationError(f"Không sắp xếp được theo chỉ số '{ten}'")
+    gop, bang = _CACH_TINH[ten]
+    if ten == 'so_ngay':
+        return danh_sach.cot_da_tinh(ten, _tinh_so_ngay)
+
+    def tinh(danh_sach):
+        cac_cot = [map(bang.__getitem__, cot) for cot in danh_sach.cot_ngay()]
+        if gop is max:
+            return array('B', map(max, *cac_cot))
+        return array('B', reduce(lambda a, b: map(add, a, b), cac_cot))
+
+    return danh_sach.cot_da_tinh(ten, tinh)
+
+
+def _cot_vi_pham(danh_sach, rang_buoc):
+    """Cột khác 0 ở các mẫu vi phạm ràng buộc hình dạng (None nếu không có điều kiện nào)"""
+    cac_cot = []
+    if rang_buoc.mask_cam:
+        # AND cả bảng tiết học của mọi mẫu với các tiết bị cấm (lặp lại cho từng mẫu) bằng một phép
+        # toán trên số nguyên lớn, rồi gộp các số 64 bit của mỗi mẫu: khác 0 = có lớp vào tiết bị cấm
+        bang = danh_sach.bang_ngay().tobytes()
+        cam = _gian_mask_ngay(rang_buoc.mask_cam).to_bytes(2 * _SO_O_NGAY, sys.byteorder)
+        trung = int.from_bytes(bang, sys.byteorder) & int.from_bytes(cam * danh_sach.so_mau, sys.byteorder)
+        theo_mau = array('Q', trung.to_bytes(len(bang), sys.byteorder))
+        so_q = _SO_O_NGAY // 4
+        cac_cot.extend(theo_mau[k::so_q] for k in range(so_q))
+    if rang_buoc.so_ngay_toi_da is not None:
+        cac_cot.append(map(gt, cot_chi_so(danh_sach, 'so_ngay'), repeat(rang_buoc.so_ngay_toi_da)))
+    if rang_buoc.so_tiet_lien_tiep_toi_da is not None:
+        cac_cot.append(map(gt, cot_chi_so(danh_sach, 'chuoi'), repeat(rang_buoc.so_tiet_lien_tiep_toi_da)))
+    if not cac_cot:
+        return None
+    return reduce(lambda a, b: map(or_, a, b), cac_cot)
+
+
+def _lop_rang_buoc_ngoai_o(o):
+    """
+    ID các lớp ràng buộc của lớp chính (lớp đầu của phương án đầu) không nằm trong ô. Ô của gói có lớp
+    ràng buộc thuộc môn khác chỉ giữ các lớp gói đã thêm vào lịch, các lớp ràng buộc đã có sẵn nằm ở ô
+    khác của cùng mẫu; engine lọc trên cả gói nên ô này phải được xét theo từng mẫu.
+    """
+    phuong_an = o[0]
+    if not phuong_an:
+        return frozenset()
+    return frozenset(phuong_an[0].lop_rang_buoc or ()) - {lop.get_id() for lop in phuong_an}
+
+
+def _loc_danh_muc_o(danh_sach, bo_loc):
+    """
+    Bớt khỏi từng ô của danh mục các phương án bị bo_loc loại. Ô có lớp ràng buộc nằm ngoài ô
+    (_lop_rang_buoc_ngoai_o()) chỉ có một phương án và được giữ nguyên để xét theo từng mẫu.
+
+    Returns:
+        Tuple (danh_muc_moi, so_phuong_an, o_theo_mau): so_phuong_an là số phương án còn lại của từng ô;
+        danh_muc_moi là None nếu không ô nào bị bớt; o_theo_mau là {chỉ số ô: ID các lớp ràng buộc
+        ngoài ô} của các ô phải xét theo từng mẫu
+    """
+    danh_muc = danh_sach.danh_muc_o
+    o_theo_mau = {}
+    danh_muc_moi = []
+    for k, o in enumerate(danh_muc):
+        thieu = _lop_rang_buoc_ngoai_o(o)
+        if thieu:
+            o_theo_mau[k] = thieu
+            danh_muc_moi.append(o)
+        else:
+            danh_muc_moi.append(tuple(phuong_an for phuong_an in o if bo_loc.nhan_goi(phuong_an)))
+    so_phuong_an = [len(o) for o in danh_muc_moi]
+    if all(len(o) == so for o, so in zip(danh_muc, so_phuong_an)):
+        return None, so_phuong_an, o_theo_mau
+    return danh_muc_moi, so_phuong_an, o_theo_mau
+
+
+def _nhan_goi_trong_mau(danh_muc, cac_o, o_theo_mau, bo_loc):
+    """
+    Các ô xét theo mẫu (o_theo_mau) của mẫu gồm cac_o đều được bo_loc nhận khi ghép lại đủ gói
+    như lúc tìm kiếm: ô cùng các lớp ràng buộc của nó nằm ở các ô khác của mẫu
+    """
+    theo_id = {}
+    for k in cac_o:
+        for lop in danh_muc[k][0]:
+            theo_id.setdefault(lop.get_id(), []).append(lop)
+    for k in cac_o:
+        thieu = o_theo_mau.get(k)
+        if thieu is None:
+            continue
+        goi = list(danh_muc[k][0])
+        for id_lop in thieu:
+            goi.extend(theo_id.get(id_lop, ()))
+        if not bo_loc.nhan_goi(goi):
+            return False
+    return True
+
+
+def _so_tkb_sau_loc(danh_sach, chon, so_phuong_an):
+    """
+    Số TKB cụ thể của các mẫu `chon` khi ô thứ k chỉ còn so_phuong_an[k] phương án (0 = mẫu bị loại hẳn),
+    tra theo chỉ số mẫu.
+
+    Số TKB của mẫu là tích số phương án các ô. Khi mọi mẫu cùng số ô (DanhSachTKB.cac_cot_o()), chỉ các
+    cột chứa ô bị bớt mới phải tính lại: chia cho số phương án cũ và nhân với số mới, theo cả cột một lúc.
+    """
+    danh_muc = danh_sach.danh_muc_o
+    cac_cot = danh_sach.cac_cot_o()
+    if cac_cot is None:
+        nhan = so_phuong_an.__getitem__
+        return dict(zip(chon, (reduce(mul, map(nhan, cac_o), 1) for cac_o in danh_sach.cac_o_theo_mau(chon))))
+
+    bi_bot = {k for k, o in enumerate(danh_muc) if len(o) != so_phuong_an[k]}
+    so_cu = [len(o) for o in danh_muc]
+    # Tập ô của từng cột được nhớ trong danh sách, các lần lọc sau chỉ còn so sánh tập
+    tap_o_theo_cot = danh_sach.cot_da_tinh('_tap_o', lambda ds: [frozenset(cot) for cot in cac_cot])
+    tat_ca = isinstance(chon, range)
+    # Luôn là list mới: người gọi có thể sửa (cot_so_tkb() được nhớ trong danh sách)
+    so_tkb = danh_sach.cot_so_tkb()
+    so_tkb = list(so_tkb) if tat_ca else list(map(so_tkb.__getitem__, chon))
+    for cot, tap_o in zip(cac_cot, tap_o_theo_cot):
+        if bi_bot.isdisjoint(tap_o):
+            continue
+        if not tat_ca:
+            cot = list(map(cot.__getitem__, chon))
+        so_tkb = list(map(mul, map(floordiv, so_tkb, map(so_cu.__getitem__, cot)),
+                          map(so_phuong_an.__getitem__, cot)))
+    return so_tkb if tat_ca else dict(zip(chon, so_tkb))
+
+
+def loc_ket_qua(danh_sach, rang_buoc=None, bo_loc=None, sap_xep_theo=()):
+    """
+    Lọc và sắp xếp lại kết quả tìm TKB.
+
+    Args:
+        danh_sach: DanhSachTKB (hoặc danh sách các TKB cụ thể, được chuyển bằng DanhSachTKB.tu_cac_tkb())
+        rang_buoc: RangBuocTKB (tùy chọn) các TKB phải thỏa
+        bo_loc: BoLocLop (tùy chọn) các lớp phải thỏa; mẫu chỉ còn giữ các phương án thỏa bộ lọc
+        sap_xep_theo: Các chỉ số trong CAC_CHI_SO_SAP_XEP, sắp tăng dần theo thứ tự từ điển;
+            các mẫu bằng nhau giữ nguyên thứ tự cũ. Rỗng = giữ thứ tự tìm kiếm
+
+    Returns:
+        DanhSachTKB mới (dùng chung dữ liệu với danh sách ban đầu)
+    """
+    if not isinstance(danh_sach, DanhSachTKB):
+        danh_sach = DanhSachTKB.tu_cac_tkb(danh_sach)
+    for ten in sap_xep_theo:
+        if ten not in CAC_CHI_SO_SAP_XEP:
+            raise ValidationError(f"Không sắp xếp được theo chỉ số '{ten}'")
+
+    chon = range(danh_sach.so_mau)
+    vi_pham = _cot_vi_pham(danh_sach, rang_buoc) if rang_buoc else None
+    if vi_pham is not None:
+        chon = list(compress(chon, map(not_, vi_pham)))
+
+    danh_muc_moi = so_tkb_cac_mau = None
+    if bo_loc:
+        danh_muc_moi, so_phuong_an, o_theo_mau = _loc_danh_muc_o(danh_sach, bo_loc)
+        if danh_muc_moi is not None or o_theo_mau:
+            so_tkb_cac_mau = _so_tkb_sau_loc(danh_sach, chon, so_phuong_an)
+            if o_theo_mau:
+                # Chỉ các mẫu có ô ràng buộc chéo môn (ít) mới phải ghép lại gói theo từng mẫu
+                danh_muc = danh_sach.danh_muc_o
+                for j, cac_o in zip(chon, danh_sach.cac_o_theo_mau(chon)):
+                    if (so_tkb_cac_mau[j] and any(map(o_theo_mau.__contains__, cac_o))
+                            and not _nhan_goi_trong_mau(danh_muc, cac_o, o_theo_mau, bo_loc)):
+                        so_tkb_cac_mau[j] = 0
+            chon = list(compress(chon, map(so_tkb_cac_mau.__getitem__, chon)))
+
+    if sap_xep_theo:
+        cac_cot = [cot_chi_so(danh_sach, ten) for ten in sap_xep_theo]
+        # Gộp các chỉ số thành một khóa số nguyên (mỗi chỉ số < 256) để sắp xếp bằng vòng lặp C
+        khoa = cac_cot[0] if len(cac_cot) == 1 else list(
+            reduce(lambda a, b: map(add, map(mul, a, repeat(256)), b), cac_cot))
+        chon = sorted(chon, key=khoa.__getitem__)
+
+    return danh_sach.tap_con(chon, danh_muc_moi, so_tkb_cac_mau)
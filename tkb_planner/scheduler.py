@@ -2,10 +2,22 @@
 Logic xử lý tìm kiếm và kiểm tra xung đột thời khóa biểu
 """
 
+import copy
+import sys
+import threading
 import time
-from collections import defaultdict
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Sequence
+from itertools import accumulate, product, chain, islice
+from operator import sub
 from .models import ThoiGianHoc, LichBan, LopHoc
-from .constants import TEN_THU_TRONG_TUAN, MAX_COURSES, MAX_RESULTS, SEARCH_TIMEOUT
+from .errors import ValidationError
+from .constants import (
+    TEN_THU_TRONG_TUAN, MAX_COURSES, MAX_RESULTS, SEARCH_TIMEOUT, NOGOOD_CACHE_SIZE,
+    MIN_THU, MAX_THU, MIN_TIET, MAX_TIET,
+)
 
 # Cache toàn cục cho tra cứu lớp theo ID để tránh duyệt lặp lại all_courses
 _LOP_ID_CACHE = {}
@@ -39,6 +51,223 @@ def clear_lop_id_cache():
     _LOP_ID_CACHE_SOURCE = None
 
 
+# Số bit dành cho mỗi thứ trong bitmask tuần (mỗi tiết là 1 bit)
+_SO_BIT_MOI_NGAY = MAX_TIET - MIN_TIET + 1
+_SO_NGAY = MAX_THU - MIN_THU + 1
+# Số ô 16 bit lưu các tiết học từng ngày của một mẫu TKB (làm tròn lên bội của 4 để mỗi mẫu
+# đúng bằng một số số nguyên 64 bit, xem DanhSachTKB.bang_ngay())
+_SO_O_NGAY = (_SO_NGAY + 3) // 4 * 4
+
+# Số nút tìm kiếm giữa hai lần kiểm tra timeout/hủy và báo tiến độ
+_CHU_KY_KIEM_TRA = 4096
+
+# Giá trị lớn nhất của array('Q'): chỉ số TKB vượt quá thì lưu bằng list số nguyên Python
+_Q_TOI_DA = (1 << 64) - 1
+
+
+def _mang_so_tkb(cac_gia_tri):
+    """array('Q') các số TKB, hoặc list nếu có số vượt quá 64 bit (tích các phương án rất lớn)"""
+    cac_gia_tri = list(cac_gia_tri)
+    if cac_gia_tri and max(cac_gia_tri) > _Q_TOI_DA:
+        return cac_gia_tri
+    return array('Q', cac_gia_tri)
+
+
+def _mask_khung_gio(gio):
+    """
+    Chuyển một khung giờ (ThoiGianHoc) thành bitmask tuần.
+
+    Bố cục: thứ `thu` chiếm các bit [(thu - MIN_THU) * _SO_BIT_MOI_NGAY, ...),
+    mỗi tiết là 1 bit. Hai khung giờ xung đột khi và chỉ khi AND của 2 mask khác 0.
+    """
+    so_tiet = gio.tiet_ket_thuc - gio.tiet_bat_dau + 1
+    vi_tri = (gio.thu - MIN_THU) * _SO_BIT_MOI_NGAY + (gio.tiet_bat_dau - MIN_TIET)
+    return ((1 << so_tiet) - 1) << vi_tri
+
+
+def _mask_lop(lop):
+    """Bitmask tuần của tất cả khung giờ của một lớp học"""
+    mask = 0
+    for gio in lop.cac_khung_gio:
+        mask |= _mask_khung_gio(gio)
+    return mask
+
+
+def _mask_lich_ban(lich_ban):
+    """Bitmask tuần của một giờ bận (0 nếu không quy đổi được sang tiết)"""
+    gio_ban = lich_ban.to_thoi_gian_hoc()
+    return _mask_khung_gio(gio_ban) if gio_ban else 0
+
+
+def _gian_mask_ngay(mask):
+    """Dãn bitmask tuần sang bố cục 16 bit mỗi ngày (đọc thẳng thành array('H') mỗi ngày một phần tử)"""
+    mask_gian = 0
+    for d in range(_SO_NGAY):
+        mask_gian |= ((mask >> (d * _SO_BIT_MOI_NGAY)) & ((1 << _SO_BIT_MOI_NGAY) - 1)) << (d * 16)
+    return mask_gian
+
+
+def _lay_mask(lop, bang_mask):
+    """
+    Lấy bitmask của lớp từ bảng mask đã biên dịch (key: id(lop)).
+    Lớp chưa có trong bảng (ví dụ lớp ràng buộc thuộc môn không được chọn)
+    sẽ được biên dịch và lưu lại ngay khi gặp lần đầu.
+    """
+    mask = bang_mask.get(id(lop))
+    if mask is None:
+        mask = bang_mask[id(lop)] = _mask_lop(lop)
+    return mask
+
+
+def _bien_dich_mask(danh_sach_mon_hoc, danh_sach_gio_ban, rang_buoc=None):
+    """
+    Biên dịch một lần cho mỗi lượt tìm kiếm:
+    - bang_mask: {id(lop): bitmask} cho tất cả lớp của các môn được chọn
+    - mask_gio_ban: OR bitmask của tất cả giờ bận đang bật, cùng các tiết bị cấm bởi
+      ràng buộc hình dạng (RangBuocTKB.mask_cam) nếu có
+
+    Returns:
+        Tuple (bang_mask, mask_gio_ban)
+    """
+    bang_mask = {}
+    for mon_hoc in danh_sach_mon_hoc:
+        for lop in mon_hoc.cac_lop_hoc:
+            bang_mask[id(lop)] = _mask_lop(lop)
+
+    mask_gio_ban = rang_buoc.mask_cam if rang_buoc else 0
+    for lich_ban in danh_sach_gio_ban:
+        mask_gio_ban |= _mask_lich_ban(lich_ban)
+    return bang_mask, mask_gio_ban
+
+
+def _dem_bit(x):
+    """Đếm số bit 1 của số nguyên (tương thích Python < 3.10, chưa có int.bit_count)"""
+    return bin(x).count("1")
+
+
+class _GoiLop:
+    """
+    Gói lớp biên dịch sẵn: một lớp cùng các lớp ràng buộc của nó (ví dụ Lý thuyết + Bài tập).
+    Chọn gói = thêm tất cả lớp trong gói vào lịch, nên lúc tìm kiếm không còn phải tra ID ràng buộc.
+
+    - cac_lop: [(lop, mask)] theo đúng thứ tự thêm vào lịch (lớp chính trước)
+    - mask: OR mask của các lớp cùng môn (luôn được thêm khi chọn gói, dùng để lọc miền)
+    - ngoai: [(lop, mask)] các lớp ràng buộc thuộc môn khác, có thể đã có sẵn trong lịch
+    - phuong_an: các tập lớp thay thế được cho nhau (cùng giờ học, khác giáo viên/phòng),
+      gói đại diện cho cả nhóm khi tìm kiếm; xem _gop_goi_cung_gio()
+    """
+
+    __slots__ = ('cac_lop', 'mask', 'ngoai', 'phuong_an')
+
+    def __init__(self, cac_lop, ma_mon):
+        self.cac_lop = tuple(cac_lop)
+        self.mask = 0
+        for lop, mask in self.cac_lop:
+            if lop.ma_mon == ma_mon:
+                self.mask |= mask
+        self.ngoai = tuple((lop, mask) for lop, mask in self.cac_lop if lop.ma_mon != ma_mon)
+        self.phuong_an = (tuple(lop for lop, _ in self.cac_lop),)
+
+
+def _gop_goi_cung_gio(cac_goi, id_lop_dich):
+    """
+    Gộp các gói có cùng giờ học (cùng mask) thành một gói đại diện với nhiều phương án,
+    để tìm kiếm chỉ duyệt theo "dấu chân" thời gian thay vì từng tổ hợp giáo viên/phòng.
+    Không gộp gói có lớp thuộc môn khác, hoặc có lớp là đích ràng buộc của môn khác
+    (id_lop_dich), vì khi đó các phương án không còn thay thế được cho nhau.
+    """
+    ket_qua = []
+    theo_mask = {}
+    for goi in cac_goi:
+        if goi.ngoai or any(id(lop) in id_lop_dich for lop, _ in goi.cac_lop):
+            ket_qua.append(goi)
+            continue
+        dai_dien = theo_mask.get(goi.mask)
+        if dai_dien is None:
+            theo_mask[goi.mask] = goi
+            ket_qua.append(goi)
+        else:
+            dai_dien.phuong_an += goi.phuong_an
+    return ket_qua
+
+
+def _tao_cac_goi_lop(mon_hoc, bang_mask, all_courses):
+    """
+    Biên dịch các lớp của môn thành danh sách gói lớp.
+    Gói có cùng tập lớp (ví dụ LT chọn BT và BT chọn lại LT) chỉ giữ một lần;
+    gói có hai lớp trùng giờ nhau thì không bao giờ xếp được nên bị loại ngay.
+    """
+    cac_goi = []
+    da_co = set()
+    for lop in mon_hoc.cac_lop_hoc:
+        thanh_vien = [lop]
+        if all_courses:
+            for rang_buoc_id in lop.lop_rang_buoc or []:
+                # Truyền lop để ưu tiên lớp không trùng giờ (giống lúc tìm kiếm trước đây)
+                lop_rang_buoc = _tim_lop_rang_buoc(rang_buoc_id, all_courses, lop_hien_tai=lop)
+                if lop_rang_buoc and all(x is not lop_rang_buoc for x in thanh_vien):
+                    thanh_vien.append(lop_rang_buoc)
+
+        khoa = frozenset(id(x) for x in thanh_vien)
+        if khoa in da_co:
+            continue
+        da_co.add(khoa)
+
+        mask_gop = 0
+        cac_lop_goi = []
+        for x in thanh_vien:
+            mask = _lay_mask(x, bang_mask)
+            if mask_gop & mask:
+                break  # Các lớp trong gói trùng giờ nhau
+            mask_gop |= mask
+            cac_lop_goi.append((x, mask))
+        else:
+            cac_goi.append(_GoiLop(cac_lop_goi, mon_hoc.ma_mon))
+    return cac_goi
+
+
+class _MonBienDich:
+    """
+    Môn học đã biên dịch cho một lượt tìm kiếm.
+
+    Miền ứng viên (domain) của môn là một bitset trên chỉ số gói lớp (_GoiLop): bit i = 1 nếu
+    gói thứ i còn xếp được. Bảng _lop_theo_tiet cho biết những gói nào chiếm từng tiết trong tuần,
+    nhờ đó lọc miền theo các tiết vừa bị chiếm chỉ tốn vài phép OR/AND.
+    """
+
+    def __init__(self, chi_so, mon_hoc, cac_goi):
+        self.chi_so = chi_so
+        self.mon_hoc = mon_hoc
+        self.ma_mon = mon_hoc.ma_mon
+        self.cac_lop = list(mon_hoc.cac_lop_hoc)
+        self.cac_goi = cac_goi
+        self.tat_ca = (1 << len(self.cac_goi)) - 1
+        self.bat_buoc = False
+
+        # {bit của tiết: bitset các gói chiếm tiết đó}
+        self._lop_theo_tiet = defaultdict(int)
+        for i, goi in enumerate(self.cac_goi):
+            mask = goi.mask
+            while mask:
+                bit = mask & -mask
+                self._lop_theo_tiet[bit] |= 1 << i
+                mask ^= bit
+        self._xung_dot = {}
+
+    def lop_xung_dot(self, mask):
+        """Bitset các gói lớp của môn bị trùng với mask (kết quả được nhớ theo mask)"""
+        ket_qua = self._xung_dot.get(mask)
+        if ket_qua is None:
+            ket_qua = 0
+            con_lai = mask
+            while con_lai:
+                bit = con_lai & -con_lai
+                ket_qua |= self._lop_theo_tiet.get(bit, 0)
+                con_lai ^= bit
+            self._xung_dot[mask] = ket_qua
+        return ket_qua
+
+
 def kiem_tra_xung_dot_gio(gio_A, gio_B):
     """Kiểm tra xem hai khung giờ có xung đột không"""
     if not gio_A or not gio_B or gio_A.thu != gio_B.thu:
@@ -227,153 +456,1240 @@ def _tim_lop_rang_buoc(lop_id, all_courses, lop_hien_tai=None):
     # Nếu không có lớp nào không trùng giờ, hoặc không có lop_hien_tai, trả về lớp đầu tiên
     return cac_lop_cung_id[0]
 
-def _them_lop_rang_buoc(lop_hoc, lich_hien_tai, danh_sach_gio_ban, all_courses):
+class _TrangThaiTimKiem:
     """
-    Thêm các lớp ràng buộc vào lịch hiện tại nếu có
-    Tối ưu: Sử dụng set để kiểm tra nhanh O(1) thay vì O(n)
+    Trạng thái tìm kiếm được cập nhật tăng dần (push/pop) trong quá trình quay lui.
+
+    Lưu song song với danh sách lớp đang xếp:
+    - mask: bitmask tuần các tiết đã bị chiếm (gồm cả giờ bận)
+    - so_lop_theo_mon: số lớp của mỗi môn đang có trong lịch (môn đã được phủ)
+    - undo stack: mask trước mỗi lần push để hoàn tác O(1)
+    - mien: miền ứng viên (bitset gói lớp) của từng môn theo _MonBienDich.chi_so,
+      được thay bằng danh sách mới sau mỗi bước forward checking và khôi phục khi quay lui
+
+    Ngoài ra giữ ngữ cảnh cố định của lượt tìm kiếm: thống kê, cấu hình chọn môn động,
+    các môn bắt buộc chỉ có thể được phủ qua ràng buộc, ràng buộc hình dạng phụ thuộc lịch
+    (số ngày, số tiết liên tiếp) và giới hạn phần việc khi tìm song song.
+
+    Để không duyệt lại các cây con chắc chắn không có kết quả (xem _tim_kiem_lap()):
+    - con_lai: bitset (theo chi_so) các môn chưa xét trên đường đi hiện tại
+    - nogood: bảng LRU các trạng thái (môn còn lại, miền/mask) đã chứng minh không có TKB
+    - mask_cac_muc: các tiết mỗi mức phân nhánh trên đường đi đã chiếm, dùng để tìm các mức
+      thực sự gây xung đột và nhảy lui thẳng về mức sâu nhất trong số đó
     """
-    if not lop_hoc.lop_rang_buoc or not all_courses:
-        return True  # Không có ràng buộc, OK
-    
-    # Tạo set các object ID đã có trong lịch để lookup nhanh O(1)
-    lich_hien_tai_ids = {id(lop) for lop in lich_hien_tai}
-    
-    # Kiểm tra và thêm các lớp ràng buộc
-    for rang_buoc_id in lop_hoc.lop_rang_buoc:
-        # Tìm lớp ràng buộc (truyền lop_hoc để ưu tiên lớp không trùng giờ)
-        lop_rang_buoc = _tim_lop_rang_buoc(rang_buoc_id, all_courses, lop_hien_tai=lop_hoc)
-        if not lop_rang_buoc:
-            continue  # Lớp ràng buộc không tồn tại, bỏ qua
-        
-        # Kiểm tra xem lớp ràng buộc đã có trong lịch chưa (so sánh bằng object ID) - O(1)
-        if id(lop_rang_buoc) in lich_hien_tai_ids:
-            continue  # Đã có trong lịch, bỏ qua
-        
-        # Nếu chưa có, kiểm tra xung đột và thêm vào
-        # Kiểm tra xung đột với lịch hiện tại
-        if _kiem_tra_trung_voi_lich(lop_rang_buoc, lich_hien_tai, danh_sach_gio_ban):
-            return False  # Có xung đột, không thể thêm lớp ràng buộc
-        
-        lich_hien_tai.append(lop_rang_buoc)
-        lich_hien_tai_ids.add(id(lop_rang_buoc))  # Cập nhật set
-    
-    return True  # Đã thêm tất cả lớp ràng buộc thành công
 
-def _tim_kiem_de_quy(danh_sach_mon_hoc, mon_hoc_index, lich_hien_tai, ket_qua, danh_sach_gio_ban, all_courses=None, max_results=None, start_time=None, timeout=None):
+    def __init__(self, mask_gio_ban, thong_ke, sap_xep_dong=False, dich_rang_buoc=frozenset(),
+                 bat_buoc_ngoai=()):
+        self.lich = []
+        self.mask = mask_gio_ban
+        # Các tiết không phải tiết học (giờ bận, tiết bị cấm): mask & ~mask_nen = các tiết đã xếp lớp
+        self.mask_nen = mask_gio_ban
+        # RangBuocTKB có ràng buộc phụ thuộc lịch, kiểm tra sau mỗi lần xếp gói (None = không có)
+        self.rang_buoc = None
+        self.mien = []
+        self.thong_ke = thong_ke
+        self.sap_xep_dong = sap_xep_dong
+        self.dich_rang_buoc = dich_rang_buoc
+        # Môn bắt buộc không nằm trong danh sách tìm kiếm: chỉ có thể có mặt qua lớp ràng buộc
+        self.bat_buoc_ngoai = bat_buoc_ngoai
+        self.so_lop_theo_mon = defaultdict(int)
+        self._id_trong_lich = set()
+        self._hoan_tac = []
+        # Các ô của mẫu TKB đang xây dựng: mỗi gói đã chọn là một ô gồm các phương án thay thế
+        self.cac_o = []
+        # Dùng cho tìm kiếm song song (xem parallel_search.py):
+        # - loc_nhanh: mask lọc miền ở các mức phân nhánh đầu (giới hạn vào một phần việc)
+        # - do_sau_cat: mức phân nhánh mà tại đó dừng lại và trả về phần việc thay vì đi sâu hơn
+        self.loc_nhanh = ()
+        self.do_sau_cat = None
+        self.con_lai = 0
+        self.nogood = OrderedDict()
+        self.mask_cac_muc = []
+        # Các tiết mà miền ban đầu (sau tiền xử lý) của từng môn có thể chiếm
+        self.mask_mien_goc = []
+        # Lớp là đích ràng buộc chéo môn (việc đã có trong lịch hay chưa nằm trong khóa nogood)
+        self.id_lop_dich = frozenset()
+        # Nhảy lui chỉ dùng khi xung đột giải thích được bằng các tiết bị chiếm, tức là không có
+        # ràng buộc chéo môn hay ràng buộc hình dạng phụ thuộc toàn bộ lịch
+        self.nhay_lui = False
+        # Môn bị rỗng miền ở lần _loc_mien_con_lai() thất bại gần nhất (None = vi phạm rang_buoc)
+        self.mon_rong = None
+
+    def ban_sao(self, thong_ke):
+        """
+        Trạng thái mới ở gốc cây (chưa xếp lớp nào) cùng ngữ cảnh đã chuẩn bị, dùng lại kết quả của
+        _chuan_bi_tim_kiem() cho nhiều lượt duyệt (các phần việc khi tìm song song).
+        Bảng nogood được dùng chung: mỗi mục ghi một trạng thái đã duyệt hết mà không có TKB, đúng với
+        mọi lượt duyệt trên cùng danh sách môn.
+        """
+        ban_sao = copy.copy(self)
+        ban_sao.thong_ke = thong_ke
+        ban_sao.lich = []
+        ban_sao.so_lop_theo_mon = defaultdict(int)
+        ban_sao._id_trong_lich = set()
+        ban_sao._hoan_tac = []
+        ban_sao.cac_o = []
+        ban_sao.mien = list(self.mien)
+        ban_sao.mask_cac_muc = []
+        ban_sao.loc_nhanh = ()
+        ban_sao.do_sau_cat = None
+        ban_sao.mon_rong = None
+        return ban_sao
+
+    def co_mon(self, ma_mon):
+        """Môn đã có lớp trong lịch chưa - O(1)"""
+        return self.so_lop_theo_mon[ma_mon] > 0
+
+    def co_lop(self, lop):
+        """Lớp (đúng object) đã có trong lịch chưa - O(1)"""
+        return id(lop) in self._id_trong_lich
+
+    def push(self, lop, mask_lop):
+        """Thêm lớp vào lịch và cập nhật toàn bộ trạng thái - O(1)"""
+        self._hoan_tac.append(self.mask)
+        self.lich.append(lop)
+        self.mask |= mask_lop
+        self._id_trong_lich.add(id(lop))
+        self.so_lop_theo_mon[lop.ma_mon] += 1
+
+    def xep_duoc_lop_ngoai(self, goi):
+        """Các lớp ràng buộc thuộc môn khác của gói không trùng lịch (lớp đã có trong lịch thì bỏ qua)"""
+        for lop, mask in goi.ngoai:
+            if self.mask & mask and not self.co_lop(lop):
+                return False
+        return True
+
+    def push_goi(self, goi):
+        """
+        Thêm tất cả lớp của gói chưa có trong lịch và ghi ô tương ứng của mẫu TKB
+        (hoàn tác bằng hoan_tac_goi)
+        """
+        if not goi.ngoai:
+            for lop, mask in goi.cac_lop:
+                self.push(lop, mask)
+            self.cac_o.append(goi.phuong_an)
+            return
+        da_them = []
+        for lop, mask in goi.cac_lop:
+            if id(lop) not in self._id_trong_lich:
+                self.push(lop, mask)
+                da_them.append(lop)
+        self.cac_o.append((tuple(da_them),))
+
+    def hoan_tac_goi(self, moc):
+        """Hoàn tác lần push_goi sau mốc `moc`"""
+        self.hoan_tac_ve(moc)
+        self.cac_o.pop()
+
+    def pop(self):
+        """Hoàn tác lần push gần nhất - O(1)"""
+        lop = self.lich.pop()
+        self.mask = self._hoan_tac.pop()
+        self._id_trong_lich.discard(id(lop))
+        self.so_lop_theo_mon[lop.ma_mon] -= 1
+
+    def danh_dau(self):
+        """Trả về mốc hiện tại của undo stack"""
+        return len(self._hoan_tac)
+
+    def hoan_tac_ve(self, moc):
+        """Hoàn tác tất cả các lần push sau mốc `moc`"""
+        while len(self._hoan_tac) > moc:
+            self.pop()
+
+
+def _tim_mon_dich_rang_buoc(danh_sach_mon):
     """
-    Hàm đệ quy để tìm tất cả các thời khóa biểu hợp lệ
-    
+    Tìm tập mã môn (trong các môn được chọn) có thể được phủ bởi lớp ràng buộc của một môn khác.
+    Những môn này không được coi là "hết lựa chọn" khi không còn gói lớp khả thi,
+    vì lớp của chúng vẫn có thể được thêm vào qua ràng buộc.
+    """
+    ma_mon_duoc_chon = {mon.ma_mon for mon in danh_sach_mon}
+    return frozenset(
+        lop.ma_mon
+        for mon in danh_sach_mon
+        for goi in mon.cac_goi
+        for lop, _ in goi.ngoai
+        if lop.ma_mon in ma_mon_duoc_chon
+    )
+
+
+def _khoa_thu_tu_mon(mon, trang_thai):
+    """
+    Khóa sắp xếp "ít lựa chọn nhất trước" (most-constrained-first) theo kích thước miền.
+    Môn bắt buộc luôn được xếp trước các môn còn lại.
+    Môn không có lớp, hoặc môn hết lớp khả thi nhưng còn có thể được phủ qua ràng buộc,
+    được đẩy xuống cuối nhóm để không cắt nhầm nhánh.
+    """
+    nhom = 0 if mon.bat_buoc else 1
+    if not mon.cac_lop:
+        return (nhom, 2, 0)
+    so_lop_kha_thi = _dem_bit(trang_thai.mien[mon.chi_so])
+    if so_lop_kha_thi == 0 and mon.ma_mon in trang_thai.dich_rang_buoc:
+        return (nhom, 1, 0)
+    return (nhom, 0, so_lop_kha_thi)
+
+
+def _sap_xep_mon_hoc(danh_sach_mon, trang_thai):
+    """
+    Sắp xếp tĩnh các môn theo số lớp khả thi sau khi lọc giờ bận (ít nhất trước).
+    Sắp xếp ổn định: các môn cùng số lớp giữ nguyên thứ tự ban đầu.
+    """
+    return sorted(danh_sach_mon, key=lambda mon: _khoa_thu_tu_mon(mon, trang_thai))
+
+
+def _loc_mien_con_lai(danh_sach_mon, mon_hoc_index, trang_thai, mask_moi):
+    """
+    Forward checking: lọc miền của các môn chưa xếp theo các tiết vừa bị chiếm (mask_moi).
+    Nếu có ràng buộc hình dạng phụ thuộc lịch: cắt nhánh khi lịch hiện tại đã vi phạm, và khi đã
+    dùng hết số ngày tối đa thì loại các gói chạm vào ngày chưa dùng.
+
+    Returns:
+        Danh sách miền mới, hoặc None nếu có môn bị rỗng miền (nhánh chắc chắn không có kết quả)
+    """
+    mask_ngay_cam = 0
+    rang_buoc = trang_thai.rang_buoc
+    if rang_buoc is not None:
+        mask_lop = trang_thai.mask & ~trang_thai.mask_nen
+        if rang_buoc.vi_pham(mask_lop):
+            trang_thai.mon_rong = None
+            return None
+        mask_ngay_cam = rang_buoc.mask_ngay_khong_dung(mask_lop)
+
+    mien_moi = list(trang_thai.mien)
+    for j in range(mon_hoc_index + 1, len(danh_sach_mon)):
+        mon = danh_sach_mon[j]
+        if not mon.cac_lop or trang_thai.co_mon(mon.ma_mon):
+            continue
+        mien = mien_moi[mon.chi_so] & ~mon.lop_xung_dot(mask_moi)
+        if mask_ngay_cam:
+            mien &= ~mon.lop_xung_dot(mask_ngay_cam)
+        if not mien and mon.ma_mon not in trang_thai.dich_rang_buoc:
+            trang_thai.mon_rong = mon
+            return None
+        mien_moi[mon.chi_so] = mien
+    return mien_moi
+
+
+def _cac_muc_xung_dot(trang_thai, mon, so_muc):
+    """
+    Tập các mức phân nhánh (bitset theo mức, chỉ xét so_muc mức đầu) có thể đã loại gói lớp khỏi miền
+    của môn: các mức đã chiếm tiết nằm trong miền ban đầu của môn. Giữ nguyên lựa chọn ở các mức này
+    thì môn vẫn mất đúng các gói đó, dù các mức khác chọn gì.
+    Khi không nhảy lui được (hoặc mon là None) trả về mọi mức, tức là quay lui tuần tự như thường.
+    """
+    if not trang_thai.nhay_lui or mon is None:
+        return (1 << so_muc) - 1
+    mask_mien = trang_thai.mask_mien_goc[mon.chi_so]
+    cac_muc = 0
+    for muc in range(so_muc):
+        if trang_thai.mask_cac_muc[muc] & mask_mien:
+            cac_muc |= 1 << muc
+    return cac_muc
+
+
+def _khoa_nogood(trang_thai):
+    """
+    Khóa của trạng thái hiện tại trong bảng nogood. Không có ràng buộc chéo môn hay ràng buộc hình dạng
+    thì miền của các môn còn lại quyết định toàn bộ cây con (giống BoDemTKB._khoa()), ngược lại cần
+    mask các tiết đã chiếm và các lớp đích ràng buộc đã có trong lịch.
+    """
+    con_lai = trang_thai.con_lai
+    if trang_thai.id_lop_dich or trang_thai.rang_buoc is not None:
+        return (con_lai, trang_thai.mask, frozenset(trang_thai.id_lop_dich & trang_thai._id_trong_lich))
+    return (con_lai,) + tuple(mien for k, mien in enumerate(trang_thai.mien) if (con_lai >> k) & 1)
+
+
+def _ghi_nogood(trang_thai, khoa):
+    """Ghi trạng thái không có kết quả vào bảng nogood, bỏ trạng thái lâu không dùng nhất khi đầy"""
+    nogood = trang_thai.nogood
+    nogood[khoa] = True
+    if len(nogood) > NOGOOD_CACHE_SIZE:
+        nogood.popitem(last=False)
+
+
+def _lan_truyen_cung(danh_sach_mon, trang_thai):
+    """
+    Tiền xử lý kiểu AC-3 trên miền ban đầu: loại gói lớp trùng giờ với mọi gói còn lại của một môn
+    khác (gói đó không bao giờ nằm trong TKB hoàn chỉnh), lặp tới khi không loại được thêm.
+    Chỉ các môn luôn phải tự chọn gói (không thể được phủ qua lớp ràng buộc) mới dùng làm môn
+    đối chiếu; chỉ so mask cùng môn của gói nên không bao giờ loại nhầm.
+
+    Returns:
+        List (mon, ma_mon_xung_dot) các môn bị rỗng miền, ma_mon_xung_dot là None nếu miền đã
+        rỗng từ đầu (giờ bận, ràng buộc, bộ lọc); rỗng nếu không phát hiện môn nào không xếp được
+    """
+    mien = trang_thai.mien
+    cac_mon = [mon for mon in danh_sach_mon if mon.cac_lop]
+    doi_chieu = [mon for mon in cac_mon if mon.ma_mon not in trang_thai.dich_rang_buoc]
+    rong = [(mon, None) for mon in doi_chieu if not mien[mon.chi_so]]
+    if rong:
+        return rong
+
+    hang = deque((mon, khac) for khac in doi_chieu for mon in cac_mon if mon is not khac)
+    trong_hang = set((mon.chi_so, khac.chi_so) for mon, khac in hang)
+    while hang:
+        mon, khac = hang.popleft()
+        trong_hang.discard((mon.chi_so, khac.chi_so))
+        mien_khac = mien[khac.chi_so]
+        con_lai = mien[mon.chi_so]
+        bo = 0
+        while con_lai:
+            bit = con_lai & -con_lai
+            con_lai ^= bit
+            goi = mon.cac_goi[bit.bit_length() - 1]
+            if not mien_khac & ~khac.lop_xung_dot(goi.mask):
+                bo |= bit
+        if not bo:
+            continue
+        mien[mon.chi_so] &= ~bo
+        if mon.ma_mon in trang_thai.dich_rang_buoc:
+            continue  # Môn có thể được phủ qua ràng buộc: không dùng để đối chiếu, rỗng miền cũng không sao
+        if not mien[mon.chi_so]:
+            return [(mon, khac.ma_mon)]
+        # Miền của môn nhỏ lại: các môn khác cần đối chiếu lại với nó
+        for mon_khac in cac_mon:
+            cap = (mon_khac.chi_so, mon.chi_so)
+            if mon_khac is not mon and cap not in trong_hang:
+                trong_hang.add(cap)
+                hang.append((mon_khac, mon))
+    return []
+
+
+def _chon_mon_tiep_theo(danh_sach_mon, mon_hoc_index, trang_thai):
+    """
+    Chọn động (MRV): trong các môn còn lại chưa có lớp trong lịch, trả về chỉ số
+    của môn có ít lớp còn tương thích nhất (môn bắt buộc được ưu tiên trước). Trả về mon_hoc_index nếu không có môn nào cần chọn.
+    """
+    chon = mon_hoc_index
+    khoa_tot_nhat = None
+    for i in range(mon_hoc_index, len(danh_sach_mon)):
+        mon = danh_sach_mon[i]
+        if trang_thai.co_mon(mon.ma_mon):
+            continue
+        khoa = _khoa_thu_tu_mon(mon, trang_thai)
+        if khoa_tot_nhat is None or khoa < khoa_tot_nhat:
+            chon, khoa_tot_nhat = i, khoa
+            if khoa[1:] == (0, 0):
+                break  # Không thể tốt hơn: nhánh này sẽ bị cắt ngay
+    return chon
+
+
+class _KhungTimKiem:
+    """
+    Một khung trên ngăn xếp của _tim_kiem_lap(): nút đang xét môn thứ `i` của danh sách.
+    Nút bỏ qua (môn không có lớp hoặc đã được phủ qua ràng buộc) chỉ cần nhớ để hoàn tác hoán đổi
+    và con_lai; nút phân nhánh giữ thêm con trỏ gói (các bit gói chưa duyệt) và kết quả gộp của các nhánh.
+    """
+
+    __slots__ = ('i', 'chon', 'mon', 'bit_mon', 'phan_nhanh', 'con_lai', 'nhanh', 'khoa', 'bi_gioi_han',
+                 'muc', 'bit_muc', 'xung_dot', 'nhay_lui', 'moc', 'mien_cu')
+
+    def __init__(self, i, chon, mon, phan_nhanh):
+        self.i = i
+        self.chon = chon
+        self.mon = mon
+        self.bit_mon = 1 << mon.chi_so
+        self.phan_nhanh = phan_nhanh
+
+
+def _tim_kiem_lap(danh_sach_mon, trang_thai):
+    """
+    Generator: yield từng mẫu thời khóa biểu (MauTKB) hợp lệ ngay khi tìm được.
+
+    Duyệt theo chiều sâu bằng ngăn xếp khung tường minh (_KhungTimKiem) thay vì đệ quy, nên mỗi nút
+    không tốn một lần gọi hàm/tạo generator và kết quả không phải chuyển qua từng tầng yield from.
+    Thứ tự duyệt, số nút và các điểm dừng giống hệt bản đệ quy trước đây:
+    - mỗi lần vào một nút (kể cả nút bỏ qua và nút lá) tính là một nút; timeout/hủy/ngân sách nút
+      được kiểm tra mỗi _CHU_KY_KIEM_TRA nút
+    - thong_ke.nhanh được cập nhật như trước để ước lượng tiến độ và chia việc khi tìm song song
+
+    Mỗi nút trả về cho nút cha (biến tra_ve) None nếu cây con có kết quả hoặc chưa duyệt hết, hoặc
+    bitset các mức phân nhánh phía trên gây ra thất bại của cây con. Mức cha không nằm trong tập này
+    thì mọi lựa chọn khác ở mức cha cũng thất bại y hệt, nên bỏ qua luôn các nhánh anh em (nhảy lui
+    thẳng về mức sâu nhất có trong tập) và ghi trạng thái vào bảng nogood.
+
     Args:
-        danh_sach_mon_hoc: Danh sách môn học
-        mon_hoc_index: Chỉ số môn học hiện tại
-        lich_hien_tai: Lịch hiện tại đang xây dựng
-        ket_qua: Danh sách kết quả (sẽ được cập nhật)
-        danh_sach_gio_ban: Danh sách giờ bận
-        all_courses: Dictionary tất cả môn học
-        max_results: Số lượng kết quả tối đa (None = không giới hạn)
-        start_time: Thời gian bắt đầu tìm kiếm (để tính timeout)
-        timeout: Timeout tính bằng giây (None = không timeout)
-    """
-    # Kiểm tra timeout
-    if timeout and start_time:
-        elapsed = time.time() - start_time
-        if elapsed > timeout:
-            return  # Dừng khi hết thời gian
-    
-    # Kiểm tra giới hạn số lượng kết quả
-    if max_results and len(ket_qua) >= max_results:
-        return  # Dừng khi đạt giới hạn
-    
-    if mon_hoc_index == len(danh_sach_mon_hoc):
-        # Sử dụng tuple thay vì list để tiết kiệm memory
-        # Tuple nhẹ hơn list và immutable (phù hợp vì TKB không thay đổi sau khi tìm được)
-        ket_qua.append(tuple(lich_hien_tai))
-        return
+        danh_sach_mon: Danh sách môn học đã biên dịch (_MonBienDich)
+        trang_thai: _TrangThaiTimKiem chứa lịch đang xây dựng, bitmask, miền ứng viên và các bộ đếm
+    """
+    thong_ke = trang_thai.thong_ke
+    so_mon = len(danh_sach_mon)
+    nogood = trang_thai.nogood
+    mask_cac_muc = trang_thai.mask_cac_muc
+    ngan_xep = []
+    i = 0
+    while True:
+        # ---- Vào nút đang xét môn thứ i: phân nhánh (đẩy khung mới) hoặc có ngay giá trị tra_ve ----
+        khung = None
+        thong_ke.so_nut += 1
+        if not thong_ke.so_nut % _CHU_KY_KIEM_TRA and thong_ke.kiem_tra_dung():
+            tra_ve = None
+        elif i == so_mon:
+            # Môn bắt buộc ngoài danh sách phải đã được thêm qua ràng buộc
+            if all(trang_thai.co_mon(ma_mon) for ma_mon in trang_thai.bat_buoc_ngoai):
+                # Mỗi kết quả là một mẫu TKB: các TKB cụ thể chỉ được tạo khi cần (xem MauTKB)
+                thong_ke.so_ket_qua += 1
+                yield MauTKB(tuple(trang_thai.cac_o),
+                             not trang_thai.id_lop_dich.isdisjoint(trang_thai._id_trong_lich))
+                tra_ve = None
+            else:
+                tra_ve = (1 << len(mask_cac_muc)) - 1
+        elif len(thong_ke.nhanh) == trang_thai.do_sau_cat:
+            # Chế độ chia việc (tìm kiếm song song): không đi sâu hơn, trả về cây con như một phần việc
+            yield thong_ke.phan_viec_hien_tai()
+            tra_ve = None
+        else:
+            if trang_thai.sap_xep_dong:
+                # Đưa môn ít lựa chọn nhất lên vị trí hiện tại (hoán đổi, khôi phục khi rời nút)
+                chon = _chon_mon_tiep_theo(danh_sach_mon, i, trang_thai)
+            else:
+                chon = i
+            danh_sach_mon[i], danh_sach_mon[chon] = danh_sach_mon[chon], danh_sach_mon[i]
+            mon = danh_sach_mon[i]
+
+            if not mon.cac_lop or trang_thai.co_mon(mon.ma_mon):
+                # Bỏ qua môn không có lớp, hoặc môn đã có lớp trong lịch (do được thêm như một lớp ràng buộc)
+                khung = _KhungTimKiem(i, chon, mon, False)
+                trang_thai.con_lai &= ~khung.bit_mon
+                ngan_xep.append(khung)
+                i += 1
+                continue
+
+            muc = len(mask_cac_muc)
+            # Trạng thái đã chứng minh không có TKB (tới từ một đường đi khác): bỏ qua cả cây con
+            khoa = _khoa_nogood(trang_thai)
+            if khoa in nogood:
+                nogood.move_to_end(khoa)
+                danh_sach_mon[i], danh_sach_mon[chon] = danh_sach_mon[chon], danh_sach_mon[i]
+                tra_ve = (1 << muc) - 1
+            else:
+                khung = _KhungTimKiem(i, chon, mon, True)
+                khung.khoa = khoa
+                khung.muc = muc
+                khung.bit_muc = 1 << muc
+                # Chỉ duyệt các gói còn trong miền (đã loại gói trùng giờ bận và trùng các lớp đã xếp)
+                mien = trang_thai.mien[mon.chi_so]
+                muc_nhanh = len(thong_ke.nhanh)
+                khung.bi_gioi_han = muc_nhanh < len(trang_thai.loc_nhanh)
+                if khung.bi_gioi_han:
+                    # Phần việc con chỉ duyệt các nhánh được giao ở những mức đầu
+                    mien &= trang_thai.loc_nhanh[muc_nhanh]
+                khung.con_lai = mien
+                # Ghi nhận [số nhánh đã xong, tổng số nhánh, gói đang duyệt] để ước lượng tiến độ/chia việc
+                khung.nhanh = [0, _dem_bit(mien), -1]
+                thong_ke.nhanh.append(khung.nhanh)
+                trang_thai.con_lai &= ~khung.bit_mon
+                # Hợp các mức gây thất bại của từng nhánh (None khi đã có nhánh có kết quả)
+                khung.xung_dot = 0
+                khung.nhay_lui = False
+                ngan_xep.append(khung)
+                tra_ve = None
+
+        # ---- Đi tiếp: duyệt gói kế tiếp của khung trên đỉnh, hoặc rời khung và trả tra_ve cho khung cha ----
+        while True:
+            if khung is None:
+                # Vừa có giá trị của một nút con: trả về cho khung trên đỉnh ngăn xếp
+                if not ngan_xep:
+                    return
+                khung = ngan_xep[-1]
+                if not khung.phan_nhanh:
+                    # Nút bỏ qua: chuyển nguyên giá trị lên trên
+                    ngan_xep.pop()
+                    trang_thai.con_lai |= khung.bit_mon
+                    danh_sach_mon[khung.i], danh_sach_mon[khung.chon] = danh_sach_mon[khung.chon], danh_sach_mon[khung.i]
+                    khung = None
+                    continue
+                trang_thai.mien = khung.mien_cu
+                if _xong_nhanh(khung, tra_ve, trang_thai):
+                    khung.con_lai = 0
+
+            # Tìm gói kế tiếp còn trong miền (theo thứ tự chỉ số tăng dần)
+            nhanh = khung.nhanh
+            mon = khung.mon
+            di_xuong = False
+            while khung.con_lai:
+                bit = khung.con_lai & -khung.con_lai
+                khung.con_lai ^= bit
+                j = bit.bit_length() - 1
+                goi = mon.cac_goi[j]
+                nhanh[2] = j
+
+                # Lớp ràng buộc thuộc môn khác không nằm trong mask lọc miền, kiểm tra riêng
+                if goi.ngoai and not trang_thai.xep_duoc_lop_ngoai(goi):
+                    nhanh[0] += 1
+                    if khung.xung_dot is not None:
+                        khung.xung_dot |= khung.bit_muc - 1
+                    continue
+
+                # Thêm cả gói (lớp chính và các lớp ràng buộc) vào lịch
+                khung.moc = trang_thai.danh_dau()
+                mask_truoc = trang_thai.mask
+                trang_thai.push_goi(goi)
+                mask_moi = trang_thai.mask & ~mask_truoc
+                mask_cac_muc.append(mask_moi)
+                # Lọc miền các môn còn lại; nếu có môn rỗng miền thì bỏ cả nhánh ngay
+                mien_moi = _loc_mien_con_lai(danh_sach_mon, khung.i, trang_thai, mask_moi)
+                if mien_moi is not None:
+                    khung.mien_cu = trang_thai.mien
+                    trang_thai.mien = mien_moi
+                    di_xuong = True
+                    break
+                if _xong_nhanh(khung, _cac_muc_xung_dot(trang_thai, trang_thai.mon_rong, khung.muc + 1),
+                               trang_thai):
+                    khung.con_lai = 0
+            if di_xuong:
+                i = khung.i + 1
+                break
+
+            # Hết gói: rời nút phân nhánh
+            ngan_xep.pop()
+            thong_ke.nhanh.pop()
+            trang_thai.con_lai |= khung.bit_mon
+            tra_ve = khung.xung_dot
+            if tra_ve is not None:
+                if khung.nhay_lui:
+                    _ghi_nogood(trang_thai, khung.khoa)
+                elif khung.bi_gioi_han:
+                    # Chỉ duyệt một phần các gói (phần việc): chưa chứng minh được cây con không có TKB,
+                    # nên không để các mức trên nhảy lui hay ghi nogood dựa trên kết quả này
+                    tra_ve = None
+                else:
+                    # Miền của môn chỉ còn các gói trên vì các mức trước đã chiếm tiết của những gói khác
+                    tra_ve |= _cac_muc_xung_dot(trang_thai, mon, khung.muc)
+                    _ghi_nogood(trang_thai, khung.khoa)
+            danh_sach_mon[khung.i], danh_sach_mon[khung.chon] = danh_sach_mon[khung.chon], danh_sach_mon[khung.i]
+            khung = None
+
+
+def _xong_nhanh(khung, xung_dot_nhanh, trang_thai):
+    """
+    Hoàn tác gói vừa duyệt của khung phân nhánh và gộp kết quả của nhánh đó.
+
+    Returns:
+        True nếu không cần duyệt các gói còn lại (tìm kiếm phải dừng, hoặc nhảy lui)
+    """
+    trang_thai.mask_cac_muc.pop()
+    trang_thai.hoan_tac_goi(khung.moc)
+    khung.nhanh[0] += 1
+    if trang_thai.thong_ke.da_dung:
+        khung.xung_dot = None
+        return True
+    if xung_dot_nhanh is None:
+        khung.xung_dot = None
+    elif khung.xung_dot is not None:
+        if not xung_dot_nhanh & khung.bit_muc:
+            # Thất bại không phụ thuộc lựa chọn ở mức này: các gói còn lại cũng thất bại y hệt
+            khung.xung_dot, khung.nhay_lui = xung_dot_nhanh, True
+            return True
+        khung.xung_dot |= xung_dot_nhanh & ~khung.bit_muc
+    return False
+
+
+class MauTKB(Sequence):
+    """
+    Mẫu thời khóa biểu: một TKB xác định về giờ học, mỗi ô là các phương án (tuple LopHoc)
+    cùng giờ nhưng khác giáo viên/phòng. Mẫu đóng vai trò danh sách các TKB cụ thể
+    (tích Descartes các phương án), TKB thứ k chỉ được tạo khi truy cập.
+
+    co_the_trung: mẫu có lớp là đích ràng buộc chéo môn. Lớp đó có thể vào lịch qua môn của nó hoặc
+    qua ràng buộc (môn đã có lớp thì bị bỏ qua), nên cùng một tập lớp có thể được tìm thấy theo nhiều
+    đường khác nhau; chỉ những mẫu này mới cần kiểm tra trùng (xem DanhSachTKB.them())
+
+    Số TKB cụ thể (so_tkb) có thể vượt quá sys.maxsize khi nhiều môn có nhiều lớp cùng giờ; len() chỉ
+    nhận số nguyên cỡ C nên bị chặn ở sys.maxsize, mọi TKB vẫn truy cập được theo chỉ số.
+    """
+
+    __slots__ = ('cac_o', '_so_tkb', 'co_the_trung')
+
+    def __init__(self, cac_o, co_the_trung=False):
+        self.cac_o = cac_o
+        self.co_the_trung = co_the_trung
+        so_tkb = 1
+        for o in cac_o:
+            so_tkb *= len(o)
+        self._so_tkb = so_tkb
+
+    @property
+    def so_tkb(self):
+        """Số TKB cụ thể của mẫu (số nguyên Python, không giới hạn)"""
+        return self._so_tkb
+
+    def __len__(self):
+        return min(self._so_tkb, sys.maxsize)
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self._so_tkb
+        if not 0 <= k < self._so_tkb:
+            raise IndexError("Chỉ số TKB ngoài phạm vi")
+        # Giải mã k theo hệ cơ số hỗn hợp (ô cuối thay đổi nhanh nhất)
+        chon = [0] * len(self.cac_o)
+        for j in range(len(self.cac_o) - 1, -1, -1):
+            k, chon[j] = divmod(k, len(self.cac_o[j]))
+        return tuple(lop for o, c in zip(self.cac_o, chon) for lop in o[c])
+
+    def __iter__(self):
+        for to_hop in product(*self.cac_o):
+            yield tuple(chain.from_iterable(to_hop))
+
+
+def _khoa_chuan_mau(cac_o):
+    """
+    Khóa chuẩn của mẫu TKB để phát hiện mẫu trùng: hash 64 bit các lớp (theo id, sắp tăng dần) trong
+    phương án đầu của các ô. Các mẫu trùng nhau có cùng tập lớp này (ô gộp nhiều phương án không chứa
+    lớp ràng buộc nên luôn là cùng một ô), dù các lớp được chia vào các ô khác nhau
+    """
+    return hash(tuple(sorted(id(lop) for o in cac_o for lop in o[0])))
+
+
+class DanhSachTKB(Sequence):
+    """
+    Danh sách kết quả tìm TKB: lưu các mẫu (MauTKB) nhưng dùng như danh sách các TKB cụ thể
+    (len, index, lặp). TKB cụ thể được triển khai khi truy cập, nên giữ được rất nhiều TKB.
+
+    Các mẫu được lưu gọn dưới dạng số nguyên thay vì tuple các đối tượng: mỗi ô khác nhau (tuple các
+    phương án LopHoc) được đưa vào danh mục một lần, mỗi mẫu chỉ là một đoạn chỉ số ô liên tiếp trong
+    một array('H') chung (2 byte mỗi ô). MauTKB và LopHoc chỉ được dựng lại khi một TKB được truy cập
+    (hiển thị, lưu file), nên hàng triệu mẫu chỉ tốn vài chục MB.
+
+    Các tiết học của từng mẫu cũng được lưu, mỗi ngày 2 byte trong một array('H') chung, để lọc/sắp
+    xếp lại kết quả theo hình dạng TKB mà không phải tìm lại (xem refinement.py).
+    Mẫu trùng với một mẫu đã có (cùng tập lớp, tìm thấy theo đường khác qua ràng buộc chéo môn) bị bỏ
+    ngay khi thêm: mỗi mẫu có thể trùng được quy về khóa chuẩn là hash 64 bit của các lớp (theo id,
+    sắp tăng dần) rồi tra trong một set, nên so_mau luôn là số mẫu khác nhau.
+    Tổng số TKB cụ thể là so_tkb (số nguyên Python); như MauTKB, len() bị chặn ở sys.maxsize.
+    tap_con() tạo một danh sách con (mẫu được chọn theo thứ tự bất kỳ, ô có thể bớt phương án) dùng
+    chung dữ liệu với danh sách gốc; không thêm mẫu vào danh sách con.
+    """
+
+    def __init__(self, cac_mau=()):
+        # Danh mục các ô; ô được tra theo id (ô dùng chung của gói lớp) rồi mới theo giá trị
+        self._danh_muc_o = []
+        self._mask_o = []           # Các tiết học của từng ô, mỗi ngày 16 bit (xem _gian_mask_ngay())
+        self._chi_so_theo_id = {}
+        self._chi_so_theo_o = {}
+        self._o = array('H')        # Chỉ số ô của mọi mẫu, nối liền nhau
+        self._ranh_gioi = array('I', [0])  # Mẫu j gồm các ô _o[_ranh_gioi[j]:_ranh_gioi[j + 1]]
+        self._ngay = array('H')     # Tiết học thứ MIN_THU + d của mẫu j: _ngay[j * _SO_O_NGAY + d]
+        self._dau = array('Q')      # Chỉ số TKB cụ thể đầu tiên của từng mẫu (list khi vượt 64 bit)
+        self._so_tkb = 0
+        # Khóa chuẩn của các mẫu có thể trùng đã thêm (xem them()), None = chưa tính (danh sách được
+        # dựng lại từ tu_du_lieu_gon(), id các lớp đã khác lúc lưu)
+        self._khoa_mau = set()
+        # Danh sách con: chỉ số (trong dữ liệu gốc) của từng mẫu được chọn, None = danh sách gốc
+        self._chon = None
+        self._bang_ngay = None
+        # Các cột chỉ số đã tính (cot_da_tinh()): {tên: (so_mau lúc tính, array)}
+        self._cot_chi_so = {}
+        self.mo_rong(cac_mau)
+
+    @classmethod
+    def tu_cac_tkb(cls, cac_tkb):
+        """
+        DanhSachTKB từ các TKB cụ thể (ví dụ kết quả chế độ Tốt nhất/Pareto/Ngẫu nhiên):
+        các lớp cùng môn của mỗi TKB là một ô chỉ có một phương án
+        """
+        danh_sach = cls()
+        for tkb in cac_tkb:
+            theo_mon = {}
+            for lop in tkb:
+                theo_mon.setdefault(lop.ma_mon, []).append(lop)
+            danh_sach.them(MauTKB(tuple((tuple(cac_lop),) for cac_lop in theo_mon.values())))
+        return danh_sach
+
+    def _chi_so_o(self, o):
+        """Chỉ số của ô trong danh mục, thêm mới nếu chưa có"""
+        chi_so = self._chi_so_theo_id.get(id(o))
+        if chi_so is not None:
+            return chi_so
+        chi_so = self._chi_so_theo_o.get(o)
+        if chi_so is None:
+            chi_so = len(self._danh_muc_o)
+            self._danh_muc_o.append(o)
+            # Các phương án của một ô luôn cùng giờ học nên mask lấy theo phương án đầu
+            mask = 0
+            for lop in o[0]:
+                mask |= _mask_lop(lop)
+            self._mask_o.append(_gian_mask_ngay(mask))
+            self._chi_so_theo_o[o] = chi_so
+            if chi_so > 0xFFFF and self._o.typecode == 'H':
+                self._o = array('I', self._o)
+            # Chỉ nhớ theo id khi danh mục giữ chính object này (id không bị dùng lại)
+            self._chi_so_theo_id[id(o)] = chi_so
+        return chi_so
+
+    def them(self, mau):
+        """
+        Thêm một mẫu vào cuối danh sách.
+
+        Returns:
+            False nếu mẫu trùng với một mẫu đã có (không được thêm)
+        """
+        if self._chon is not None:
+            raise TypeError("Không thêm mẫu vào danh sách con của DanhSachTKB")
+        if mau.co_the_trung:
+            # Danh mục giữ các lớp nên id không đổi trong suốt đời danh sách
+            if self._khoa_mau is None:
+                self._khoa_mau = {_khoa_chuan_mau(self.mau_thu(j).cac_o) for j in range(self.so_mau)}
+            khoa = _khoa_chuan_mau(mau.cac_o)
+            if khoa in self._khoa_mau:
+                return False
+            self._khoa_mau.add(khoa)
+        try:
+            # Đường nhanh: mọi ô đều đã có trong danh mục theo id (tra cứu trong vòng lặp C)
+            chi_so = list(map(self._chi_so_theo_id.__getitem__, map(id, mau.cac_o)))
+        except KeyError:
+            chi_so = [self._chi_so_o(o) for o in mau.cac_o]
+        self._o.extend(chi_so)
+        self._ranh_gioi.append(len(self._o))
+        # Các ô của một TKB không bao giờ trùng tiết nên cộng các mask cũng là OR (sum nhanh hơn reduce)
+        mask = sum(map(self._mask_o.__getitem__, chi_so))
+        self._ngay.frombytes(mask.to_bytes(2 * _SO_O_NGAY, sys.byteorder))
+        if self._so_tkb > _Q_TOI_DA and isinstance(self._dau, array):
+            self._dau = list(self._dau)
+        self._dau.append(self._so_tkb)
+        self._so_tkb += mau.so_tkb
+        return True
+
+    def mo_rong(self, cac_mau):
+        for mau in cac_mau:
+            self.them(mau)
+
+    def du_lieu_gon(self, chi_so_lop):
+        """
+        Toàn bộ dữ liệu của danh sách dưới dạng số nguyên, để lưu lại rồi dựng lại bằng tu_du_lieu_gon()
+        (xem search_cache.py).
+
+        Args:
+            chi_so_lop: {id(lop): chỉ số} của mọi lớp có trong các mẫu
+
+        Returns:
+            Tuple (danh_muc_o, cac_array, so_tkb): danh_muc_o là các ô dưới dạng list các phương án
+            (list chỉ số lớp); cac_array là các array chỉ số ô, ranh giới, tiết học và TKB đầu của các mẫu
+        """
+        if self._chon is not None:
+            raise TypeError("Không lưu danh sách con của DanhSachTKB")
+        if not isinstance(self._dau, array):
+            raise ValueError("Số TKB vượt quá 64 bit, không lưu gọn được")
+        danh_muc_o = [[[chi_so_lop[id(lop)] for lop in phuong_an] for phuong_an in o] for o in self._danh_muc_o]
+        return danh_muc_o, (self._o, self._ranh_gioi, self._ngay, self._dau), self._so_tkb
+
+    @classmethod
+    def tu_du_lieu_gon(cls, danh_muc_o, cac_array, so_tkb, danh_muc_lop):
+        """Ngược lại của du_lieu_gon(): danh_muc_lop[i] là lớp có chỉ số i lúc lưu"""
+        danh_sach = cls()
+        for k, o in enumerate(danh_muc_o):
+            o = tuple(tuple(danh_muc_lop[j] for j in phuong_an) for phuong_an in o)
+            if danh_sach._chi_so_o(o) != k:
+                raise ValueError("Danh mục ô có ô trùng nhau")
+        danh_sach._o, danh_sach._ranh_gioi, danh_sach._ngay, danh_sach._dau = cac_array
+        danh_sach._so_tkb = so_tkb
+        danh_sach._khoa_mau = None
+        return danh_sach
+
+    @property
+    def so_mau(self):
+        """Số mẫu TKB (số TKB khác nhau về giờ học)"""
+        return len(self._dau)
+
+    @property
+    def so_tkb(self):
+        """Tổng số TKB cụ thể (số nguyên Python, không giới hạn)"""
+        return self._so_tkb
+
+    def _chi_so_goc(self, j):
+        """Chỉ số trong dữ liệu gốc của mẫu thứ j"""
+        return j if self._chon is None else self._chon[j]
+
+    def mau_thu(self, j):
+        """Mẫu TKB thứ j (MauTKB dựng lại từ danh mục ô)"""
+        j = self._chi_so_goc(j)
+        danh_muc = self._danh_muc_o
+        return MauTKB(tuple(danh_muc[k] for k in self._o[self._ranh_gioi[j]:self._ranh_gioi[j + 1]]))
+
+    @property
+    def danh_muc_o(self):
+        """Danh mục các ô (tuple các phương án LopHoc) dùng bởi các mẫu"""
+        return self._danh_muc_o
+
+    def cac_o_theo_mau(self, chon):
+        """Chỉ số trong danh mục các ô của các mẫu `chon` (iterator các lát cắt array)"""
+        o, ranh_gioi = self._o, self._ranh_gioi
+        if self._chon is not None:
+            chon = map(self._chon.__getitem__, chon)
+        return (o[ranh_gioi[j]:ranh_gioi[j + 1]] for j in chon)
+
+    def bang_ngay(self):
+        """
+        Các tiết học từng ngày của mọi mẫu: array('H') gồm _SO_O_NGAY phần tử cho mỗi mẫu theo thứ tự
+        mẫu, phần tử d (d < _SO_NGAY) là bitmask (bit t = tiết MIN_TIET + t) của thứ MIN_THU + d.
+        Danh sách con phải chọn lại theo thứ tự mẫu của nó nên bảng được tính một lần rồi nhớ lại.
+        """
+        if self._chon is None:
+            return self._ngay
+        if self._bang_ngay is None:
+            # Mỗi mẫu đúng bằng _SO_O_NGAY // 4 số 64 bit: chọn lại theo từng số 64 bit
+            theo_mau = array('Q', self._ngay.tobytes())
+            so_q = _SO_O_NGAY // 4
+            cac_phan = [theo_mau[k::so_q] for k in range(so_q)]
+            bang = array('Q', chain.from_iterable(zip(*(map(phan.__getitem__, self._chon) for phan in cac_phan))))
+            self._bang_ngay = array('H', bang.tobytes())
+        return self._bang_ngay
+
+    def cot_ngay(self):
+        """Cột các tiết học thứ MIN_THU + d của mọi mẫu (array('H')), d = 0.._SO_NGAY - 1"""
+        bang = self.bang_ngay()
+        return [bang[d::_SO_O_NGAY] for d in range(_SO_NGAY)]
+
+    def cot_da_tinh(self, ten, tinh):
+        """
+        Cột giá trị `ten` của mọi mẫu (xem refinement.cot_chi_so()): lần đầu tính bằng tinh(self)
+        rồi nhớ lại, tính lại khi danh sách đã được thêm mẫu
+        """
+        da_tinh = self._cot_chi_so.get(ten)
+        if da_tinh is not None and da_tinh[0] == self.so_mau:
+            return da_tinh[1]
+        cot = tinh(self)
+        self._cot_chi_so[ten] = (self.so_mau, cot)
+        return cot
+
+    def cot_so_tkb(self):
+        """Số TKB cụ thể của từng mẫu (array('Q') theo thứ tự mẫu, list nếu vượt 64 bit)"""
+        def tinh(danh_sach):
+            dau = danh_sach._dau
+            return _mang_so_tkb(map(sub, chain(islice(dau, 1, None), (danh_sach._so_tkb,)), dau))
+        return self.cot_da_tinh('_so_tkb', tinh)
+
+    def cac_cot_o(self):
+        """
+        Khi mọi mẫu có cùng số ô n (luôn đúng nếu không có ràng buộc lớp chéo môn: mỗi môn một ô):
+        n cột chỉ số ô, cột s là ô thứ s của từng mẫu theo thứ tự mẫu. None nếu số ô khác nhau.
+        """
+        def tinh(danh_sach):
+            o, ranh_gioi = danh_sach._o, danh_sach._ranh_gioi
+            so_mau_goc = len(ranh_gioi) - 1
+            if not so_mau_goc or len(o) % so_mau_goc:
+                return None
+            n = len(o) // so_mau_goc
+            if ranh_gioi != array('I', range(0, len(o) + 1, n)):
+                return None
+            if danh_sach._chon is None:
+                return [o[s::n] for s in range(n)]
+            return [array(o.typecode, map(o[s::n].__getitem__, danh_sach._chon)) for s in range(n)]
+        return self.cot_da_tinh('_o', tinh)
+
+    def tap_con(self, chon, danh_muc_o=None, so_tkb_cac_mau=None):
+        """
+        Danh sách con gồm các mẫu `chon` (chỉ số mẫu trong danh sách này, theo thứ tự mới),
+        dùng chung dữ liệu với danh sách này.
+
+        Args:
+            chon: Các chỉ số mẫu
+            danh_muc_o: Danh mục ô thay thế (cùng chỉ số với danh_muc_o, ô có thể bớt phương án)
+            so_tkb_cac_mau: Số TKB cụ thể của từng mẫu trong danh sách này (tra theo chỉ số mẫu) khi dùng
+                danh mục ô thay thế; mặc định giữ nguyên số TKB của mẫu
+        """
+        chon = array('I', chon)
+        if so_tkb_cac_mau is None:
+            so_tkb_cac_mau = self.cot_so_tkb()
+        so_tkb_cac_mau = map(so_tkb_cac_mau.__getitem__, chon)
+        if self._chon is not None:
+            chon = array('I', map(self._chon.__getitem__, chon))
+
+        con = object.__new__(DanhSachTKB)
+        con.__dict__.update(self.__dict__)
+        con._chon = chon
+        con._bang_ngay = None
+        con._cot_chi_so = {}
+        if danh_muc_o is not None:
+            con._danh_muc_o = danh_muc_o
+        con._dau = _mang_so_tkb(accumulate(chain((0,), so_tkb_cac_mau)))
+        con._so_tkb = con._dau.pop()
+        return con
+
+    def vi_tri_mau(self, index):
+        """Chỉ số của mẫu chứa TKB cụ thể thứ `index`"""
+        return bisect_right(self._dau, index) - 1
+
+    def __len__(self):
+        return min(self._so_tkb, sys.maxsize)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._so_tkb))]
+        if index < 0:
+            index += self._so_tkb
+        if not 0 <= index < self._so_tkb:
+            raise IndexError("Chỉ số TKB ngoài phạm vi")
+        j = self.vi_tri_mau(index)
+        return self.mau_thu(j)[index - self._dau[j]]
+
+    def __iter__(self):
+        for j in range(self.so_mau):
+            yield from self.mau_thu(j)
+
+
+class HuyTimKiem:
+    """
+    Token hủy tìm kiếm, dùng được từ thread khác (ví dụ nút "Hủy" trên giao diện).
+    Engine kiểm tra token theo chu kỳ _CHU_KY_KIEM_TRA nút nên việc hủy có hiệu lực gần như ngay lập tức.
+
+    Args:
+        su_kien: Đối tượng Event dùng chung (ví dụ multiprocessing.Event khi tìm song song),
+            None = tạo threading.Event mới
+    """
+
+    def __init__(self, su_kien=None):
+        self._su_kien = su_kien if su_kien is not None else threading.Event()
+
+    def huy(self):
+        """Yêu cầu dừng tìm kiếm"""
+        self._su_kien.set()
+
+    @property
+    def da_huy(self):
+        return self._su_kien.is_set()
+
+
+class _PhanViec:
+    """
+    Một phần của cây tìm kiếm (dùng khi tìm song song): cố định gói lớp ở các mức phân nhánh đầu
+    theo `tien_to`, và ở mức kế tiếp chỉ duyệt các gói có chỉ số >= `tu`.
+    `bat_dau`/`trong_so` là vị trí và tỉ lệ của phần việc trong toàn bộ cây (để tính tiến độ).
+    """
+
+    __slots__ = ('tien_to', 'tu', 'bat_dau', 'trong_so')
+
+    def __init__(self, tien_to, tu=0, bat_dau=0.0, trong_so=1.0):
+        self.tien_to = tien_to
+        self.tu = tu
+        self.bat_dau = bat_dau
+        self.trong_so = trong_so
+
+    def mask_loc_nhanh(self):
+        """Mask lọc miền theo từng mức phân nhánh (xem _TrangThaiTimKiem.loc_nhanh)"""
+        loc = [1 << i for i in self.tien_to]
+        if self.tu:
+            loc.append(~((1 << self.tu) - 1))
+        return loc
+
+
+class ThongKeTimKiem:
+    """
+    Thống kê của một lượt tìm kiếm TKB, được engine cập nhật trong lúc chạy.
+    Dùng với iter_thoi_khoa_bieu() để biết kết quả cuối cùng (hết giờ hay bị hủy, mất bao lâu)
+    vì generator không trả về giá trị nào khác ngoài các TKB.
+
+    Args:
+        huy: HuyTimKiem (tùy chọn) để dừng tìm kiếm từ bên ngoài
+        bao_tien_do: Hàm (tùy chọn) nhận ThongKeTimKiem, được gọi mỗi _CHU_KY_KIEM_TRA nút
+    """
+
+    def __init__(self, huy=None, bao_tien_do=None):
+        self.bat_dau = time.time()
+        self.ket_thuc = None
+        self.so_nut = 0
+        self.so_ket_qua = 0
+        self.het_gio = False
+        self.da_huy = False
+        self.timeout = None
+        self.huy = huy
+        self.bao_tien_do = bao_tien_do
+        # [số nhánh đã duyệt xong, tổng số nhánh, gói đang duyệt] của từng nút phân nhánh
+        # trên đường đi hiện tại
+        self.nhanh = []
+        # Dùng khi chạy một phần việc (tìm kiếm song song): các mức trước muc_goc là tiền tố cố định
+        # và không tính vào tiến độ; hết ngân sách nút thì dừng và ghi lại phần việc còn lại
+        self.muc_goc = 0
+        self.ngan_sach_nut = None
+        self.het_ngan_sach = False
+        self.phan_con_lai = []
+        # Phần tiến độ đã hoàn thành ở nơi khác (các phần việc chạy trên tiến trình khác)
+        self.tien_do_them = 0.0
+        # Các môn chắc chắn không xếp được, phát hiện khi tiền xử lý (xem _lan_truyen_cung()):
+        # [(ma_mon, ten_mon, ma_mon_xung_dot hoặc None nếu do giờ bận/ràng buộc/bộ lọc)]
+        self.mon_khong_xep_duoc = []
+
+    @property
+    def thoi_gian(self):
+        """Thời gian đã chạy (giây), cố định sau khi tìm kiếm kết thúc"""
+        return (self.ket_thuc or time.time()) - self.bat_dau
+
+    @property
+    def da_dung(self):
+        """Tìm kiếm đã phải dừng (hết giờ, bị hủy hoặc hết ngân sách nút)"""
+        return self.het_gio or self.da_huy or self.het_ngan_sach
+
+    def _vi_tri_muc(self, muc):
+        """
+        Vị trí (bat_dau, trong_so) của cây con đang duyệt tại mức `muc`:
+        phần đã xong trước nó và tỉ lệ của nó, tính lồng nhau từ muc_goc.
+        """
+        bat_dau, trong_so = 0.0, 1.0
+        for da_xong, tong, _ in self.nhanh[self.muc_goc:muc]:
+            if not tong:
+                break
+            bat_dau += trong_so * da_xong / tong
+            trong_so /= tong
+        return bat_dau, trong_so
+
+    @property
+    def tien_do(self):
+        """
+        Ước lượng phần không gian tìm kiếm đã duyệt (0..1): tỉ lệ nhánh gốc đã xong,
+        cộng phần đã xong của nhánh đang duyệt (tính lồng nhau theo từng mức).
+        """
+        return self.tien_do_them + self._vi_tri_muc(len(self.nhanh))[0]
+
+    def phan_viec_hien_tai(self):
+        """Phần việc ứng với cây con tại nút đang xét (nút chưa được duyệt)"""
+        bat_dau, trong_so = self._vi_tri_muc(len(self.nhanh))
+        return _PhanViec(tuple(muc[2] for muc in self.nhanh), 0, bat_dau, trong_so)
+
+    def _ghi_phan_con_lai(self):
+        """
+        Ghi lại phần việc chưa duyệt khi dừng giữa chừng, theo đúng thứ tự duyệt:
+        cây con tại nút đang xét, rồi các nhánh anh em còn lại từ mức sâu nhất lên muc_goc.
+        """
+        self.phan_con_lai = [self.phan_viec_hien_tai()]
+        for muc in range(len(self.nhanh) - 1, self.muc_goc - 1, -1):
+            da_xong, tong, i = self.nhanh[muc]
+            if da_xong + 1 >= tong:
+                continue  # Không còn nhánh anh em nào
+            bat_dau, trong_so = self._vi_tri_muc(muc)
+            self.phan_con_lai.append(_PhanViec(
+                tuple(m[2] for m in self.nhanh[:muc]), i + 1,
+                bat_dau + trong_so * (da_xong + 1) / tong,
+                trong_so * (tong - da_xong - 1) / tong,
+            ))
+
+    def kiem_tra_dung(self):
+        """
+        Kiểm tra timeout, token hủy và ngân sách nút, báo tiến độ nếu có callback.
+
+        Returns:
+            True nếu tìm kiếm phải dừng
+        """
+        if self.huy is not None and self.huy.da_huy:
+            self.da_huy = True
+        elif self.timeout and time.time() - self.bat_dau > self.timeout:
+            self.het_gio = True
+        elif self.ngan_sach_nut is not None and self.so_nut >= self.ngan_sach_nut:
+            self.het_ngan_sach = True
+            self._ghi_phan_con_lai()
+        if self.bao_tien_do is not None:
+            self.bao_tien_do(self)
+        return self.da_dung
+
+    def thong_bao_khong_xep_duoc(self):
+        """Thông báo lỗi nêu rõ các môn không thể xếp (None nếu tiền xử lý không phát hiện gì)"""
+        if not self.mon_khong_xep_duoc:
+            return None
+        cac_ly_do = []
+        for ma_mon, ten_mon, ma_mon_xung_dot in self.mon_khong_xep_duoc:
+            if ma_mon_xung_dot is None:
+                cac_ly_do.append(f"- {ma_mon} ({ten_mon}): mọi lớp đều trùng giờ bận hoặc bị loại bởi "
+                                 f"ràng buộc/bộ lọc đã chọn")
+            else:
+                cac_ly_do.append(f"- {ma_mon} ({ten_mon}): không còn lớp nào xếp được cùng môn {ma_mon_xung_dot}")
+        return "Không thể xếp TKB với các môn đã chọn:\n" + "\n".join(cac_ly_do)
+
+    def can_dem_tong_so(self, so_ket_qua, max_results):
+        """Kết quả bị cắt bớt (đạt giới hạn hoặc hết giờ, không phải do người dùng hủy)"""
+        return not self.da_huy and (self.het_gio or bool(max_results and so_ket_qua >= max_results))
+
+    def tao_canh_bao(self, so_ket_qua, max_results, tong_so=None, can_tren=False):
+        """
+        Tạo thông báo cảnh báo khi đạt giới hạn số TKB hoặc gần/hết thời gian.
+
+        Args:
+            so_ket_qua: Số mẫu TKB (khác nhau về giờ học) đã tìm được
+            max_results: Giới hạn số mẫu TKB
+            tong_so: (so_mau, so_tkb) đếm chính xác bằng counting.dem_thoi_khoa_bieu(),
+                None nếu không đếm hoặc đếm không kịp
+            can_tren: tong_so chỉ là cận trên (có ràng buộc lớp chéo môn, KhongGianTKB.co_the_trung)
+
+        Returns:
+            Chuỗi cảnh báo, None nếu không có gì cần cảnh báo
+        """
+        elapsed_time = self.thoi_gian
+        if self.da_huy:
+            return (f"Đã hủy tìm kiếm. Đã tìm được {so_ket_qua} TKB khác nhau về giờ học "
+                    f"trong {elapsed_time:.2f}s.")
+        if tong_so is not None and can_tren:
+            con_them = (f"Tổng cộng có tối đa {tong_so[0]:,} TKB khác nhau về giờ học "
+                        f"({tong_so[1]:,} cách chọn lớp, có thể tính trùng do ràng buộc lớp chéo môn), "
+                        f"hãy thêm giờ bận hoặc bớt môn để thu hẹp.")
+        elif tong_so is not None:
+            con_them = (f"Tổng cộng có {tong_so[0]:,} TKB khác nhau về giờ học "
+                        f"({tong_so[1]:,} cách chọn lớp), hãy thêm giờ bận hoặc bớt môn để thu hẹp.")
+        else:
+            con_them = "Có thể còn nhiều TKB khác."
+        if max_results and so_ket_qua >= max_results:
+            return (f"Đã tìm được {so_ket_qua} TKB khác nhau về giờ học (đạt giới hạn {max_results}). "
+                    f"{con_them} Thời gian: {elapsed_time:.2f}s")
+        if self.timeout and (self.het_gio or elapsed_time >= self.timeout * 0.9):
+            canh_bao = (f"Đã tìm được {so_ket_qua} TKB khác nhau về giờ học. "
+                        f"Quá trình tìm kiếm gần hết thời gian ({elapsed_time:.2f}s/{self.timeout}s).")
+            if tong_so is not None:
+                canh_bao += f" {con_them}"
+            return canh_bao
+        return None
+
+
+def _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses):
+    """
+    Kiểm tra điều kiện trước khi tìm TKB (số môn, môn tiên quyết, môn bắt buộc có lớp).
+
+    Returns:
+        Thông báo lỗi, None nếu hợp lệ
+    """
+    # Kiểm tra giới hạn số môn học
+    if len(danh_sach_mon_hoc) > MAX_COURSES:
+        return (f"Lỗi: Chỉ được chọn tối đa {MAX_COURSES} môn học. "
+                f"Bạn đã chọn {len(danh_sach_mon_hoc)} môn. "
+                f"Vui lòng bỏ chọn một số môn.")
     
-    mon_hien_tai = danh_sach_mon_hoc[mon_hoc_index]
-    if not mon_hien_tai.cac_lop_hoc:
-        _tim_kiem_de_quy(danh_sach_mon_hoc, mon_hoc_index + 1, lich_hien_tai, ket_qua, danh_sach_gio_ban, all_courses, max_results, start_time, timeout)
-        return
+    # Kiểm tra môn tiên quyết - môn tiên quyết phải có trong danh sách môn đã học
+    completed_courses_set = set(completed_courses) if completed_courses else set()
+    for mon in danh_sach_mon_hoc:
+        for mon_tien_quyet in mon.tien_quyet:
+            if mon_tien_quyet not in completed_courses_set:
+                return (f"Lỗi: Môn '{mon.ten_mon} ({mon.ma_mon})' yêu cầu "
+                        f"phải học môn tiên quyết '{mon_tien_quyet}' trước. "
+                        f"Vui lòng thêm môn '{mon_tien_quyet}' vào danh sách môn đã học.")
     
-    # Kiểm tra xem môn học này đã có lớp nào trong lịch chưa (do được thêm như một lớp ràng buộc)
-    # Tối ưu: Sử dụng any() với generator expression thay vì vòng lặp thủ công
-    # Nếu có rồi, bỏ qua môn học này và tiếp tục với môn tiếp theo
-    mon_da_co_lop_trong_lich = any(
-        lop_trong_lich.ma_mon == mon_hien_tai.ma_mon 
-        for lop_trong_lich in lich_hien_tai
+    # Môn bắt buộc không có lớp nào thì chắc chắn không có TKB, báo ngay thay vì tìm kiếm
+    ma_mon_bat_buoc = set(mon_bat_buoc or [])
+    for mon in danh_sach_mon_hoc:
+        if mon.ma_mon in ma_mon_bat_buoc and not mon.cac_lop_hoc:
+            return (f"Lỗi: Môn bắt buộc '{mon.ten_mon} ({mon.ma_mon})' chưa có lớp học nào. "
+                    f"Vui lòng thêm lớp học hoặc bỏ đánh dấu bắt buộc.")
+    return None
+
+
+def _chuan_bi_tim_kiem(danh_sach_mon_hoc, bang_mask, mask_gio_ban, mon_bat_buoc, all_courses, sap_xep_dong, thong_ke, rang_buoc=None, bo_loc=None):
+    """
+    Tạo trạng thái tìm kiếm ban đầu và danh sách môn đã biên dịch, sắp xếp.
+    Dùng chung cho iter_thoi_khoa_bieu() và các tiến trình tìm kiếm song song.
+    mask_gio_ban đã gồm các tiết bị cấm của rang_buoc (xem _bien_dich_mask()).
+
+    Returns:
+        Tuple (danh_sach_da_sap_xep, trang_thai)
+    """
+    # Biên dịch từng môn thành các gói lớp (giải quyết ID lớp ràng buộc một lần tại đây),
+    # rồi gộp các gói cùng giờ học để chỉ tìm kiếm trên các "dấu chân" thời gian khác nhau
+    cac_goi_theo_mon = [_tao_cac_goi_lop(mon, bang_mask, all_courses) for mon in danh_sach_mon_hoc]
+    if bo_loc:
+        # Bộ lọc lớp được áp dụng trước khi gộp gói cùng giờ, để các phương án thay thế
+        # (giáo viên/phòng khác) cũng bị lọc chứ không chỉ gói đại diện
+        cac_goi_theo_mon = [[goi for goi in cac_goi if bo_loc.nhan_goi([lop for lop, _ in goi.cac_lop])]
+                            for cac_goi in cac_goi_theo_mon]
+    id_lop_dich = {id(lop) for cac_goi in cac_goi_theo_mon for goi in cac_goi for lop, _ in goi.ngoai}
+    ma_mon_bat_buoc = set(mon_bat_buoc or [])
+    danh_sach_mon = [_MonBienDich(i, mon, _gop_goi_cung_gio(cac_goi, id_lop_dich))
+                     for i, (mon, cac_goi) in enumerate(zip(danh_sach_mon_hoc, cac_goi_theo_mon))]
+    for mon in danh_sach_mon:
+        mon.bat_buoc = mon.ma_mon in ma_mon_bat_buoc
+
+    ma_mon_duoc_chon = {mon.ma_mon for mon in danh_sach_mon_hoc}
+    trang_thai = _TrangThaiTimKiem(
+        mask_gio_ban, thong_ke, sap_xep_dong,
+        _tim_mon_dich_rang_buoc(danh_sach_mon),
+        tuple(sorted(ma_mon_bat_buoc - ma_mon_duoc_chon)),
     )
+
+    # Khởi tạo miền ứng viên (loại các gói trùng giờ bận)
+    trang_thai.mien = [mon.tat_ca & ~mon.lop_xung_dot(mask_gio_ban) for mon in danh_sach_mon]
+    if rang_buoc is not None and rang_buoc.co_trang_thai:
+        trang_thai.rang_buoc = rang_buoc
+        # Gói tự nó đã vi phạm (ví dụ một lớp dài hơn số tiết liên tiếp tối đa) bị loại ngay
+        for mon in danh_sach_mon:
+            for i, goi in enumerate(mon.cac_goi):
+                if rang_buoc.vi_pham(goi.mask):
+                    trang_thai.mien[mon.chi_so] &= ~(1 << i)
+
+    # Thu hẹp miền trước khi tìm kiếm và phát hiện ngay môn không thể xếp, thay vì để
+    # tìm kiếm chạy tới hết thời gian mới báo không có TKB
+    thong_ke.mon_khong_xep_duoc = [(mon.ma_mon, mon.mon_hoc.ten_mon, ma_mon_xung_dot)
+                                   for mon, ma_mon_xung_dot in _lan_truyen_cung(danh_sach_mon, trang_thai)]
+
+    # Dữ liệu cho bảng nogood và nhảy lui (xem _tim_kiem_lap())
+    trang_thai.con_lai = (1 << len(danh_sach_mon)) - 1
+    trang_thai.id_lop_dich = frozenset(id_lop_dich)
+    trang_thai.nhay_lui = not id_lop_dich and trang_thai.rang_buoc is None
+    trang_thai.mask_mien_goc = [0] * len(danh_sach_mon)
+    for mon in danh_sach_mon:
+        mien = trang_thai.mien[mon.chi_so]
+        for i, goi in enumerate(mon.cac_goi):
+            if (mien >> i) & 1:
+                trang_thai.mask_mien_goc[mon.chi_so] |= goi.mask
+
+    # Sắp xếp môn bắt buộc trước, rồi môn ít lựa chọn nhất trước để nhánh chết bị cắt gần gốc
+    # (luôn làm việc trên bản sao, không thay đổi danh sách của người gọi).
+    # Môn bắt buộc không bao giờ bị bỏ qua: nếu hết lớp tương thích, nhánh bị cắt ngay khi
+    # forward checking, nên giới hạn kết quả chỉ tính các TKB thỏa mãn môn bắt buộc.
+    danh_sach_da_sap_xep = _sap_xep_mon_hoc(danh_sach_mon, trang_thai)
+
+    return danh_sach_da_sap_xep, trang_thai
+
+
+def iter_mau_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, timeout=None, sap_xep_dong=False, thong_ke=None, rang_buoc=None, bo_loc=None):
+    """
+    Generator tìm thời khóa biểu: yield từng mẫu TKB (MauTKB) ngay khi tìm được,
+    để giao diện có thể hiển thị kết quả đầu tiên trong khi tìm kiếm vẫn tiếp tục.
+    Mỗi mẫu là một TKB khác nhau về giờ học, gồm mọi tổ hợp giáo viên/phòng cùng giờ.
+    Người gọi tự quyết định dừng (ví dụ sau max_results mẫu) bằng cách ngừng lặp.
     
-    # Nếu môn học đã có lớp trong lịch, bỏ qua và tiếp tục với môn tiếp theo
-    if mon_da_co_lop_trong_lich:
-        _tim_kiem_de_quy(danh_sach_mon_hoc, mon_hoc_index + 1, lich_hien_tai, ket_qua, danh_sach_gio_ban, all_courses, max_results, start_time, timeout)
-        return
+    Args:
+        danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses, all_courses,
+        timeout, sap_xep_dong, rang_buoc, bo_loc: Giống tim_thoi_khoa_bieu()
+        thong_ke: ThongKeTimKiem (tùy chọn) để nhận thống kê, báo tiến độ và hủy tìm kiếm
     
-    for lop_hoc in mon_hien_tai.cac_lop_hoc:
-        # Kiểm tra xung đột lịch học
-        if _kiem_tra_trung_voi_lich(lop_hoc, lich_hien_tai, danh_sach_gio_ban):
-            continue  # Bỏ qua lớp trùng lịch
-        
-        # Kiểm tra logic: Nếu lớp là "Lý thuyết" hoặc "Bài tập", 
-        # chỉ cho phép 1 lớp cùng loại trong cùng môn xuất hiện trong TKB (trừ khi có ràng buộc)
-        loai_lop = getattr(lop_hoc, 'loai_lop', 'Lớp')
-        if loai_lop in ["Lý thuyết", "Bài tập"]:
-            # Tối ưu: Tìm lớp cùng loại trong cùng môn
-            lop_hoc_id = lop_hoc.get_id()
-            lop_rang_buoc_set = set(lop_hoc.lop_rang_buoc) if lop_hoc.lop_rang_buoc else set()
-            
-            # Kiểm tra xem đã có lớp cùng loại trong cùng môn chưa
-            da_co_lop_cung_loai = False
-            for lop_trong_lich in lich_hien_tai:
-                if (lop_trong_lich.ma_mon == mon_hien_tai.ma_mon and
-                    getattr(lop_trong_lich, 'loai_lop', 'Lớp') == loai_lop):
-                    # Kiểm tra xem lớp trong lịch có phải là lớp ràng buộc với lớp hiện tại không
-                    lop_trong_lich_id = lop_trong_lich.get_id()
-                    # Kiểm tra ràng buộc 2 chiều - sử dụng set để lookup O(1) thay vì list
-                    co_rang_buoc = (
-                        lop_trong_lich_id in lop_rang_buoc_set or
-                        (lop_trong_lich.lop_rang_buoc and lop_hoc_id in lop_trong_lich.lop_rang_buoc)
-                    )
-                    
-                    if not co_rang_buoc:
-                        # Đã có lớp cùng loại và không có ràng buộc
-                        da_co_lop_cung_loai = True
-                        break
-            
-            # Nếu đã có lớp cùng loại và không có ràng buộc, bỏ qua lớp này
-            if da_co_lop_cung_loai:
-                continue
-        
-        # Thêm lớp học vào lịch
-        lich_hien_tai.append(lop_hoc)
-        
-        # Thêm các lớp ràng buộc nếu có
-        lop_rang_buoc_da_them = []
-        if _them_lop_rang_buoc(lop_hoc, lich_hien_tai, danh_sach_gio_ban, all_courses):
-            # Đã thêm thành công các lớp ràng buộc, tiếp tục đệ quy
-            _tim_kiem_de_quy(danh_sach_mon_hoc, mon_hoc_index + 1, lich_hien_tai, ket_qua, danh_sach_gio_ban, all_courses, max_results, start_time, timeout)
-        else:
-            # Không thể thêm lớp ràng buộc do xung đột, bỏ qua lớp này
-            pass
-        
-        # Xóa lớp học và các lớp ràng buộc đã thêm
-        lop_chinh = lich_hien_tai.pop()  # Xóa lớp chính
-        
-        # Xóa các lớp ràng buộc đã thêm (tối ưu: xóa từ cuối lên để tránh shift index)
-        if lop_hoc.lop_rang_buoc and all_courses:
-            # Tạo set các ID lớp ràng buộc để tìm nhanh
-            rang_buoc_ids = set(lop_hoc.lop_rang_buoc)
-            # Xóa từ cuối lên để tránh vấn đề với index khi xóa
-            for i in range(len(lich_hien_tai) - 1, -1, -1):
-                lop_trong_lich = lich_hien_tai[i]
-                # Kiểm tra xem lớp này có phải là lớp ràng buộc không
-                lop_id = lop_trong_lich.get_id()
-                if lop_id in rang_buoc_ids:
-                    lich_hien_tai.pop(i)
+    Raises:
+        ValidationError: Nếu đầu vào không hợp lệ (quá số môn, thiếu môn tiên quyết, ...)
+    """
+    if timeout is None:
+        timeout = SEARCH_TIMEOUT
+    if thong_ke is None:
+        thong_ke = ThongKeTimKiem()
+    thong_ke.timeout = timeout
+
+    error_msg = _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses)
+    if error_msg:
+        raise ValidationError(error_msg)
+
+    # Biên dịch bitmask tuần một lần cho cả lượt tìm kiếm
+    bang_mask, mask_gio_ban = _bien_dich_mask(danh_sach_mon_hoc, danh_sach_gio_ban, rang_buoc)
+    danh_sach_da_sap_xep, trang_thai = _chuan_bi_tim_kiem(
+        danh_sach_mon_hoc, bang_mask, mask_gio_ban, mon_bat_buoc, all_courses, sap_xep_dong, thong_ke,
+        rang_buoc, bo_loc)
+    if thong_ke.mon_khong_xep_duoc:
+        # Tiền xử lý đã chứng minh không có TKB nào (xem thong_ke.thong_bao_khong_xep_duoc())
+        thong_ke.ket_thuc = time.time()
+        return
+
+    try:
+        yield from _tim_kiem_lap(danh_sach_da_sap_xep, trang_thai)
+    finally:
+        thong_ke.ket_thuc = time.time()
 
 
-def tim_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, max_results=None, timeout=None):
+def iter_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, timeout=None, sap_xep_dong=False, thong_ke=None, rang_buoc=None, bo_loc=None):
+    """
+    Generator tìm thời khóa biểu: yield từng TKB cụ thể (tuple các LopHoc),
+    triển khai lần lượt từng mẫu của iter_mau_thoi_khoa_bieu() (cùng tham số).
+    """
+    for mau in iter_mau_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses,
+                                       all_courses, timeout, sap_xep_dong, thong_ke, rang_buoc, bo_loc):
+        yield from mau
+
+
+def tim_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, max_results=None, timeout=None, sap_xep_dong=False, huy=None, pareto_theo=None, rang_buoc=None, bo_loc=None):
     """
     Tìm tất cả các thời khóa biểu hợp lệ từ danh sách môn học
+    (phiên bản trả về danh sách đầy đủ, xây dựng trên iter_thoi_khoa_bieu)
     
     Args:
         danh_sach_mon_hoc: Danh sách các môn học cần sắp xếp
@@ -381,72 +1697,70 @@ def tim_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, compl
         mon_bat_buoc: Danh sách mã môn bắt buộc phải có trong TKB
         completed_courses: Danh sách mã môn đã học (môn tiên quyết)
         all_courses: Dictionary chứa tất cả các môn học (để tìm lớp ràng buộc)
-        max_results: Số lượng kết quả tối đa (None = dùng MAX_RESULTS mặc định)
+        max_results: Số mẫu TKB (khác nhau về giờ học) tối đa (None = dùng MAX_RESULTS mặc định)
         timeout: Timeout tính bằng giây (None = dùng SEARCH_TIMEOUT mặc định)
+        sap_xep_dong: True = ở mỗi bước chọn môn còn ít lớp tương thích nhất (MRV),
+            False = chỉ sắp xếp tĩnh một lần theo số lớp khả thi sau khi lọc giờ bận
+        huy: HuyTimKiem (tùy chọn) để dừng tìm kiếm từ thread khác
+        pareto_theo: Tên các chỉ số (xem scoring.CAC_CHI_SO, ví dụ ('so_ngay', 'tiet_trong', 'ket_thuc_muon'))
+            để chỉ trả về các TKB tối ưu Pareto theo các chỉ số đó (nhánh bị trội được cắt ngay khi
+            tìm kiếm); None = trả về mọi TKB hợp lệ
+        rang_buoc: RangBuocTKB (tùy chọn) các ràng buộc cứng về hình dạng TKB (ngày nghỉ, tiết kết thúc
+            muộn nhất, tiết để trống, số ngày, số tiết liên tiếp); nhánh vi phạm bị cắt ngay khi xếp lớp
+        bo_loc: BoLocLop (tùy chọn) lọc lớp theo giáo viên, phòng, loại lớp, khung tiết hoặc danh sách
+            lớp cụ thể của từng môn; được biên dịch một lần vào miền ứng viên trước khi tìm kiếm
     
     Returns:
         Tuple (ket_qua, error_msg, warning_msg): 
-        - ket_qua: Danh sách các TKB hợp lệ (mỗi TKB là tuple các LopHoc - tối ưu memory)
+        - ket_qua: DanhSachTKB các TKB hợp lệ (mỗi TKB là tuple các LopHoc, lưu gọn dưới dạng chỉ số)
         - error_msg: Thông báo lỗi nếu có (None nếu không có lỗi)
-        - warning_msg: Thông báo cảnh báo (ví dụ: đạt giới hạn, timeout)
+        - warning_msg: Thông báo cảnh báo (ví dụ: đạt giới hạn, timeout, đã hủy)
         
     Note:
-        Sử dụng tuple thay vì list để tiết kiệm memory. Tuple nhẹ hơn list và immutable,
-        phù hợp vì TKB không thay đổi sau khi tìm được. Tuple vẫn hỗ trợ iteration và indexing.
+        ket_qua dùng như list (len, index, lặp) nhưng chỉ lưu các mẫu TKB; TKB cụ thể
+        (tuple LopHoc) được tạo khi truy cập, nên giới hạn max_results tính theo số mẫu.
     """
+    if pareto_theo is not None:
+        # Import trong hàm để tránh vòng import (scoring dùng các hàm nội bộ của module này)
+        from .scoring import tim_thoi_khoa_bieu_pareto
+        return tim_thoi_khoa_bieu_pareto(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses,
+                                         all_courses, chi_so=pareto_theo, timeout=timeout, huy=huy,
+                                         rang_buoc=rang_buoc, bo_loc=bo_loc)
+
     # Sử dụng giá trị mặc định nếu không được chỉ định
     if max_results is None:
         max_results = MAX_RESULTS
-    if timeout is None:
-        timeout = SEARCH_TIMEOUT
-    # Kiểm tra giới hạn số môn học
-    if len(danh_sach_mon_hoc) > MAX_COURSES:
-        error_msg = (f"Lỗi: Chỉ được chọn tối đa {MAX_COURSES} môn học. "
-                    f"Bạn đã chọn {len(danh_sach_mon_hoc)} môn. "
-                    f"Vui lòng bỏ chọn một số môn.")
+
+    error_msg = _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses)
+    if error_msg:
+        return [], error_msg, None
+
+    thong_ke = ThongKeTimKiem(huy)
+    ket_qua_thuan = DanhSachTKB()
+    for mau in iter_mau_thoi_khoa_bieu(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses,
+                                       all_courses, timeout, sap_xep_dong, thong_ke, rang_buoc, bo_loc):
+        # Mẫu trùng không được thêm, nên giới hạn tính theo số mẫu khác nhau
+        if ket_qua_thuan.them(mau) and ket_qua_thuan.so_mau >= max_results:
+            break
+    error_msg = thong_ke.thong_bao_khong_xep_duoc()
+    if error_msg:
         return [], error_msg, None
     
-    # Kiểm tra môn tiên quyết - môn tiên quyết phải có trong danh sách môn đã học
-    completed_courses_set = set(completed_courses) if completed_courses else set()
-    for mon in danh_sach_mon_hoc:
-        for mon_tien_quyet in mon.tien_quyet:
-            if mon_tien_quyet not in completed_courses_set:
-                error_msg = (f"Lỗi: Môn '{mon.ten_mon} ({mon.ma_mon})' yêu cầu "
-                           f"phải học môn tiên quyết '{mon_tien_quyet}' trước. "
-                           f"Vui lòng thêm môn '{mon_tien_quyet}' vào danh sách môn đã học.")
-                return [], error_msg, None
-    
-    # Tìm tất cả các TKB hợp lệ (truyền all_courses để xử lý ràng buộc)
-    ket_qua_thuan = []
-    start_time = time.time()
-    warning_msg = None
-    
-    # Gọi hàm đệ quy với timeout và max_results
-    _tim_kiem_de_quy(danh_sach_mon_hoc, 0, [], ket_qua_thuan, danh_sach_gio_ban, 
-                     all_courses, max_results, start_time, timeout)
-    
+    # Kết quả bị cắt bớt: đếm chính xác tổng số TKB (nhanh hơn nhiều so với liệt kê hết)
+    tong_so = None
+    can_tren = False
+    if thong_ke.can_dem_tong_so(ket_qua_thuan.so_mau, max_results):
+        from .counting import tao_khong_gian_tkb  # Import trong hàm để tránh vòng import
+        khong_gian = tao_khong_gian_tkb(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc,
+                                        completed_courses, all_courses, huy=huy, rang_buoc=rang_buoc,
+                                        bo_loc=bo_loc)
+        if khong_gian is not None:
+            tong_so = (khong_gian.so_mau, khong_gian.so_tkb)
+            can_tren = khong_gian.co_the_trung
+
     # Kiểm tra xem có đạt giới hạn hoặc timeout không
-    elapsed_time = time.time() - start_time
-    if len(ket_qua_thuan) >= max_results:
-        warning_msg = (f"Đã tìm được {len(ket_qua_thuan)} TKB (đạt giới hạn {max_results}). "
-                      f"Có thể còn nhiều TKB khác. Thời gian: {elapsed_time:.2f}s")
-    elif elapsed_time >= timeout * 0.9:  # Cảnh báo nếu gần hết thời gian
-        warning_msg = (f"Đã tìm được {len(ket_qua_thuan)} TKB. "
-                      f"Quá trình tìm kiếm gần hết thời gian ({elapsed_time:.2f}s/{timeout}s).")
-    
-    # Nếu không có môn bắt buộc, trả về tất cả kết quả
-    if not mon_bat_buoc:
-        return ket_qua_thuan, None, warning_msg
-    
-    # Lọc các TKB có chứa tất cả môn bắt buộc
-    ket_qua_da_loc = []
-    ma_mon_bat_buoc = set(mon_bat_buoc)
-    for tkb in ket_qua_thuan:
-        ma_mon_trong_tkb = {lop.ma_mon for lop in tkb}
-        if ma_mon_bat_buoc.issubset(ma_mon_trong_tkb):
-            ket_qua_da_loc.append(tkb)
-    
-    return ket_qua_da_loc, None, warning_msg
+    warning_msg = thong_ke.tao_canh_bao(ket_qua_thuan.so_mau, max_results, tong_so, can_tren)
+    return ket_qua_thuan, None, warning_msg
 
 
 def _tim_thu_trung_gio(lop_moi, danh_sach_lop):
@@ -0,0 +1,482 @@
+"""
+Chấm điểm thời khóa biểu theo các tiêu chí và tìm K TKB tốt nhất bằng nhánh cận (branch-and-bound).
+
+Điểm là tổng có trọng số của các điểm phạt (càng thấp càng tốt). Trong lúc tìm kiếm, mỗi TKB đang
+xếp dở được ước lượng cận dưới (điểm tốt nhất còn có thể đạt khi xếp nốt các môn còn lại); nhánh có
+cận dưới không tốt hơn TKB thứ K hiện có bị cắt ngay, nên không phải liệt kê hết rồi mới sắp xếp.
+"""
+import heapq
+from itertools import chain
+
+from .constants import MIN_THU, MAX_THU, MIN_TIET, MAX_TIET, SEARCH_TIMEOUT, TOP_K_RESULTS
+from .models import chuan_hoa_ten_giao_vien
+from .scheduler import (
+    ThongKeTimKiem, _kiem_tra_dau_vao, _bien_dich_mask, _chuan_bi_tim_kiem, _loc_mien_con_lai,
+    _mask_lop, _dem_bit, _SO_BIT_MOI_NGAY, _CHU_KY_KIEM_TRA,
+)
+
+_SO_NGAY = MAX_THU - MIN_THU + 1
+_MASK_MOT_NGAY = (1 << _SO_BIT_MOI_NGAY) - 1
+
+# Tên các chỉ số đánh giá TKB, theo đúng thứ tự tham số của TieuChiTKB.tinh_diem()
+CAC_CHI_SO = ('so_ngay', 'tiet_trong', 'ket_thuc_muon', 'bat_dau_som', 'giao_vien')
+
+
+class TieuChiTKB:
+    """
+    Trọng số các tiêu chí đánh giá TKB (trọng số 0 = bỏ qua tiêu chí). Mỗi tiêu chí là một điểm phạt:
+    - so_ngay: mỗi ngày phải lên trường
+    - tiet_trong: mỗi tiết trống nằm giữa hai lớp trong cùng một ngày
+    - ket_thuc_muon: tiết kết thúc muộn nhất trong tuần
+    - bat_dau_som: số tiết mà tiết bắt đầu sớm nhất trong tuần sớm hơn MAX_TIET
+    - giao_vien: mỗi lớp của giáo viên muốn tránh (+1) hoặc giáo viên ưu tiên (-1)
+    """
+
+    def __init__(self, so_ngay=1.0, tiet_trong=1.0, ket_thuc_muon=0.0, bat_dau_som=0.0,
+                 giao_vien=1.0, giao_vien_uu_tien=(), giao_vien_tranh=()):
+        self.so_ngay = so_ngay
+        self.tiet_trong = tiet_trong
+        self.ket_thuc_muon = ket_thuc_muon
+        self.bat_dau_som = bat_dau_som
+        self.giao_vien = giao_vien
+        self.giao_vien_uu_tien = {chuan_hoa_ten_giao_vien(ten) for ten in giao_vien_uu_tien if ten}
+        self.giao_vien_tranh = {chuan_hoa_ten_giao_vien(ten) for ten in giao_vien_tranh if ten}
+
+    def phat_giao_vien(self, lop):
+        """Điểm phạt giáo viên của một lớp: +1 giáo viên muốn tránh, -1 giáo viên ưu tiên, 0 còn lại"""
+        ten = chuan_hoa_ten_giao_vien(lop.ten_giao_vien)
+        if ten in self.giao_vien_tranh:
+            return 1
+        if ten in self.giao_vien_uu_tien:
+            return -1
+        return 0
+
+    def tinh_diem(self, so_ngay, tiet_trong, ket_thuc_muon, bat_dau_som, giao_vien):
+        """Tổng có trọng số của các điểm phạt"""
+        return (self.so_ngay * so_ngay + self.tiet_trong * tiet_trong
+                + self.ket_thuc_muon * ket_thuc_muon + self.bat_dau_som * bat_dau_som
+                + self.giao_vien * giao_vien)
+
+
+def _ngay_trong_mask(mask):
+    """Bitmask các ngày có tiết học (bit d ứng với thứ MIN_THU + d)"""
+    ngay = 0
+    for d in range(_SO_NGAY):
+        if (mask >> (d * _SO_BIT_MOI_NGAY)) & _MASK_MOT_NGAY:
+            ngay |= 1 << d
+    return ngay
+
+
+def _chi_so_mask(mask):
+    """
+    Các chỉ số hình dạng của bitmask tuần (chỉ gồm tiết học, không gồm giờ bận).
+
+    Returns:
+        Tuple (so_ngay, tiet_trong, ket_thuc_muon, bat_dau_som, mask_tiet_trong)
+    """
+    so_ngay = tiet_trong = ket_thuc_muon = 0
+    som_nhat = MAX_TIET
+    mask_tiet_trong = 0
+    for d in range(_SO_NGAY):
+        vi_tri = d * _SO_BIT_MOI_NGAY
+        ngay = (mask >> vi_tri) & _MASK_MOT_NGAY
+        if not ngay:
+            continue
+        so_ngay += 1
+        dau = (ngay & -ngay).bit_length() - 1
+        cuoi = ngay.bit_length()
+        trong = (((1 << cuoi) - 1) >> dau << dau) & ~ngay
+        tiet_trong += _dem_bit(trong)
+        mask_tiet_trong |= trong << vi_tri
+        ket_thuc_muon = max(ket_thuc_muon, cuoi - 1 + MIN_TIET)
+        som_nhat = min(som_nhat, dau + MIN_TIET)
+    bat_dau_som = MAX_TIET - som_nhat if so_ngay else 0
+    return so_ngay, tiet_trong, ket_thuc_muon, bat_dau_som, mask_tiet_trong
+
+
+def cham_diem_tkb(tkb, tieu_chi):
+    """
+    Chấm điểm một TKB cụ thể.
+
+    Args:
+        tkb: Danh sách/tuple các LopHoc
+        tieu_chi: TieuChiTKB
+
+    Returns:
+        Tuple (diem, chi_tiet): chi_tiet là dict giá trị từng tiêu chí (chưa nhân trọng số)
+    """
+    mask = 0
+    for lop in tkb:
+        mask |= _mask_lop(lop)
+    so_ngay, tiet_trong, ket_thuc_muon, bat_dau_som, _ = _chi_so_mask(mask)
+    giao_vien = sum(tieu_chi.phat_giao_vien(lop) for lop in tkb)
+    chi_tiet = {
+        'so_ngay': so_ngay,
+        'tiet_trong': tiet_trong,
+        'ket_thuc_muon': ket_thuc_muon,
+        'bat_dau_som': bat_dau_som,
+        'giao_vien': giao_vien,
+    }
+    return tieu_chi.tinh_diem(**chi_tiet), chi_tiet
+
+
+class _TimNhanhCan:
+    """
+    Khung tìm kiếm nhánh cận trên danh sách môn đã biên dịch (dùng chung trạng thái và forward checking
+    của engine). Lớp con quyết định khóa sắp xếp nhánh (_khoa_nhanh), điều kiện cắt (_bi_cat) và cách
+    giữ kết quả (_ghi_nhan).
+
+    Mỗi mẫu TKB (các lớp cùng giờ gộp lại) được đại diện bởi TKB cụ thể có điểm giáo viên tốt nhất,
+    nên các kết quả là các tập lớp khác nhau, nhưng hai kết quả vẫn có thể cùng giờ học (hai môn đổi giờ
+    cho nhau, hoặc lớp được thêm qua ràng buộc lớp chéo môn).
+    """
+
+    def __init__(self, danh_sach_mon, trang_thai, mask_gio_ban, tieu_chi):
+        self.danh_sach_mon = danh_sach_mon
+        self.trang_thai = trang_thai
+        self.thong_ke = trang_thai.thong_ke
+        self.mask_gio_ban = mask_gio_ban
+        self.tieu_chi = tieu_chi
+        self._so_da_tim = 0
+        self.phat_gv = 0
+
+        # Thông tin biên dịch sẵn của từng gói: (ngày, tiết kết thúc muộn nhất, phạt bắt đầu sớm,
+        # cận dưới phạt giáo viên, mask gồm cả lớp ngoài môn)
+        self.thong_tin = {}
+        for mon in danh_sach_mon:
+            cac_thong_tin = []
+            for goi in mon.cac_goi:
+                _, _, muon, som, _ = _chi_so_mask(goi.mask)
+                if goi.ngoai:
+                    # Lớp ngoài môn có thể đã có sẵn trong lịch: chỉ tính phần có lợi vào cận dưới
+                    phat = sum(tieu_chi.phat_giao_vien(lop) for lop, _ in goi.cac_lop
+                               if lop.ma_mon == mon.ma_mon)
+                    phat += sum(min(0, tieu_chi.phat_giao_vien(lop)) for lop, _ in goi.ngoai)
+                else:
+                    phat = min(self._phat_phuong_an(phuong_an) for phuong_an in goi.phuong_an)
+                mask_day_du = goi.mask
+                for _, mask_ngoai in goi.ngoai:
+                    mask_day_du |= mask_ngoai
+                cac_thong_tin.append((_ngay_trong_mask(goi.mask), muon, som, phat, mask_day_du))
+            self.thong_tin[mon.chi_so] = cac_thong_tin
+
+    def _phat_phuong_an(self, phuong_an):
+        return sum(self.tieu_chi.phat_giao_vien(lop) for lop in phuong_an)
+
+    def can_duoi(self, i):
+        """
+        Cận dưới từng chỉ số (theo CAC_CHI_SO) của mọi TKB hoàn chỉnh trong cây con tại môn i:
+        - số ngày: ngày đã có cộng số ngày mới ít nhất mà một môn còn lại bắt buộc phải thêm
+        - tiết trống: các tiết trống hiện tại mà không gói nào còn lại có thể lấp
+        - kết thúc muộn/bắt đầu sớm: giá trị hiện tại hoặc giá trị nhỏ nhất mà một môn còn lại bắt buộc gây ra
+        - giáo viên: phạt hiện tại cộng phạt nhỏ nhất của từng môn còn lại
+        Môn có thể được phủ qua ràng buộc chéo môn không bắt buộc phải chọn gói của chính nó.
+        """
+        trang_thai = self.trang_thai
+        mask = trang_thai.mask & ~self.mask_gio_ban
+        so_ngay, _, ket_thuc_muon, bat_dau_som, mask_tiet_trong = _chi_so_mask(mask)
+        ngay_hien_tai = _ngay_trong_mask(mask)
+        ngay_them = 0
+        phat_gv = self.phat_gv
+        co_the_lap = 0
+        for j in range(i, len(self.danh_sach_mon)):
+            mon = self.danh_sach_mon[j]
+            if not mon.cac_lop or trang_thai.co_mon(mon.ma_mon):
+                continue
+            mien = trang_thai.mien[mon.chi_so]
+            thong_tin = self.thong_tin[mon.chi_so]
+            it_ngay = it_muon = it_som = it_phat = None
+            while mien:
+                bit = mien & -mien
+                ngay, muon, som, phat, mask_goi = thong_tin[bit.bit_length() - 1]
+                mien ^= bit
+                co_the_lap |= mask_goi
+                so_ngay_moi = _dem_bit(ngay & ~ngay_hien_tai)
+                if it_ngay is None:
+                    it_ngay, it_muon, it_som, it_phat = so_ngay_moi, muon, som, phat
+                else:
+                    it_ngay = min(it_ngay, so_ngay_moi)
+                    it_muon = min(it_muon, muon)
+                    it_som = min(it_som, som)
+                    it_phat = min(it_phat, phat)
+            if it_ngay is None or mon.ma_mon in trang_thai.dich_rang_buoc:
+                phat_gv += min(it_phat or 0, 0)
+                continue
+            ngay_them = max(ngay_them, it_ngay)
+            ket_thuc_muon = max(ket_thuc_muon, it_muon)
+            bat_dau_som = max(bat_dau_som, it_som)
+            phat_gv += it_phat
+        tiet_trong = _dem_bit(mask_tiet_trong & ~co_the_lap)
+        return so_ngay + ngay_them, tiet_trong, ket_thuc_muon, bat_dau_som, phat_gv
+
+    def _khoa_nhanh(self, i):
+        """Khóa của nhánh con tại môn i (tính từ cận dưới): nhánh khóa nhỏ được duyệt trước"""
+        raise NotImplementedError
+
+    def _bi_cat(self, khoa):
+        """Nhánh có khóa này chắc chắn không cho kết quả tốt hơn các kết quả đang giữ"""
+        raise NotImplementedError
+
+    def _ghi_nhan(self, tkb, chi_tiet):
+        """Ghi nhận một TKB hoàn chỉnh với giá trị các chỉ số (dict của cham_diem_tkb())"""
+        raise NotImplementedError
+
+    def _them_ket_qua(self):
+        """Ghi nhận TKB hoàn chỉnh hiện tại (chọn phương án giáo viên tốt nhất cho từng ô)"""
+        cac_o = self.trang_thai.cac_o
+        tkb = tuple(chain.from_iterable(min(o, key=self._phat_phuong_an) for o in cac_o))
+        self._so_da_tim += 1
+        self._ghi_nhan(tkb, cham_diem_tkb(tkb, self.tieu_chi)[1])
+
+    def _chon_goi(self, i, goi):
+        """Thêm gói và lọc miền các môn còn lại. Returns: (moc, mien_cu, phat_cu), mien mới là None nếu rỗng miền"""
+        trang_thai = self.trang_thai
+        moc = trang_thai.danh_dau()
+        mask_truoc = trang_thai.mask
+        mien_cu = trang_thai.mien
+        phat_cu = self.phat_gv
+        trang_thai.push_goi(goi)
+        self.phat_gv += min(self._phat_phuong_an(phuong_an) for phuong_an in trang_thai.cac_o[-1])
+        trang_thai.mien = _loc_mien_con_lai(self.danh_sach_mon, i, trang_thai,
+                                            trang_thai.mask & ~mask_truoc)
+        return moc, mien_cu, phat_cu
+
+    def _bo_chon(self, moc, mien_cu, phat_cu):
+        """Hoàn tác _chon_goi()"""
+        self.trang_thai.hoan_tac_goi(moc)
+        self.trang_thai.mien = mien_cu
+        self.phat_gv = phat_cu
+
+    def duyet(self, i=0):
+        """Duyệt cây con tại môn i, cắt nhánh theo cận dưới; dừng khi hết giờ hoặc bị hủy"""
+        thong_ke = self.thong_ke
+        thong_ke.so_nut += 1
+        if not thong_ke.so_nut % _CHU_KY_KIEM_TRA and thong_ke.kiem_tra_dung():
+            return
+
+        trang_thai = self.trang_thai
+        if i == len(self.danh_sach_mon):
+            if all(trang_thai.co_mon(ma_mon) for ma_mon in trang_thai.bat_buoc_ngoai):
+                thong_ke.so_ket_qua += 1
+                self._them_ket_qua()
+            return
+
+        mon = self.danh_sach_mon[i]
+        if not mon.cac_lop or trang_thai.co_mon(mon.ma_mon):
+            self.duyet(i + 1)
+            return
+
+        # Tính cận dưới của từng nhánh con, duyệt nhánh hứa hẹn nhất trước để sớm có kết quả tốt
+        cac_nhanh = []
+        mien = trang_thai.mien[mon.chi_so]
+        for j, goi in enumerate(mon.cac_goi):
+            if not (mien >> j) & 1:
+                continue
+            if goi.ngoai and not trang_thai.xep_duoc_lop_ngoai(goi):
+                continue
+            hoan_tac = self._chon_goi(i, goi)
+            if trang_thai.mien is not None:
+                cac_nhanh.append((self._khoa_nhanh(i + 1), j))
+            self._bo_chon(*hoan_tac)
+        cac_nhanh.sort()
+
+        for khoa, j in cac_nhanh:
+            # Kiểm tra lại ngay trước khi duyệt: kết quả đã tốt lên sau các nhánh trước
+            if self._bi_cat(khoa):
+                continue
+            hoan_tac = self._chon_goi(i, mon.cac_goi[j])
+            self.duyet(i + 1)
+            self._bo_chon(*hoan_tac)
+            if thong_ke.da_dung:
+                return
+
+
+class _TimTopK(_TimNhanhCan):
+    """Giữ K TKB điểm thấp nhất trong một heap, cắt nhánh có cận dưới điểm không tốt hơn TKB thứ K"""
+
+    def __init__(self, danh_sach_mon, trang_thai, mask_gio_ban, tieu_chi, so_luong):
+        super().__init__(danh_sach_mon, trang_thai, mask_gio_ban, tieu_chi)
+        self.so_luong = so_luong
+        # Heap max theo (điểm, thứ tự tìm thấy): phần tử đầu là TKB tệ nhất trong K TKB đang giữ
+        self.heap = []
+        # Có ràng buộc lớp chéo môn thì cùng một tập lớp có thể được tìm thấy qua nhiều nhánh:
+        # nhớ tập lớp của các TKB trong heap để không giữ một TKB hai lần
+        self.tap_lop_dang_giu = set() if trang_thai.id_lop_dich else None
+
+    @property
+    def diem_te_nhat(self):
+        """Điểm của TKB thứ K (None nếu chưa đủ K TKB)"""
+        if len(self.heap) < self.so_luong:
+            return None
+        return -self.heap[0][0]
+
+    def _khoa_nhanh(self, i):
+        return self.tieu_chi.tinh_diem(*self.can_duoi(i))
+
+    def _bi_cat(self, khoa):
+        diem_te_nhat = self.diem_te_nhat
+        return diem_te_nhat is not None and khoa >= diem_te_nhat
+
+    def _ghi_nhan(self, tkb, chi_tiet):
+        tap_lop = None
+        if self.tap_lop_dang_giu is not None:
+            tap_lop = frozenset(id(lop) for lop in tkb)
+            if tap_lop in self.tap_lop_dang_giu:
+                return
+        muc = (-self.tieu_chi.tinh_diem(**chi_tiet), -self._so_da_tim, tkb)
+        bi_bo = None
+        if len(self.heap) < self.so_luong:
+            heapq.heappush(self.heap, muc)
+        else:
+            bi_bo = heapq.heappushpop(self.heap, muc)[2]
+        if tap_lop is not None:
+            # TKB bị đẩy khỏi heap có điểm không tốt hơn TKB thứ K, lần tìm thấy lại sau cũng bị đẩy ra
+            self.tap_lop_dang_giu.add(tap_lop)
+            if bi_bo is not None:
+                self.tap_lop_dang_giu.discard(frozenset(id(lop) for lop in bi_bo))
+
+    def ket_qua(self):
+        """K TKB tốt nhất theo điểm tăng dần (cùng điểm thì TKB tìm thấy trước đứng trước)"""
+        return [tkb for _, _, tkb in sorted(self.heap, key=lambda muc: (-muc[0], -muc[1]))]
+
+
+class _TimPareto(_TimNhanhCan):
+    """
+    Giữ biên Pareto theo các chỉ số được chọn: mỗi véc-tơ chỉ số không bị trội chỉ giữ một TKB
+    (TKB tìm thấy trước). Nhánh có véc-tơ cận dưới bị một kết quả đang giữ trội (không kém hơn
+    ở mọi chỉ số) bị cắt, vì mọi TKB trong nhánh đó đều bị trội hoặc trùng véc-tơ.
+    """
+
+    def __init__(self, danh_sach_mon, trang_thai, mask_gio_ban, tieu_chi, chi_so):
+        super().__init__(danh_sach_mon, trang_thai, mask_gio_ban, tieu_chi)
+        self.vi_tri = tuple(CAC_CHI_SO.index(ten) for ten in chi_so)
+        self.bien = []  # [(véc-tơ chỉ số, tkb)]
+
+    def _bi_troi(self, vec):
+        """Có kết quả đang giữ không kém hơn vec ở mọi chỉ số"""
+        return any(all(a <= b for a, b in zip(v, vec)) for v, _ in self.bien)
+
+    def _khoa_nhanh(self, i):
+        can_duoi = self.can_duoi(i)
+        vec = tuple(can_duoi[k] for k in self.vi_tri)
+        return sum(vec), vec
+
+    def _bi_cat(self, khoa):
+        return self._bi_troi(khoa[1])
+
+    def _ghi_nhan(self, tkb, chi_tiet):
+        vec = tuple(chi_tiet[CAC_CHI_SO[k]] for k in self.vi_tri)
+        if self._bi_troi(vec):
+            return
+        self.bien = [(v, t) for v, t in self.bien if not all(a <= b for a, b in zip(vec, v))]
+        self.bien.append((vec, tkb))
+
+    def ket_qua(self):
+        """Các TKB trên biên Pareto, sắp theo véc-tơ chỉ số"""
+        return [tkb for _, tkb in sorted(self.bien, key=lambda muc: muc[0])]
+
+
+def tim_thoi_khoa_bieu_tot_nhat(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, tieu_chi=None, so_luong=None, timeout=None, huy=None, rang_buoc=None, bo_loc=None):
+    """
+    Tìm K thời khóa biểu có điểm tốt nhất (điểm phạt thấp nhất) theo tiêu chí.
+
+    Args:
+        danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses, all_courses, rang_buoc, bo_loc:
+            Giống tim_thoi_khoa_bieu()
+        tieu_chi: TieuChiTKB (None = trọng số mặc định)
+        so_luong: Số TKB tốt nhất cần lấy (None = dùng TOP_K_RESULTS mặc định)
+        timeout: Timeout tính bằng giây (None = dùng SEARCH_TIMEOUT mặc định)
+        huy: HuyTimKiem (tùy chọn) để dừng tìm kiếm từ thread khác
+
+    Returns:
+        Tuple (ket_qua, error_msg, warning_msg) giống tim_thoi_khoa_bieu(); ket_qua là list các TKB
+        (tuple LopHoc) theo điểm tăng dần, điểm từng TKB tính lại được bằng cham_diem_tkb()
+    """
+    if tieu_chi is None:
+        tieu_chi = TieuChiTKB()
+    if so_luong is None:
+        so_luong = TOP_K_RESULTS
+    if timeout is None:
+        timeout = SEARCH_TIMEOUT
+
+    error_msg = _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses)
+    if error_msg:
+        return [], error_msg, None
+
+    thong_ke = ThongKeTimKiem(huy)
+    thong_ke.timeout = timeout
+    bang_mask, mask_gio_ban = _bien_dich_mask(danh_sach_mon_hoc, danh_sach_gio_ban, rang_buoc)
+    danh_sach_mon, trang_thai = _chuan_bi_tim_kiem(
+        danh_sach_mon_hoc, bang_mask, mask_gio_ban, mon_bat_buoc, all_courses, False, thong_ke,
+        rang_buoc, bo_loc)
+    error_msg = thong_ke.thong_bao_khong_xep_duoc()
+    if error_msg:
+        return [], error_msg, None
+
+    tim = _TimTopK(danh_sach_mon, trang_thai, mask_gio_ban, tieu_chi, so_luong)
+    tim.duyet()
+    ket_qua = tim.ket_qua()
+
+    warning_msg = None
+    if thong_ke.da_huy:
+        warning_msg = (f"Đã hủy tìm kiếm. Đây là {len(ket_qua)} TKB tốt nhất trong phần đã duyệt "
+                       f"({thong_ke.thoi_gian:.2f}s).")
+    elif thong_ke.het_gio:
+        warning_msg = (f"Hết thời gian tìm kiếm ({timeout}s). Đây là {len(ket_qua)} TKB tốt nhất "
+                       f"trong phần đã duyệt, có thể còn TKB tốt hơn.")
+    return ket_qua, None, warning_msg
+
+
+def tim_thoi_khoa_bieu_pareto(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None, chi_so=None, tieu_chi=None, timeout=None, huy=None, rang_buoc=None, bo_loc=None):
+    """
+    Tìm các TKB tối ưu Pareto theo một vài chỉ số: không TKB nào khác tốt hơn hoặc bằng ở mọi chỉ số
+    và tốt hơn hẳn ở ít nhất một chỉ số. Mỗi sự đánh đổi (véc-tơ chỉ số) chỉ giữ một TKB.
+
+    Args:
+        danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses, all_courses, rang_buoc, bo_loc:
+            Giống tim_thoi_khoa_bieu()
+        chi_so: Các tên chỉ số trong CAC_CHI_SO (None = số ngày, tiết trống, tiết kết thúc muộn nhất)
+        tieu_chi: TieuChiTKB, chỉ dùng danh sách giáo viên ưu tiên/muốn tránh cho chỉ số 'giao_vien'
+        timeout: Timeout tính bằng giây (None = dùng SEARCH_TIMEOUT mặc định)
+        huy: HuyTimKiem (tùy chọn) để dừng tìm kiếm từ thread khác
+
+    Returns:
+        Tuple (ket_qua, error_msg, warning_msg) giống tim_thoi_khoa_bieu(); ket_qua là list các TKB
+        trên biên Pareto, sắp theo giá trị các chỉ số
+    """
+    if chi_so is None:
+        chi_so = ('so_ngay', 'tiet_trong', 'ket_thuc_muon')
+    for ten in chi_so:
+        if ten not in CAC_CHI_SO:
+            return [], f"Lỗi: Chỉ số '{ten}' không hợp lệ (chọn trong: {', '.join(CAC_CHI_SO)}).", None
+    if tieu_chi is None:
+        tieu_chi = TieuChiTKB()
+    if timeout is None:
+        timeout = SEARCH_TIMEOUT
+
+    error_msg = _kiem_tra_dau_vao(danh_sach_mon_hoc, mon_bat_buoc, completed_courses)
+    if error_msg:
+        return [], error_msg, None
+
+    thong_ke = ThongKeTimKiem(huy)
+    thong_ke.timeout = timeout
+    bang_mask, mask_gio_ban = _bien_dich_mask(danh_sach_mon_hoc, danh_sach_gio_ban, rang_buoc)
+    danh_sach_mon, trang_thai = _chuan_bi_tim_kiem(
+        danh_sach_mon_hoc, bang_mask, mask_gio_ban, mon_bat_buoc, all_courses, False, thong_ke,
+        rang_buoc, bo_loc)
+    error_msg = thong_ke.thong_bao_khong_xep_duoc()
+    if error_msg:
+        return [], error_msg, None
+
+    tim = _TimPareto(danh_sach_mon, trang_thai, mask_gio_ban, tieu_chi, chi_so)
+    tim.duyet()
+    ket_qua = tim.ket_qua()
+
+    warning_msg = None
+    if thong_ke.da_huy:
+        warning_msg = (f"Đã hủy tìm kiếm. Đây là {len(ket_qua)} TKB không bị trội trong phần đã duyệt "
+                       f"({thong_ke.thoi_gian:.2f}s).")
+    elif thong_ke.het_gio:
+        warning_msg = (f"Hết thời gian tìm kiếm ({timeout}s). Đây là {len(ket_qua)} TKB không bị trội "
+                       f"trong phần đã duyệt, biên Pareto có thể chưa đầy đủ.")
+    return ket_qua, None, warning_msg
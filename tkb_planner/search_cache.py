@@ -0,0 +1,302 @@
+"""
+Bộ nhớ đệm kết quả tìm TKB theo dấu vân tay của bài toán: bấm "Tìm TKB" lại với cùng lựa chọn (sau khi
+chỉ đổi những thứ không ảnh hưởng kết quả, hoặc sau khi mở lại ứng dụng) trả về ngay kết quả cũ thay vì
+tìm lại từ đầu.
+
+Dấu vân tay (dau_van_tay()) là SHA-256 của mọi thứ engine dùng để tìm: nội dung từng lớp của các môn
+được chọn (mã lớp, giáo viên, loại lớp, khung giờ, ID ràng buộc) cùng các lớp ràng buộc thuộc môn khác mà
+chúng trỏ tới, các tiết bận đang bật, môn bắt buộc, môn đã học, giới hạn số TKB và các tùy chọn engine.
+Sửa bất kỳ lớp nào liên quan là dấu vân tay đổi theo, nên kết quả cũ không bao giờ bị dùng nhầm và không
+cần xóa bộ nhớ đệm bằng tay; kết quả cũ chỉ bị bỏ dần khi hết dung lượng.
+
+Kết quả được lưu gọn (DanhSachTKB.du_lieu_gon()): lớp học được thay bằng chỉ số trong danh mục lớp của
+dấu vân tay, nên dựng lại được trên các object LopHoc hiện tại (kể cả sau khi tải lại dữ liệu). Hai tầng:
+- bộ nhớ: OrderedDict LRU các bản đã mã hóa, giới hạn tổng dung lượng SEARCH_CACHE_MEMORY_BYTES
+- đĩa: mỗi kết quả một file nén zlib trong thư mục SEARCH_CACHE_DIR cạnh DATA_FILE, giới hạn tổng
+  dung lượng SEARCH_CACHE_DISK_BYTES (xóa file lâu không dùng nhất theo thời gian sửa đổi)
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+
+from .constants import DATA_FILE, SEARCH_CACHE_DIR, SEARCH_CACHE_MEMORY_BYTES, SEARCH_CACHE_DISK_BYTES
+from .scheduler import DanhSachTKB, _mask_lich_ban, _tim_lop_rang_buoc
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi engine đổi thứ tự/nội dung kết quả để bỏ qua mọi kết quả đã lưu bằng phiên bản cũ
+_PHIEN_BAN = 1
+_MA_DAU = b"TKBCACHE"
+_DUOI_FILE = ".tkb"
+
+
+def _noi_dung_lop(lop):
+    """Các thuộc tính của lớp mà engine dùng khi tìm kiếm (tên môn, màu chỉ để hiển thị)"""
+    return (lop.ma_lop, lop.ten_giao_vien, lop.ma_mon, lop.loai_lop,
+            tuple((gio.thu, gio.tiet_bat_dau, gio.tiet_ket_thuc) for gio in lop.cac_khung_gio),
+            tuple(lop.lop_rang_buoc or ()))
+
+
+def dau_van_tay(danh_sach_mon_hoc, danh_sach_gio_ban, mon_bat_buoc, completed_courses=None, all_courses=None,
+                max_results=None, sap_xep_dong=False, rang_buoc=None, bo_loc=None):
+    """
+    Dấu vân tay của một lượt tìm kiếm (tham số giống tim_thoi_khoa_bieu()).
+
+    Returns:
+        Tuple (khoa, danh_muc_lop): khoa là chuỗi hex SHA-256; danh_muc_lop là các lớp kết quả có thể chứa
+        (lớp của các môn được chọn, rồi các lớp ràng buộc thuộc môn khác) theo thứ tự cố định
+    """
+    danh_muc_lop = []
+    chi_so_lop = {}
+
+    def chi_so(lop):
+        j = chi_so_lop.get(id(lop))
+        if j is None:
+            j = chi_so_lop[id(lop)] = len(danh_muc_lop)
+            danh_muc_lop.append(lop)
+        return j
+
+    cac_mon = tuple((mon.ma_mon, tuple(mon.tien_quyet), tuple(chi_so(lop) for lop in mon.cac_lop_hoc))
+                    for mon in danh_sach_mon_hoc)
+    # Lớp ràng buộc được tìm đúng như lúc biên dịch gói lớp (_tao_cac_goi_lop), None = không tìm thấy
+    cac_rang_buoc = []
+    if all_courses:
+        for mon in danh_sach_mon_hoc:
+            for lop in mon.cac_lop_hoc:
+                for rang_buoc_id in lop.lop_rang_buoc or []:
+                    lop_rang_buoc = _tim_lop_rang_buoc(rang_buoc_id, all_courses, lop_hien_tai=lop)
+                    cac_rang_buoc.append(None if lop_rang_buoc is None else chi_so(lop_rang_buoc))
+
+    mask_gio_ban = 0
+    for lich_ban in danh_sach_gio_ban:
+        mask_gio_ban |= _mask_lich_ban(lich_ban)
+    if rang_buoc:
+        rang_buoc = (rang_buoc.ngay_nghi, rang_buoc.tiet_ket_thuc_toi_da, rang_buoc.tiet_nghi,
+                     rang_buoc.so_ngay_toi_da, rang_buoc.so_tiet_lien_tiep_toi_da)
+    if bo_loc:
+        bo_loc = (sorted(bo_loc.giao_vien_loai_tru), bo_loc.tien_to_phong, sorted(bo_loc.loai_lop),
+                  bo_loc.khung_tiet,
+                  sorted((ma_mon, sorted(cac_id)) for ma_mon, cac_id in bo_loc.chi_lop.items()),
+                  sorted((ma_mon, sorted(cac_ten)) for ma_mon, cac_ten in bo_loc.chi_giao_vien.items()))
+
+    thanh_phan = (
+        _PHIEN_BAN, cac_mon, tuple(_noi_dung_lop(lop) for lop in danh_muc_lop), tuple(cac_rang_buoc),
+        mask_gio_ban, sorted(set(mon_bat_buoc or [])), sorted(set(completed_courses or [])),
+        max_results, bool(sap_xep_dong), rang_buoc or None, bo_loc or None,
+    )
+    return hashlib.sha256(repr(thanh_phan).encode("utf-8")).hexdigest(), danh_muc_lop
+
+
+def _ma_hoa(khoa, danh_sach, danh_muc_lop):
+    """DanhSachTKB -> bytes: mã đầu, độ dài + JSON phần đầu (danh mục ô, kiểu các array), dữ liệu các array"""
+    danh_muc_o, cac_array, so_tkb = danh_sach.du_lieu_gon({id(lop): j for j, lop in enumerate(danh_muc_lop)})
+    phan_dau = json.dumps({
+        "khoa": khoa,
+        "byteorder": sys.byteorder,
+        "so_tkb": so_tkb,
+        "danh_muc_o": danh_muc_o,
+        "array": [(a.typecode, a.itemsize, len(a)) for a in cac_array],
+    }, separators=(",", ":")).encode("utf-8")
+    return b"".join([_MA_DAU, len(phan_dau).to_bytes(4, "little"), phan_dau] + [a.tobytes() for a in cac_array])
+
+
+def _giai_ma(du_lieu, khoa, danh_muc_lop):
+    """Ngược lại của _ma_hoa(), ValueError nếu dữ liệu không khớp"""
+    if not du_lieu.startswith(_MA_DAU):
+        raise ValueError("Sai mã đầu")
+    vi_tri = len(_MA_DAU) + 4
+    do_dai = int.from_bytes(du_lieu[len(_MA_DAU):vi_tri], "little")
+    phan_dau = json.loads(du_lieu[vi_tri:vi_tri + do_dai].decode("utf-8"))
+    vi_tri += do_dai
+    if phan_dau["khoa"] != khoa:
+        raise ValueError("Sai dấu vân tay")
+    cac_array = []
+    for typecode, itemsize, so_phan_tu in phan_dau["array"]:
+        a = array(typecode)
+        if a.itemsize != itemsize:
+            raise ValueError("Kích thước phần tử array khác máy đã lưu")
+        ket_thuc = vi_tri + itemsize * so_phan_tu
+        a.frombytes(du_lieu[vi_tri:ket_thuc])
+        if len(a) != so_phan_tu:
+            raise ValueError("Thiếu dữ liệu")
+        if phan_dau["byteorder"] != sys.byteorder:
+            a.byteswap()
+        cac_array.append(a)
+        vi_tri = ket_thuc
+    if vi_tri != len(du_lieu):
+        raise ValueError("Thừa dữ liệu")
+    return DanhSachTKB.tu_du_lieu_gon(phan_dau["danh_muc_o"], tuple(cac_array), phan_dau["so_tkb"], danh_muc_lop)
+
+
+def thu_muc_mac_dinh():
+    """
+    Thư mục bộ nhớ đệm trên đĩa, cạnh file dữ liệu môn học. Giữ đường dẫn tương đối giống cách
+    data_handler mở DATA_FILE, nên hai thứ luôn nằm cùng một chỗ (thư mục làm việc hiện tại).
+    """
+    return os.path.join(os.path.dirname(DATA_FILE), SEARCH_CACHE_DIR)
+
+
+class BoNhoDemTimKiem:
+    """
+    Bộ nhớ đệm hai tầng (bộ nhớ, đĩa) các kết quả tìm kiếm theo thứ tự (DanhSachTKB), tra theo
+    dau_van_tay(). Dùng được từ nhiều thread.
+
+    Args:
+        thu_muc: Thư mục tầng đĩa (None = chỉ dùng tầng bộ nhớ)
+        dung_luong_bo_nho, dung_luong_dia: Tổng dung lượng tối đa (byte) của từng tầng
+    """
+
+    def __init__(self, thu_muc=None, dung_luong_bo_nho=SEARCH_CACHE_MEMORY_BYTES,
+                 dung_luong_dia=SEARCH_CACHE_DISK_BYTES):
+        self.thu_muc = thu_muc
+        self.dung_luong_bo_nho = dung_luong_bo_nho
+        self.dung_luong_dia = dung_luong_dia
+        # khoa -> bản mã hóa (_ma_hoa), theo thứ tự dùng gần nhất ở cuối
+        self._bo_nho = OrderedDict()
+        self._tong_bo_nho = 0
+        self._khoa_luong = threading.Lock()
+
+    def lay(self, khoa, danh_muc_lop):
+        """
+        Kết quả đã lưu của lượt tìm kiếm có dấu vân tay (khoa, danh_muc_lop).
+
+        Returns:
+            DanhSachTKB dựng lại trên danh_muc_lop, None nếu chưa có (hoặc dữ liệu đã lưu bị hỏng)
+        """
+        with self._khoa_luong:
+            du_lieu = self._bo_nho.get(khoa)
+            if du_lieu is not None:
+                self._bo_nho.move_to_end(khoa)
+            else:
+                du_lieu = self._doc_file(khoa)
+                if du_lieu is not None:
+                    self._them_bo_nho(khoa, du_lieu)
+        if du_lieu is None:
+            return None
+        try:
+            return _giai_ma(du_lieu, khoa, danh_muc_lop)
+        except (ValueError, KeyError, IndexError, TypeError):
+            logger.warning("Bỏ kết quả tìm kiếm đã lưu bị hỏng (%s)", khoa, exc_info=True)
+            self.xoa(khoa)
+            return None
+
+    def luu(self, khoa, danh_muc_lop, danh_sach):
+        """Lưu kết quả (DanhSachTKB gốc, không phải danh sách con) vào cả hai tầng"""
+        du_lieu = _ma_hoa(khoa, danh_sach, danh_muc_lop)
+        with self._khoa_luong:
+            self._them_bo_nho(khoa, du_lieu)
+            self._ghi_file(khoa, du_lieu)
+
+    def xoa(self, khoa):
+        """Bỏ một kết quả khỏi cả hai tầng"""
+        with self._khoa_luong:
+            du_lieu = self._bo_nho.pop(khoa, None)
+            if du_lieu is not None:
+                self._tong_bo_nho -= len(du_lieu)
+            if self.thu_muc:
+                try:
+                    os.remove(self._duong_dan(khoa))
+                except OSError:
+                    pass
+
+    def xoa_het(self):
+        """Bỏ mọi kết quả đã lưu"""
+        with self._khoa_luong:
+            self._bo_nho.clear()
+            self._tong_bo_nho = 0
+            for duong_dan, _, _ in self._cac_file():
+                try:
+                    os.remove(duong_dan)
+                except OSError:
+                    pass
+
+    def _them_bo_nho(self, khoa, du_lieu):
+        if len(du_lieu) > self.dung_luong_bo_nho:
+            return
+        cu = self._bo_nho.pop(khoa, None)
+        if cu is not None:
+            self._tong_bo_nho -= len(cu)
+        self._bo_nho[khoa] = du_lieu
+        self._tong_bo_nho += len(du_lieu)
+        while self._tong_bo_nho > self.dung_luong_bo_nho:
+            _, bi_bo = self._bo_nho.popitem(last=False)
+            self._tong_bo_nho -= len(bi_bo)
+
+    def _duong_dan(self, khoa):
+        return os.path.join(self.thu_muc, khoa + _DUOI_FILE)
+
+    def _cac_file(self):
+        """Các file của tầng đĩa: list (đường dẫn, dung lượng, thời gian dùng gần nhất)"""
+        if not self.thu_muc:
+            return []
+        try:
+            cac_ten = os.listdir(self.thu_muc)
+        except OSError:
+            return []
+        cac_file = []
+        for ten in cac_ten:
+            if not ten.endswith(_DUOI_FILE):
+                continue
+            duong_dan = os.path.join(self.thu_muc, ten)
+            try:
+                thong_tin = os.stat(duong_dan)
+            except OSError:
+                continue
+            cac_file.append((duong_dan, thong_tin.st_size, thong_tin.st_mtime))
+        return cac_file
+
+    def _doc_file(self, khoa):
+        if not self.thu_muc:
+            return None
+        duong_dan = self._duong_dan(khoa)
+        try:
+            with open(duong_dan, "rb") as f:
+                du_lieu = zlib.decompress(f.read())
+            # Đánh dấu vừa dùng để không bị xóa trước các kết quả lâu không dùng
+            os.utime(duong_dan)
+            return du_lieu
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error):
+            logger.warning("Không đọc được kết quả tìm kiếm đã lưu %s", duong_dan, exc_info=True)
+            try:
+                os.remove(duong_dan)
+            except OSError:
+                pass
+            return None
+
+    def _ghi_file(self, khoa, du_lieu):
+        if not self.thu_muc:
+            return
+        nen = zlib.compress(du_lieu, 1)
+        if len(nen) > self.dung_luong_dia:
+            return
+        duong_dan = self._duong_dan(khoa)
+        tam = duong_dan + ".tmp"
+        try:
+            os.makedirs(self.thu_muc, exist_ok=True)
+            with open(tam, "wb") as f:
+                f.write(nen)
+            os.replace(tam, duong_dan)
+        except OSError:
+            # Không lưu được lên đĩa thì vẫn còn tầng bộ nhớ, không chặn việc tìm kiếm
+            logger.warning("Không thể lưu kết quả tìm kiếm vào %s", duong_dan, exc_info=True)
+            return
+        cac_file = sorted(self._cac_file(), key=lambda f: f[2])
+        tong = sum(dung_luong for _, dung_luong, _ in cac_file)
+        for duong_dan_cu, dung_luong, _ in cac_file:
+            if tong <= self.dung_luong_dia:
+                break
+            if duong_dan_cu == duong_dan:
+                continue
+            try:
+                os.remove(duong_dan_cu)
+                tong -= dung_luong
+            except OSError:
+                pass
@@ -6,12 +6,15 @@ from PyQt6.QtWidgets import (
     QDialog, QFormLayout, QLineEdit, QDialogButtonBox,
     QComboBox, QSpinBox, QVBoxLayout, QListWidget, QPushButton,
     QLabel, QHBoxLayout, QMessageBox, QScrollArea, QWidget, QGroupBox,
-    QListWidgetItem, QCheckBox
+    QListWidgetItem, QCheckBox, QDoubleSpinBox
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont, QBrush, QColor
 
-from ..constants import TEN_THU_TRONG_TUAN
+from ..constants import TEN_THU_TRONG_TUAN, MIN_TIET, MAX_TIET
+from ..constraints import RangBuocTKB, BoLocLop
+from ..errors import ValidationError
+from ..scoring import TieuChiTKB
 
 
 class SubjectDialog(QDialog):
@@ -1030,3 +1033,220 @@ class EditAllClassesDialog(QDialog):
                     mon_layout.addWidget(group)
             
             self.scroll_layout.addWidget(mon_group)
+
+
+class TieuChiDialog(QDialog):
+    """Dialog chỉnh trọng số các tiêu chí xếp hạng TKB (chế độ tìm "Tốt nhất")"""
+
+    def __init__(self, tieu_chi=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Tiêu chí xếp hạng TKB")
+        tieu_chi = tieu_chi or TieuChiTKB()
+        layout = QFormLayout(self)
+
+        label = QLabel("Điểm phạt của TKB = tổng (trọng số x giá trị tiêu chí), điểm càng thấp càng tốt.\n"
+                       "Trọng số 0 = bỏ qua tiêu chí.")
+        label.setWordWrap(True)
+        layout.addRow(label)
+
+        self.trong_so = {}
+        for ten, nhan in [
+            ('so_ngay', "Mỗi ngày lên trường:"),
+            ('tiet_trong', "Mỗi tiết trống giữa giờ:"),
+            ('ket_thuc_muon', "Tiết kết thúc muộn nhất:"),
+            ('bat_dau_som', "Bắt đầu sớm (mỗi tiết):"),
+            ('giao_vien', "Giáo viên (tránh +1, ưu tiên -1):"),
+        ]:
+            spin = QDoubleSpinBox()
+            spin.setRange(0.0, 100.0)
+            spin.setSingleStep(0.5)
+            spin.setDecimals(1)
+            spin.setValue(getattr(tieu_chi, ten))
+            self.trong_so[ten] = spin
+            layout.addRow(nhan, spin)
+
+        self.uu_tien_edit = QLineEdit(", ".join(sorted(tieu_chi.giao_vien_uu_tien)))
+        self.uu_tien_edit.setPlaceholderText("Tên giáo viên, cách nhau bởi dấu phẩy")
+        self.tranh_edit = QLineEdit(", ".join(sorted(tieu_chi.giao_vien_tranh)))
+        self.tranh_edit.setPlaceholderText("Tên giáo viên, cách nhau bởi dấu phẩy")
+        layout.addRow("Giáo viên ưu tiên:", self.uu_tien_edit)
+        layout.addRow("Giáo viên muốn tránh:", self.tranh_edit)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def get_data(self):
+        """Lấy TieuChiTKB từ dialog"""
+        return TieuChiTKB(
+            giao_vien_uu_tien=[ten.strip() for ten in self.uu_tien_edit.text().split(',') if ten.strip()],
+            giao_vien_tranh=[ten.strip() for ten in self.tranh_edit.text().split(',') if ten.strip()],
+            **{ten: spin.value() for ten, spin in self.trong_so.items()}
+        )
+
+
+class RangBuocDialog(QDialog):
+    """Dialog chỉnh các ràng buộc cứng về hình dạng TKB (áp dụng cho mọi chế độ tìm)"""
+
+    def __init__(self, rang_buoc=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Ràng buộc TKB")
+        rang_buoc = rang_buoc or RangBuocTKB()
+        layout = QFormLayout(self)
+
+        label = QLabel("TKB vi phạm ràng buộc bị loại ngay trong lúc tìm kiếm, "
+                       "không cần tạo giờ bận giả.")
+        label.setWordWrap(True)
+        layout.addRow(label)
+
+        ngay_layout = QHBoxLayout()
+        self.ngay_nghi_checks = {}
+        for thu, ten_thu in TEN_THU_TRONG_TUAN.items():
+            check = QCheckBox(ten_thu)
+            check.setChecked(thu in rang_buoc.ngay_nghi)
+            self.ngay_nghi_checks[thu] = check
+            ngay_layout.addWidget(check)
+        layout.addRow("Không học vào:", ngay_layout)
+
+        self.ket_thuc_spin = QSpinBox()
+        self.ket_thuc_spin.setRange(MIN_TIET, MAX_TIET)
+        self.ket_thuc_spin.setValue(rang_buoc.tiet_ket_thuc_toi_da or MAX_TIET)
+        layout.addRow("Kết thúc muộn nhất ở tiết:", self.ket_thuc_spin)
+
+        self.tiet_nghi_edit = QLineEdit(", ".join(str(tiet) for tiet in rang_buoc.tiet_nghi))
+        self.tiet_nghi_edit.setPlaceholderText("VD: 6 (cách nhau bởi dấu phẩy)")
+        layout.addRow("Để trống tiết:", self.tiet_nghi_edit)
+
+        # 0 = không giới hạn
+        self.so_ngay_spin = QSpinBox()
+        self.so_ngay_spin.setRange(0, len(TEN_THU_TRONG_TUAN))
+        self.so_ngay_spin.setSpecialValueText("Không giới hạn")
+        self.so_ngay_spin.setValue(rang_buoc.so_ngay_toi_da or 0)
+        layout.addRow("Số ngày tối đa:", self.so_ngay_spin)
+
+        self.lien_tiep_spin = QSpinBox()
+        self.lien_tiep_spin.setRange(0, MAX_TIET - MIN_TIET + 1)
+        self.lien_tiep_spin.setSpecialValueText("Không giới hạn")
+        self.lien_tiep_spin.setValue(rang_buoc.so_tiet_lien_tiep_toi_da or 0)
+        layout.addRow("Số tiết liên tiếp tối đa:", self.lien_tiep_spin)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.validate_and_accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def validate_and_accept(self):
+        """Chỉ đóng dialog khi dữ liệu hợp lệ"""
+        try:
+            self.get_data()
+        except (ValueError, ValidationError) as e:
+            QMessageBox.warning(self, "Lỗi", f"Ràng buộc không hợp lệ: {e}")
+            return
+        self.accept()
+
+    def get_data(self):
+        """
+        Lấy RangBuocTKB từ dialog
+
+        Raises:
+            ValueError, ValidationError: Nếu danh sách tiết để trống không hợp lệ
+        """
+        return RangBuocTKB(
+            ngay_nghi=[thu for thu, check in self.ngay_nghi_checks.items() if check.isChecked()],
+            tiet_ket_thuc_toi_da=(self.ket_thuc_spin.value()
+                                  if self.ket_thuc_spin.value() < MAX_TIET else None),
+            tiet_nghi=[int(tiet) for tiet in self.tiet_nghi_edit.text().split(',') if tiet.strip()],
+            so_ngay_toi_da=self.so_ngay_spin.value() or None,
+            so_tiet_lien_tiep_toi_da=self.lien_tiep_spin.value() or None,
+        )
+
+
+class LocLopDialog(QDialog):
+    """Dialog lọc lớp cho lượt tìm TKB (không thay đổi dữ liệu môn học)"""
+
+    LOAI_LOP = ("Lý thuyết", "Bài tập", "Lớp")
+
+    def __init__(self, bo_loc=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Lọc lớp khi tìm TKB")
+        bo_loc = bo_loc or BoLocLop()
+        layout = QFormLayout(self)
+
+        label = QLabel("Chỉ các lớp thỏa điều kiện mới được dùng khi tìm TKB. "
+                       "Để trống = không lọc.")
+        label.setWordWrap(True)
+        layout.addRow(label)
+
+        self.giao_vien_edit = QLineEdit(", ".join(sorted(bo_loc.giao_vien_loai_tru)))
+        self.giao_vien_edit.setPlaceholderText("Tên giáo viên, cách nhau bởi dấu phẩy")
+        layout.addRow("Bỏ giáo viên:", self.giao_vien_edit)
+
+        self.phong_edit = QLineEdit(", ".join(bo_loc.tien_to_phong))
+        self.phong_edit.setPlaceholderText("VD: A, D9 (phòng bắt đầu bằng)")
+        layout.addRow("Chỉ phòng:", self.phong_edit)
+
+        loai_layout = QHBoxLayout()
+        self.loai_lop_checks = {}
+        for loai in self.LOAI_LOP:
+            check = QCheckBox(loai)
+            check.setChecked(not bo_loc.loai_lop or loai in bo_loc.loai_lop)
+            self.loai_lop_checks[loai] = check
+            loai_layout.addWidget(check)
+        layout.addRow("Loại lớp:", loai_layout)
+
+        tiet_tu, tiet_den = bo_loc.khung_tiet or (MIN_TIET, MAX_TIET)
+        khung_layout = QHBoxLayout()
+        self.tiet_tu_spin = QSpinBox()
+        self.tiet_tu_spin.setRange(MIN_TIET, MAX_TIET)
+        self.tiet_tu_spin.setValue(tiet_tu)
+        self.tiet_den_spin = QSpinBox()
+        self.tiet_den_spin.setRange(MIN_TIET, MAX_TIET)
+        self.tiet_den_spin.setValue(tiet_den)
+        khung_layout.addWidget(self.tiet_tu_spin)
+        khung_layout.addWidget(QLabel("đến"))
+        khung_layout.addWidget(self.tiet_den_spin)
+        layout.addRow("Chỉ lớp học trong tiết:", khung_layout)
+
+        # Danh sách lớp/giáo viên cụ thể theo môn chỉ đặt được qua API, giữ nguyên khi sửa các điều kiện khác
+        self._chi_lop = bo_loc.chi_lop
+        self._chi_giao_vien = bo_loc.chi_giao_vien
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.validate_and_accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def validate_and_accept(self):
+        """Chỉ đóng dialog khi dữ liệu hợp lệ"""
+        try:
+            self.get_data()
+        except ValidationError as e:
+            QMessageBox.warning(self, "Lỗi", f"Bộ lọc không hợp lệ: {e}")
+            return
+        self.accept()
+
+    def get_data(self):
+        """
+        Lấy BoLocLop từ dialog
+
+        Raises:
+            ValidationError: Nếu khung tiết không hợp lệ
+        """
+        loai_lop = [loai for loai, check in self.loai_lop_checks.items() if check.isChecked()]
+        khung_tiet = (self.tiet_tu_spin.value(), self.tiet_den_spin.value())
+        return BoLocLop(
+            giao_vien_loai_tru=[ten.strip() for ten in self.giao_vien_edit.text().split(',') if ten.strip()],
+            tien_to_phong=[phong for phong in self.phong_edit.text().split(',') if phong.strip()],
+            # Chọn đủ các loại = không lọc theo loại lớp
+            loai_lop=loai_lop if len(loai_lop) < len(self.LOAI_LOP) else (),
+            khung_tiet=khung_tiet if khung_tiet != (MIN_TIET, MAX_TIET) else None,
+            chi_lop=self._chi_lop,
+            chi_giao_vien=self._chi_giao_vien,
+        )
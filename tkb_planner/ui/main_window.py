@@ -1,69 +1,297 @@
 import datetime
+import logging
+import time
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
     QLabel, QLineEdit, QPushButton, QCheckBox, QScrollArea, QFrame,
     QTextBrowser, QStatusBar, QFileDialog, QMessageBox,
-    QTimeEdit, QSizePolicy, QComboBox
+    QTimeEdit, QSizePolicy, QComboBox, QInputDialog
 )
 from PyQt6.QtCore import Qt, QTime, QSettings, QThread, pyqtSignal
 from PyQt6.QtGui import QFont, QAction
 
-from ..models import MonHoc, LopHoc, LichBan
-from ..scheduler import tim_thoi_khoa_bieu, kiem_tra_trung_trong_cung_mon, update_bidirectional_constraints, _kiem_tra_trung_voi_lich
+from ..models import MonHoc, LopHoc, LichBan, chuan_hoa_ten_giao_vien
+from ..scheduler import (
+    ThongKeTimKiem, HuyTimKiem, DanhSachTKB, kiem_tra_trung_trong_cung_mon,
+    update_bidirectional_constraints, _kiem_tra_trung_voi_lich,
+)
+from ..parallel_search import iter_mau_thoi_khoa_bieu_song_song
+from ..counting import tao_khong_gian_tkb, lay_mau_thoi_khoa_bieu
+from ..constraints import RangBuocTKB, BoLocLop
+from ..errors import ValidationError
+from ..diagnosis import giai_thich_khong_co_tkb
+from ..scoring import TieuChiTKB, tim_thoi_khoa_bieu_tot_nhat, tim_thoi_khoa_bieu_pareto, cham_diem_tkb
 from ..data_handler import (
     save_data, load_data, create_sample_data_if_not_exists,
     save_completed_courses, load_completed_courses,
     save_busy_times, load_busy_times
 )
-from ..constants import DATA_FILE, TEN_THU_TRONG_TUAN, MAX_COURSES
+from ..refinement import loc_ket_qua
+from ..search_cache import BoNhoDemTimKiem, dau_van_tay, thu_muc_mac_dinh
+from ..constants import (
+    DATA_FILE, TEN_THU_TRONG_TUAN, MAX_COURSES, MAX_RESULTS, MAX_RESULTS_LIMIT, SEARCH_TIMEOUT, MIN_TIET, MAX_TIET,
+)
 from .schedule_widget import ScheduleWidget
-from .dialogs import SubjectDialog, ClassDialog, CompletedCoursesDialog, ViewCompletedCoursesDialog, EditAllSubjectsDialog, EditAllClassesDialog
+from .dialogs import SubjectDialog, ClassDialog, CompletedCoursesDialog, ViewCompletedCoursesDialog, EditAllSubjectsDialog, EditAllClassesDialog, TieuChiDialog, RangBuocDialog, LocLopDialog
 from .course_classes_dialog import CourseClassesDialog
 from .theme import LIGHT_THEME, DARK_THEME
 from .custom_checkbox import CustomCheckBox
 
+logger = logging.getLogger(__name__)
+
 
 class FindTKBThread(QThread):
     """
     Thread chạy tìm kiếm TKB ở background để tránh block UI.
-    Phát tín hiệu finished(ket_qua, error_msg, warning_msg) khi hoàn thành.
+    Phát tín hiệu results_found(lo_mau) theo từng lô mẫu TKB trong lúc tìm để UI hiển thị ngay
+    kết quả đầu tiên, progress(so_nut, so_ket_qua, tien_do) để báo tiến độ,
+    và finished(ket_qua, error_msg, warning_msg) khi hoàn thành. ket_qua là DanhSachTKB các TKB đã tìm,
+    hoặc KhongGianTKB (toàn bộ không gian, cùng thứ tự) nếu kết quả bị cắt bớt và đếm kịp
+    (trừ khi có ràng buộc lớp chéo môn: không gian khi đó có thể lặp lại TKB nên giữ DanhSachTKB).
+    Gọi cancel() để dừng tìm kiếm (engine kiểm tra token hủy theo chu kỳ số nút).
+    Ở chế độ CHE_DO_THU_TU, kết quả tìm xong (không bị hết giờ/hủy) được lưu vào bo_nho_dem
+    (search_cache.BoNhoDemTimKiem) và lượt tìm cùng dấu vân tay lấy lại ngay thay vì tìm lại.
+    Khi không có TKB nào, thông báo lỗi/cảnh báo kèm giải thích các môn và giờ bận không thể xếp
+    cùng nhau (diagnosis.giai_thich_khong_co_tkb).
+    che_do chọn cách lấy kết quả:
+    - CHE_DO_THU_TU: max_results mẫu TKB đầu tiên theo thứ tự tìm kiếm (mặc định)
+    - CHE_DO_NGAU_NHIEN: lấy mẫu ngẫu nhiên đều MAX_RESULTS TKB trong toàn bộ không gian
+      (counting.lay_mau_thoi_khoa_bieu)
+    - CHE_DO_TOT_NHAT: TOP_K_RESULTS TKB điểm tốt nhất theo tieu_chi (scoring.tim_thoi_khoa_bieu_tot_nhat)
+    - CHE_DO_PARETO: các TKB không bị trội về số ngày, tiết trống và tiết kết thúc muộn nhất
+      (scoring.tim_thoi_khoa_bieu_pareto)
     """
 
-    finished = pyqtSignal(list, object, object)
+    results_found = pyqtSignal(list)
+    progress = pyqtSignal(int, int, float)
+    finished = pyqtSignal(object, object, object)
+
+    # Gửi một lô khi đủ số mẫu TKB hoặc đã quá khoảng thời gian này (giây) kể từ lô trước
+    BATCH_SIZE = 50
+    BATCH_INTERVAL = 0.1
+    # Khoảng thời gian tối thiểu (giây) giữa hai lần phát tín hiệu tiến độ
+    PROGRESS_INTERVAL = 0.2
+
+    CHE_DO_THU_TU = "thu_tu"
+    CHE_DO_NGAU_NHIEN = "ngau_nhien"
+    CHE_DO_TOT_NHAT = "tot_nhat"
+    CHE_DO_PARETO = "pareto"
 
     def __init__(self, selected_courses, busy_times, mandatory_courses,
-                 completed_courses, all_courses, parent=None):
+                 completed_courses, all_courses, che_do=CHE_DO_THU_TU, tieu_chi=None, rang_buoc=None,
+                 bo_loc=None, max_results=MAX_RESULTS, bo_nho_dem=None, parent=None):
         super().__init__(parent)
         self.selected_courses = selected_courses
         self.busy_times = busy_times
         self.mandatory_courses = mandatory_courses
         self.completed_courses = completed_courses
         self.all_courses = all_courses
+        self.che_do = che_do
+        self.tieu_chi = tieu_chi
+        self.rang_buoc = rang_buoc
+        self.bo_loc = bo_loc
+        self.max_results = max_results
+        self.bo_nho_dem = bo_nho_dem
+        # Chế độ CHE_DO_THU_TU: các TKB đã tìm (DanhSachTKB, kể cả khi kết quả được thay bằng
+        # KhongGianTKB) và kết quả có lấy từ bộ nhớ đệm không
+        self.mau_da_tim = None
+        self.tu_bo_nho_dem = False
+        self.huy = HuyTimKiem()
+        self._lan_bao_cuoi = 0.0
+
+    def cancel(self):
+        """Yêu cầu dừng tìm kiếm (an toàn khi gọi từ UI thread)"""
+        self.huy.huy()
+
+    def _bao_tien_do(self, thong_ke):
+        """Callback của engine: phát tín hiệu tiến độ, giới hạn tần suất để không làm ngập UI"""
+        now = time.monotonic()
+        if now - self._lan_bao_cuoi >= self.PROGRESS_INTERVAL:
+            self._lan_bao_cuoi = now
+            self.progress.emit(thong_ke.so_nut, thong_ke.so_ket_qua, thong_ke.tien_do)
 
     def run(self):
         try:
-            # Gọi hàm tìm TKB với max_results và timeout mặc định (dùng giá trị trong constants)
-            from ..scheduler import tim_thoi_khoa_bieu
-            result = tim_thoi_khoa_bieu(
+            ket_qua, error_msg, warning_msg = self._tim_kiem()
+        except Exception as e:
+            # ValidationError (đầu vào không hợp lệ, ví dụ giờ bận ngoài khung tiết) hoặc lỗi bất ngờ
+            # khi tìm kiếm: báo lỗi, không chẩn đoán
+            self.finished.emit(DanhSachTKB(), str(e), None)
+            return
+        # Không có TKB nào (và không phải do người dùng hủy): tự động giải thích bằng tập môn/giờ bận
+        # nhỏ nhất không thể xếp cùng nhau; đầu vào không hợp lệ thì không chẩn đoán được và bỏ qua
+        if not ket_qua and not self.huy.da_huy:
+            try:
+                giai_thich = giai_thich_khong_co_tkb(
+                    self.selected_courses,
+                    self.busy_times,
+                    self.mandatory_courses,
+                    self.completed_courses,
+                    self.all_courses,
+                    rang_buoc=self.rang_buoc,
+                    bo_loc=self.bo_loc,
+                    huy=self.huy,
+                )
+            except Exception:
+                logger.warning("Không thể giải thích vì sao không có TKB", exc_info=True)
+                giai_thich = None
+            if giai_thich and error_msg:
+                error_msg = f"{error_msg}\n{giai_thich}"
+            elif giai_thich:
+                warning_msg = f"{warning_msg}\n{giai_thich}" if warning_msg else giai_thich
+        self.finished.emit(ket_qua, error_msg, warning_msg)
+
+    def _tim_kiem(self):
+        """Chạy tìm kiếm theo che_do, trả về (ket_qua, error_msg, warning_msg)"""
+        if self.che_do == self.CHE_DO_NGAU_NHIEN:
+            # Cần đếm cả không gian trước khi rút mẫu, cho phép dùng hết thời gian tìm kiếm
+            ket_qua, error_msg, warning_msg = lay_mau_thoi_khoa_bieu(
                 self.selected_courses,
                 self.busy_times,
                 self.mandatory_courses,
                 self.completed_courses,
                 self.all_courses,
+                timeout=SEARCH_TIMEOUT,
+                huy=self.huy,
+                rang_buoc=self.rang_buoc,
+                bo_loc=self.bo_loc,
             )
+            return ket_qua, error_msg, warning_msg
+        if self.che_do == self.CHE_DO_TOT_NHAT:
+            ket_qua, error_msg, warning_msg = tim_thoi_khoa_bieu_tot_nhat(
+                self.selected_courses,
+                self.busy_times,
+                self.mandatory_courses,
+                self.completed_courses,
+                self.all_courses,
+                tieu_chi=self.tieu_chi,
+                huy=self.huy,
+                rang_buoc=self.rang_buoc,
+                bo_loc=self.bo_loc,
+            )
+            return ket_qua, error_msg, warning_msg
+        if self.che_do == self.CHE_DO_PARETO:
+            ket_qua, error_msg, warning_msg = tim_thoi_khoa_bieu_pareto(
+                self.selected_courses,
+                self.busy_times,
+                self.mandatory_courses,
+                self.completed_courses,
+                self.all_courses,
+                tieu_chi=self.tieu_chi,
+                huy=self.huy,
+                rang_buoc=self.rang_buoc,
+                bo_loc=self.bo_loc,
+            )
+            return ket_qua, error_msg, warning_msg
 
-            # Tương thích với cả version trả về 2 hoặc 3 giá trị
-            if isinstance(result, tuple) and len(result) == 3:
-                ket_qua, error_msg, warning_msg = result
-            elif isinstance(result, tuple) and len(result) == 2:
-                ket_qua, error_msg = result
-                warning_msg = None
-            else:
-                ket_qua, error_msg, warning_msg = [], "Kết quả tìm TKB không hợp lệ.", None
-        except Exception as e:
-            ket_qua, error_msg, warning_msg = [], str(e), None
+        ket_qua, error_msg, warning_msg = DanhSachTKB(), None, None
+        # Duyệt generator với max_results và timeout mặc định (dùng giá trị trong constants).
+        # Tìm kiếm chạy trên nhiều tiến trình nên thread này chủ yếu chờ, không tranh GIL với UI.
+        thong_ke = ThongKeTimKiem(self.huy, self._bao_tien_do)
+        khoa = danh_muc_lop = da_luu = None
+        if self.bo_nho_dem is not None:
+            khoa, danh_muc_lop = dau_van_tay(
+                self.selected_courses,
+                self.busy_times,
+                self.mandatory_courses,
+                self.completed_courses,
+                self.all_courses,
+                max_results=self.max_results,
+                rang_buoc=self.rang_buoc,
+                bo_loc=self.bo_loc,
+            )
+            da_luu = self.bo_nho_dem.lay(khoa, danh_muc_lop)
+        if da_luu is not None:
+            ket_qua = da_luu
+            self.tu_bo_nho_dem = True
+        else:
+            error_msg = self._tim_theo_thu_tu(ket_qua, thong_ke)
+            if error_msg:
+                return DanhSachTKB(), error_msg, None
+            if khoa is not None and not thong_ke.da_dung:
+                try:
+                    self.bo_nho_dem.luu(khoa, danh_muc_lop, ket_qua)
+                except Exception:
+                    logger.warning("Không thể lưu kết quả tìm kiếm vào bộ nhớ đệm", exc_info=True)
+        self.mau_da_tim = ket_qua
+        # Kết quả bị cắt bớt: đếm chính xác tổng số TKB để báo cho người dùng; không gian đầy đủ
+        # có cùng thứ tự với các TKB đã tìm nên thay thế luôn để duyệt được mọi TKB. Có ràng buộc
+        # lớp chéo môn thì không gian có thể lặp lại TKB đã bỏ trùng, chỉ dùng số đếm làm cận trên
+        so_mau_da_tim = ket_qua.so_mau
+        tong_so = None
+        can_tren = False
+        if thong_ke.can_dem_tong_so(so_mau_da_tim, self.max_results):
+            khong_gian = tao_khong_gian_tkb(
+                self.selected_courses,
+                self.busy_times,
+                self.mandatory_courses,
+                self.completed_courses,
+                self.all_courses,
+                huy=self.huy,
+                rang_buoc=self.rang_buoc,
+                bo_loc=self.bo_loc,
+            )
+            if khong_gian is not None:
+                tong_so = (khong_gian.so_mau, khong_gian.so_tkb)
+                can_tren = khong_gian.co_the_trung
+                if not can_tren:
+                    ket_qua = khong_gian
+        warning_msg = thong_ke.tao_canh_bao(so_mau_da_tim, self.max_results, tong_so, can_tren)
 
-        self.finished.emit(ket_qua, error_msg, warning_msg)
+        return ket_qua, error_msg, warning_msg
+
+    def _tim_theo_thu_tu(self, ket_qua, thong_ke):
+        """
+        Tìm tối đa max_results mẫu TKB theo thứ tự vào ket_qua (DanhSachTKB), gửi dần theo từng lô.
+
+        Returns:
+            Thông báo lỗi nếu tiền xử lý đã chứng minh không có TKB, None nếu không
+        """
+        lo_mau = []
+        lan_gui_cuoi = time.monotonic()
+        for mau in iter_mau_thoi_khoa_bieu_song_song(
+            self.selected_courses,
+            self.busy_times,
+            self.mandatory_courses,
+            self.completed_courses,
+            self.all_courses,
+            thong_ke=thong_ke,
+            rang_buoc=self.rang_buoc,
+            bo_loc=self.bo_loc,
+        ):
+            if not ket_qua.them(mau):
+                continue  # Trùng với một TKB đã tìm (cùng các lớp, qua ràng buộc chéo môn)
+            lo_mau.append(mau)
+            if (len(lo_mau) >= self.BATCH_SIZE
+                    or time.monotonic() - lan_gui_cuoi >= self.BATCH_INTERVAL):
+                self.results_found.emit(lo_mau)
+                lo_mau = []
+                lan_gui_cuoi = time.monotonic()
+            if ket_qua.so_mau >= self.max_results:
+                break
+        if lo_mau:
+            self.results_found.emit(lo_mau)
+        # Tiền xử lý đã chứng minh không có TKB: báo rõ môn nào không thể xếp
+        return thong_ke.thong_bao_khong_xep_duoc()
+
+
+def _so_tkb(ket_qua):
+    """
+    Số TKB của kết quả để hiển thị: DanhSachTKB/KhongGianTKB có thể nhiều hơn sys.maxsize TKB nên len()
+    bị chặn, dùng so_tkb (số chính xác); list kết quả (Tốt nhất/Pareto/Ngẫu nhiên) dùng len()
+    """
+    so_tkb = getattr(ket_qua, 'so_tkb', None)
+    return len(ket_qua) if so_tkb is None else so_tkb
+
+
+# Các cách sắp xếp lại kết quả trên thanh lọc: (tên hiển thị, các chỉ số của refinement.loc_ket_qua())
+CAC_CACH_SAP_XEP = (
+    ("Thứ tự tìm kiếm", ()),
+    ("Ít ngày nhất", ('so_ngay', 'tiet_trong')),
+    ("Ít tiết trống nhất", ('tiet_trong', 'so_ngay')),
+    ("Kết thúc sớm nhất", ('ket_thuc_muon', 'so_ngay')),
+    ("Bắt đầu muộn nhất", ('bat_dau_som', 'so_ngay')),
+)
 
 
 class MainWindow(QMainWindow):
@@ -83,11 +311,25 @@ class MainWindow(QMainWindow):
         self.danh_sach_gio_ban = load_busy_times()  # Load giờ bận từ file
         self.danh_sach_tkb_tim_duoc = []
         self.current_tkb_index = -1
+        # Kết quả đầy đủ của lượt tìm gần nhất (danh_sach_tkb_tim_duoc là kết quả này sau khi lọc),
+        # các TKB đã tìm dùng để lọc lại (DanhSachTKB, None = không lọc được) và các môn của lượt tìm
+        self.ket_qua_goc = []
+        self._nguon_loc = None
+        self._mon_loc = {}
+        self.tieu_chi_tkb = self._load_tieu_chi()
+        self.rang_buoc_tkb = self._load_rang_buoc()
+        # Số mẫu TKB tối đa khi tìm theo thứ tự (người dùng có thể nâng tới MAX_RESULTS_LIMIT)
+        self.max_results = min(max(self.settings.value("max_results", MAX_RESULTS, type=int), 1), MAX_RESULTS_LIMIT)
+        # Bộ lọc lớp chỉ áp dụng cho các lượt tìm trong phiên làm việc hiện tại (không lưu lại)
+        self.bo_loc_lop = BoLocLop()
+        self._tieu_chi_ket_qua = None
         self.course_widgets = {}
         self.busy_time_widgets = {}
         self.busy_time_checkboxes = {}  # Lưu checkbox của từng giờ bận
         self.toggle_theme_action = None  # Khởi tạo trước
         self.find_tkb_thread = None      # Thread tìm TKB đang chạy (nếu có)
+        # Kết quả tìm theo thứ tự đã lưu (cả sau khi mở lại ứng dụng), tra theo dấu vân tay bài toán
+        self.bo_nho_dem_tim_kiem = BoNhoDemTimKiem(thu_muc_mac_dinh())
         self._last_active_busy_times = []  # Lưu giờ bận dùng cho lần tìm gần nhất
         # Danh sách môn đã học
         self.completed_courses = load_completed_courses()
@@ -222,6 +464,20 @@ class MainWindow(QMainWindow):
         button_layout = QHBoxLayout()
         button_layout.setAlignment(Qt.AlignmentFlag.AlignLeft)
         self.find_tkb_btn = QPushButton("Tìm TKB hợp lệ")
+        self.cancel_tkb_btn = QPushButton("Hủy tìm")
+        self.cancel_tkb_btn.setEnabled(False)
+        # Cách lấy kết quả: theo thứ tự tìm kiếm, lấy mẫu ngẫu nhiên hoặc các TKB điểm tốt nhất
+        self.search_mode_combo = QComboBox()
+        self.search_mode_combo.addItem("Theo thứ tự", FindTKBThread.CHE_DO_THU_TU)
+        self.search_mode_combo.addItem("Ngẫu nhiên", FindTKBThread.CHE_DO_NGAU_NHIEN)
+        self.search_mode_combo.addItem("Tốt nhất", FindTKBThread.CHE_DO_TOT_NHAT)
+        self.search_mode_combo.addItem("Pareto", FindTKBThread.CHE_DO_PARETO)
+        self.search_mode_combo.setToolTip(
+            "Theo thứ tự: các TKB đầu tiên tìm được\n"
+            "Ngẫu nhiên: lấy ngẫu nhiên các TKB trong toàn bộ không gian\n"
+            "Tốt nhất: các TKB điểm cao nhất theo tiêu chí xếp hạng (menu TKB)\n"
+            "Pareto: các TKB không bị TKB nào khác hơn về cả số ngày, tiết trống và giờ kết thúc"
+        )
         self.prev_tkb_btn = QPushButton("< TKB Trước")
         
         # Label hiển thị số thời khóa biểu hiện tại/tổng số (giữa 2 nút)
@@ -230,25 +486,63 @@ class MainWindow(QMainWindow):
         self.tkb_info_label.setStyleSheet("font-weight: bold; padding: 5px;")
         
         self.next_tkb_btn = QPushButton("TKB Tiếp >")
+        self.goto_tkb_btn = QPushButton("Đi tới...")
         self.save_tkb_btn = QPushButton("Lưu TKB")
         self.clear_tkb_btn = QPushButton("Xoá TKB")
 
         button_height = 30
         self.find_tkb_btn.setMinimumHeight(button_height)
+        self.cancel_tkb_btn.setMinimumHeight(button_height)
         self.prev_tkb_btn.setMinimumHeight(button_height)
         self.next_tkb_btn.setMinimumHeight(button_height)
+        self.goto_tkb_btn.setMinimumHeight(button_height)
         self.save_tkb_btn.setMinimumHeight(button_height)
         self.clear_tkb_btn.setMinimumHeight(button_height)
 
         button_layout.addWidget(self.find_tkb_btn)
+        button_layout.addWidget(self.cancel_tkb_btn)
+        button_layout.addWidget(self.search_mode_combo)
         button_layout.addWidget(self.prev_tkb_btn)
         button_layout.addWidget(self.tkb_info_label)  # Label ở giữa 2 nút
         button_layout.addWidget(self.next_tkb_btn)
+        button_layout.addWidget(self.goto_tkb_btn)
         button_layout.addStretch()
         button_layout.addWidget(self.save_tkb_btn)
         button_layout.addWidget(self.clear_tkb_btn)
         right_panel_layout.addLayout(button_layout)
-        
+
+        # Thanh lọc/sắp xếp lại kết quả đã tìm (không tìm lại, xem refinement.py)
+        loc_layout = QHBoxLayout()
+        loc_layout.setAlignment(Qt.AlignmentFlag.AlignLeft)
+        self.loc_ngay_nghi_combo = QComboBox()
+        self.loc_ngay_nghi_combo.addItem("Mọi ngày", None)
+        for thu, ten_thu in TEN_THU_TRONG_TUAN.items():
+            self.loc_ngay_nghi_combo.addItem(f"Không học {ten_thu}", thu)
+        self.loc_so_ngay_combo = QComboBox()
+        self.loc_so_ngay_combo.addItem("Số ngày: bất kỳ", None)
+        for so_ngay in range(1, len(TEN_THU_TRONG_TUAN)):
+            self.loc_so_ngay_combo.addItem(f"Tối đa {so_ngay} ngày", so_ngay)
+        self.loc_ket_thuc_combo = QComboBox()
+        self.loc_ket_thuc_combo.addItem("Kết thúc: bất kỳ", None)
+        for tiet in range(MIN_TIET, MAX_TIET):
+            self.loc_ket_thuc_combo.addItem(f"Trước tiết {tiet + 1}", tiet)
+        self.loc_mon_combo = QComboBox()
+        self.loc_mon_combo.addItem("Môn: tất cả", None)
+        self.loc_giao_vien_combo = QComboBox()
+        self.loc_giao_vien_combo.addItem("Giáo viên: bất kỳ", None)
+        self.loc_giao_vien_combo.setEnabled(False)
+        self.sap_xep_combo = QComboBox()
+        self.sap_xep_combo.addItems([ten for ten, _ in CAC_CACH_SAP_XEP])
+        self.sap_xep_combo.setToolTip("Sắp xếp lại các TKB đã tìm")
+        loc_layout.addWidget(QLabel("Lọc kết quả:"))
+        for combo in (self.loc_ngay_nghi_combo, self.loc_so_ngay_combo, self.loc_ket_thuc_combo,
+                      self.loc_mon_combo, self.loc_giao_vien_combo):
+            loc_layout.addWidget(combo)
+        loc_layout.addWidget(QLabel("Sắp xếp:"))
+        loc_layout.addWidget(self.sap_xep_combo)
+        right_panel_layout.addLayout(loc_layout)
+        self._dat_lai_loc_ket_qua(None)
+
         self.setStatusBar(QStatusBar())
         self.statusBar().showMessage("Sẵn sàng")
 
@@ -312,6 +606,11 @@ class MainWindow(QMainWindow):
         tkb_menu.addAction(self.find_tkb_btn.text(), self.handle_find_tkb)
         tkb_menu.addAction(self.next_tkb_btn.text(), self.show_next_tkb)
         tkb_menu.addAction(self.prev_tkb_btn.text(), self.show_prev_tkb)
+        tkb_menu.addAction("Đi tới TKB số...", self.handle_goto_tkb)
+        tkb_menu.addAction("Tiêu chí xếp hạng...", self.handle_edit_tieu_chi)
+        tkb_menu.addAction("Ràng buộc TKB...", self.handle_edit_rang_buoc)
+        tkb_menu.addAction("Lọc lớp...", self.handle_edit_bo_loc)
+        tkb_menu.addAction("Giới hạn số TKB...", self.handle_edit_max_results)
         tkb_menu.addSeparator()
         tkb_menu.addAction(self.clear_tkb_btn.text(), self.handle_clear_tkb)
         tkb_menu.addSeparator()
@@ -419,13 +718,19 @@ class MainWindow(QMainWindow):
         """Kết nối các signal và slot"""
         self.add_busy_btn.clicked.connect(self.handle_add_busy_time)
         self.find_tkb_btn.clicked.connect(self.handle_find_tkb)
+        self.cancel_tkb_btn.clicked.connect(self.handle_cancel_find_tkb)
         self.prev_tkb_btn.clicked.connect(self.show_prev_tkb)
         self.next_tkb_btn.clicked.connect(self.show_next_tkb)
+        self.goto_tkb_btn.clicked.connect(self.handle_goto_tkb)
         self.clear_tkb_btn.clicked.connect(self.handle_clear_tkb)
         self.save_tkb_btn.clicked.connect(self.handle_save_tkb)
         self.add_subject_btn.clicked.connect(self.handle_add_subject)
         self.search_input.textChanged.connect(self.filter_course_list)
         self.schedule_view.cellClicked.connect(self.handle_cell_click)
+        for combo in (self.loc_ngay_nghi_combo, self.loc_so_ngay_combo, self.loc_ket_thuc_combo,
+                      self.loc_giao_vien_combo, self.sap_xep_combo):
+            combo.currentIndexChanged.connect(self.handle_refine_results)
+        self.loc_mon_combo.currentIndexChanged.connect(self.handle_loc_mon_changed)
 
     def handle_add_subject(self):
         """Xử lý thêm môn học mới"""
@@ -622,6 +927,8 @@ class MainWindow(QMainWindow):
             
             # Xóa kết quả tìm kiếm TKB
             self.danh_sach_tkb_tim_duoc = []
+            self.ket_qua_goc = []
+            self._dat_lai_loc_ket_qua(None)
             self.current_tkb_index = -1
             active_busy_times = self._get_active_busy_times()
             self.schedule_view.display_schedule([], self.all_courses, active_busy_times)
@@ -822,14 +1129,33 @@ class MainWindow(QMainWindow):
         self._last_active_busy_times = active_busy_times
 
         self.log_message("Đang tìm kiếm TKB ở chế độ nền...")
+        if self.rang_buoc_tkb:
+            self.log_message("Ràng buộc TKB: " + "; ".join(self.rang_buoc_tkb.mo_ta()))
+        if self.bo_loc_lop:
+            self.log_message("Lọc lớp: " + "; ".join(self.bo_loc_lop.mo_ta()))
         self.statusBar().showMessage("Đang tìm TKB, vui lòng đợi...")
 
+        # Xóa kết quả cũ, kết quả mới sẽ được thêm dần theo từng lô
+        self.danh_sach_tkb_tim_duoc = DanhSachTKB()
+        self.ket_qua_goc = self.danh_sach_tkb_tim_duoc
+        self._dat_lai_loc_ket_qua(None)
+        self._mon_loc = {mon.ma_mon: mon for mon in selected_courses}
+        self.current_tkb_index = -1
+        self.update_tkb_info_label()
+
         # Disable nút để tránh thao tác lặp trong khi đang tìm
         self.find_tkb_btn.setEnabled(False)
         self.prev_tkb_btn.setEnabled(False)
         self.next_tkb_btn.setEnabled(False)
+        self.goto_tkb_btn.setEnabled(False)
         self.save_tkb_btn.setEnabled(False)
         self.clear_tkb_btn.setEnabled(False)
+        self.cancel_tkb_btn.setEnabled(True)
+
+        # Kết quả chế độ "Tốt nhất"/"Pareto" được hiển thị kèm điểm theo tiêu chí lúc tìm
+        che_do = self.search_mode_combo.currentData()
+        co_diem = che_do in (FindTKBThread.CHE_DO_TOT_NHAT, FindTKBThread.CHE_DO_PARETO)
+        self._tieu_chi_ket_qua = self.tieu_chi_tkb if co_diem else None
 
         # Tạo và chạy thread tìm TKB
         self.find_tkb_thread = FindTKBThread(
@@ -838,28 +1164,77 @@ class MainWindow(QMainWindow):
             mandatory_courses,
             self.completed_courses,
             self.all_courses,
+            che_do=che_do,
+            tieu_chi=self.tieu_chi_tkb,
+            rang_buoc=self.rang_buoc_tkb,
+            bo_loc=self.bo_loc_lop,
+            max_results=self.max_results,
+            bo_nho_dem=self.bo_nho_dem_tim_kiem,
             parent=self,
         )
+        self.find_tkb_thread.results_found.connect(self.on_tkb_batch)
+        self.find_tkb_thread.progress.connect(self.on_tkb_progress)
         self.find_tkb_thread.finished.connect(self.on_tkb_found)
         self.find_tkb_thread.finished.connect(self.find_tkb_thread.deleteLater)
         self.find_tkb_thread.start()
 
+    def handle_cancel_find_tkb(self):
+        """Hủy lượt tìm TKB đang chạy; các TKB đã tìm được vẫn được giữ lại"""
+        if self.find_tkb_thread is None or not self.find_tkb_thread.isRunning():
+            return
+        self.find_tkb_thread.cancel()
+        self.cancel_tkb_btn.setEnabled(False)
+        self.log_message("Đang hủy tìm kiếm TKB...")
+        self.statusBar().showMessage("Đang hủy tìm kiếm...")
+
+    def on_tkb_progress(self, so_nut, so_ket_qua, tien_do):
+        """Callback tiến độ từ thread tìm TKB: cập nhật thanh trạng thái"""
+        if self.find_tkb_thread is None or self.find_tkb_thread.huy.da_huy:
+            return
+        self.statusBar().showMessage(
+            f"Đang tìm TKB... {tien_do:.0%} — đã duyệt {so_nut:,} nút, tìm thấy {so_ket_qua} TKB"
+        )
+
+    def on_tkb_batch(self, lo_mau):
+        """
+        Callback khi thread gửi một lô mẫu TKB mới trong lúc tìm kiếm.
+        Hiển thị ngay TKB đầu tiên, các lô sau chỉ cập nhật tổng số (không đổi TKB đang xem).
+        """
+        if self.find_tkb_thread is None:
+            return  # Lô đến muộn sau khi tìm kiếm đã kết thúc
+        la_lo_dau = not self.danh_sach_tkb_tim_duoc
+        self.danh_sach_tkb_tim_duoc.mo_rong(lo_mau)
+        if la_lo_dau:
+            self.show_tkb_at_index(0)
+        else:
+            self.update_tkb_info_label()
+        self.statusBar().showMessage(
+            f"Đang tìm TKB... đã tìm thấy {_so_tkb(self.danh_sach_tkb_tim_duoc)} TKB"
+        )
+        # Cho phép duyệt/lưu TKB đã tìm được, nhưng chưa cho xóa khi thread còn chạy
+        self.update_nav_buttons()
+        self.clear_tkb_btn.setEnabled(False)
+
     def on_tkb_found(self, ket_qua, error_msg, warning_msg):
         """
         Callback khi thread tìm TKB hoàn thành.
         Cập nhật UI và hiển thị kết quả mà không block giao diện.
         """
         # Giải phóng tham chiếu thread
+        thread = self.find_tkb_thread
+        da_huy = thread is not None and thread.huy.da_huy
         self.find_tkb_thread = None
 
         # Re-enable các nút điều khiển
         self.find_tkb_btn.setEnabled(True)
+        self.cancel_tkb_btn.setEnabled(False)
         self.update_nav_buttons()
 
         active_busy_times = self._last_active_busy_times or self._get_active_busy_times()
 
         if error_msg:
             self.danh_sach_tkb_tim_duoc = []
+            self.ket_qua_goc = []
             self.current_tkb_index = -1
             self.log_message(error_msg)
             QMessageBox.warning(self, "Lỗi", error_msg)
@@ -868,22 +1243,45 @@ class MainWindow(QMainWindow):
             self.statusBar().showMessage("Lỗi khi tìm TKB")
             return
 
+        # Danh sách đầy đủ thay thế các lô đã nhận; giữ TKB người dùng đang xem
+        da_tim = self.danh_sach_tkb_tim_duoc
+        if thread is not None and thread.mau_da_tim is not None:
+            da_tim = thread.mau_da_tim
+        if thread is not None and thread.tu_bo_nho_dem:
+            self.log_message("Dùng lại kết quả đã tìm trước đó với cùng các môn, lớp và giờ bận (bộ nhớ đệm).")
         self.danh_sach_tkb_tim_duoc = ket_qua or []
+        self.ket_qua_goc = self.danh_sach_tkb_tim_duoc
+        # Lọc lại trên các TKB đã tìm: KhongGianTKB quá lớn để lọc hết nên chỉ lọc các mẫu đã tìm
+        # trước khi bị cắt bớt; kết quả chế độ Ngẫu nhiên/Tốt nhất/Pareto là danh sách TKB cụ thể
+        if isinstance(ket_qua, DanhSachTKB):
+            nguon = ket_qua
+        elif isinstance(ket_qua, list):
+            nguon = DanhSachTKB.tu_cac_tkb(ket_qua)
+        else:
+            nguon = da_tim if isinstance(da_tim, DanhSachTKB) else None
+        self._dat_lai_loc_ket_qua(nguon if nguon else None)
+        if self.current_tkb_index >= len(self.danh_sach_tkb_tim_duoc):
+            self.current_tkb_index = -1
 
         if not self.danh_sach_tkb_tim_duoc:
-            self.log_message("Không tìm thấy TKB nào phù hợp.")
+            self.log_message("Đã hủy tìm kiếm TKB." if da_huy else "Không tìm thấy TKB nào phù hợp.")
+            if warning_msg and not da_huy:
+                # Gồm giải thích vì sao không có TKB (xem FindTKBThread.run())
+                self.log_message(f"⚠️ {warning_msg}")
             self.schedule_view.display_schedule([], self.all_courses, active_busy_times)
             self.current_tkb_index = -1
             self.update_tkb_info_label()
-            self.statusBar().showMessage("Không tìm thấy TKB phù hợp")
+            self.statusBar().showMessage("Đã hủy tìm kiếm" if da_huy else "Không tìm thấy TKB phù hợp")
         else:
-            self.log_message(f"Tìm thấy {len(self.danh_sach_tkb_tim_duoc)} TKB phù hợp!")
+            self.log_message(f"Tìm thấy {_so_tkb(self.danh_sach_tkb_tim_duoc)} TKB phù hợp!")
             if warning_msg:
                 self.log_message(f"⚠️ {warning_msg}")
-                QMessageBox.information(self, "Thông báo", warning_msg)
-            self.show_tkb_at_index(0)
+                # Người dùng tự hủy thì không cần hộp thoại thông báo
+                if not da_huy:
+                    QMessageBox.information(self, "Thông báo", warning_msg)
+            self.show_tkb_at_index(max(self.current_tkb_index, 0))
             self.statusBar().showMessage(
-                f"Đã tìm xong {len(self.danh_sach_tkb_tim_duoc)} TKB phù hợp"
+                f"Đã tìm xong {_so_tkb(self.danh_sach_tkb_tim_duoc)} TKB phù hợp"
             )
 
         self.update_nav_buttons()
@@ -896,7 +1294,12 @@ class MainWindow(QMainWindow):
         tkb = self.danh_sach_tkb_tim_duoc[index]
         active_busy_times = self._get_active_busy_times()
         self.schedule_view.display_schedule(tkb, self.all_courses, active_busy_times)
-        self.statusBar().showMessage(f"Đang xem TKB {index + 1} / {len(self.danh_sach_tkb_tim_duoc)}")
+        thong_bao = f"Đang xem TKB {index + 1} / {_so_tkb(self.danh_sach_tkb_tim_duoc)}"
+        if self._tieu_chi_ket_qua is not None:
+            diem, chi_tiet = cham_diem_tkb(tkb, self._tieu_chi_ket_qua)
+            thong_bao += (f" — điểm phạt {diem:g} ({chi_tiet['so_ngay']} ngày, "
+                          f"{chi_tiet['tiet_trong']} tiết trống, kết thúc muộn nhất tiết {chi_tiet['ket_thuc_muon']})")
+        self.statusBar().showMessage(thong_bao)
         # Cập nhật label hiển thị số thời khóa biểu
         self.update_tkb_info_label()
 
@@ -914,18 +1317,195 @@ class MainWindow(QMainWindow):
         new_index = (self.current_tkb_index - 1) % len(self.danh_sach_tkb_tim_duoc)
         self.show_tkb_at_index(new_index)
 
+    def _load_tieu_chi(self):
+        """Đọc tiêu chí xếp hạng TKB đã lưu trong QSettings (mặc định của TieuChiTKB nếu chưa có)"""
+        mac_dinh = TieuChiTKB()
+        trong_so = {
+            ten: self.settings.value(f"tieu_chi/{ten}", getattr(mac_dinh, ten), type=float)
+            for ten in ('so_ngay', 'tiet_trong', 'ket_thuc_muon', 'bat_dau_som', 'giao_vien')
+        }
+        uu_tien = self.settings.value("tieu_chi/giao_vien_uu_tien", "", type=str)
+        tranh = self.settings.value("tieu_chi/giao_vien_tranh", "", type=str)
+        return TieuChiTKB(
+            giao_vien_uu_tien=[ten for ten in uu_tien.split(',') if ten.strip()],
+            giao_vien_tranh=[ten for ten in tranh.split(',') if ten.strip()],
+            **trong_so
+        )
+
+    def handle_edit_tieu_chi(self):
+        """Mở dialog chỉnh tiêu chí xếp hạng TKB và lưu lại"""
+        dialog = TieuChiDialog(self.tieu_chi_tkb, self)
+        if not dialog.exec():
+            return
+        self.tieu_chi_tkb = dialog.get_data()
+        for ten in ('so_ngay', 'tiet_trong', 'ket_thuc_muon', 'bat_dau_som', 'giao_vien'):
+            self.settings.setValue(f"tieu_chi/{ten}", getattr(self.tieu_chi_tkb, ten))
+        self.settings.setValue("tieu_chi/giao_vien_uu_tien", ",".join(sorted(self.tieu_chi_tkb.giao_vien_uu_tien)))
+        self.settings.setValue("tieu_chi/giao_vien_tranh", ",".join(sorted(self.tieu_chi_tkb.giao_vien_tranh)))
+        self.log_message("Đã cập nhật tiêu chí xếp hạng TKB.")
+
+    def _load_rang_buoc(self):
+        """Đọc ràng buộc TKB đã lưu trong QSettings (0 / chuỗi rỗng = không ràng buộc)"""
+        def doc_danh_sach(khoa):
+            gia_tri = self.settings.value(f"rang_buoc/{khoa}", "", type=str)
+            return [int(x) for x in gia_tri.split(',') if x.strip()]
+
+        try:
+            return RangBuocTKB(
+                ngay_nghi=doc_danh_sach("ngay_nghi"),
+                tiet_ket_thuc_toi_da=self.settings.value("rang_buoc/tiet_ket_thuc_toi_da", 0, type=int) or None,
+                tiet_nghi=doc_danh_sach("tiet_nghi"),
+                so_ngay_toi_da=self.settings.value("rang_buoc/so_ngay_toi_da", 0, type=int) or None,
+                so_tiet_lien_tiep_toi_da=self.settings.value("rang_buoc/so_tiet_lien_tiep_toi_da", 0, type=int) or None,
+            )
+        except (ValueError, ValidationError):
+            # Dữ liệu lưu bị hỏng: bỏ qua, dùng lại không ràng buộc
+            return RangBuocTKB()
+
+    def handle_edit_rang_buoc(self):
+        """Mở dialog chỉnh ràng buộc TKB và lưu lại"""
+        dialog = RangBuocDialog(self.rang_buoc_tkb, self)
+        if not dialog.exec():
+            return
+        self.rang_buoc_tkb = dialog.get_data()
+        self.settings.setValue("rang_buoc/ngay_nghi", ",".join(map(str, self.rang_buoc_tkb.ngay_nghi)))
+        self.settings.setValue("rang_buoc/tiet_ket_thuc_toi_da", self.rang_buoc_tkb.tiet_ket_thuc_toi_da or 0)
+        self.settings.setValue("rang_buoc/tiet_nghi", ",".join(map(str, self.rang_buoc_tkb.tiet_nghi)))
+        self.settings.setValue("rang_buoc/so_ngay_toi_da", self.rang_buoc_tkb.so_ngay_toi_da or 0)
+        self.settings.setValue("rang_buoc/so_tiet_lien_tiep_toi_da", self.rang_buoc_tkb.so_tiet_lien_tiep_toi_da or 0)
+        mo_ta = self.rang_buoc_tkb.mo_ta()
+        self.log_message("Đã cập nhật ràng buộc TKB: " + ("; ".join(mo_ta) if mo_ta else "không ràng buộc") + ".")
+
+    def handle_edit_bo_loc(self):
+        """Mở dialog lọc lớp cho các lượt tìm TKB tiếp theo"""
+        dialog = LocLopDialog(self.bo_loc_lop, self)
+        if not dialog.exec():
+            return
+        self.bo_loc_lop = dialog.get_data()
+        mo_ta = self.bo_loc_lop.mo_ta()
+        self.log_message("Đã cập nhật bộ lọc lớp: " + ("; ".join(mo_ta) if mo_ta else "không lọc") + ".")
+
+    def handle_edit_max_results(self):
+        """Đặt số mẫu TKB tối đa giữ lại khi tìm theo thứ tự và lưu lại"""
+        so_luong, ok = QInputDialog.getInt(
+            self, "Giới hạn số TKB",
+            f"Số TKB (khác nhau về giờ học) tối đa khi tìm theo thứ tự (1 - {MAX_RESULTS_LIMIT:,}):",
+            self.max_results, 1, MAX_RESULTS_LIMIT,
+        )
+        if not ok:
+            return
+        self.max_results = so_luong
+        self.settings.setValue("max_results", so_luong)
+        self.log_message(f"Đã đặt giới hạn {so_luong:,} TKB cho các lượt tìm theo thứ tự.")
+
+    def handle_goto_tkb(self):
+        """Nhảy tới TKB theo số thứ tự (kết quả là KhongGianTKB thì giải mã trực tiếp, không cần liệt kê)"""
+        if not self.danh_sach_tkb_tim_duoc:
+            return
+        # QInputDialog.getInt chỉ nhận số nguyên 32-bit
+        so_toi_da = min(len(self.danh_sach_tkb_tim_duoc), 2**31 - 1)
+        so_thu_tu, ok = QInputDialog.getInt(
+            self, "Đi tới TKB", f"Số thứ tự TKB (1 - {so_toi_da:,}):",
+            max(self.current_tkb_index, 0) + 1, 1, so_toi_da,
+        )
+        if ok:
+            self.show_tkb_at_index(so_thu_tu - 1)
+
+    def _dat_lai_loc_ket_qua(self, nguon):
+        """
+        Đưa thanh lọc kết quả về mặc định.
+        nguon: DanhSachTKB các TKB đã tìm dùng để lọc lại (None = chưa có kết quả, tắt thanh lọc)
+        """
+        self._nguon_loc = nguon
+        cac_combo = (self.loc_ngay_nghi_combo, self.loc_so_ngay_combo, self.loc_ket_thuc_combo,
+                     self.loc_mon_combo, self.loc_giao_vien_combo, self.sap_xep_combo)
+        for combo in cac_combo:
+            combo.blockSignals(True)
+            combo.setCurrentIndex(0)
+            combo.setEnabled(nguon is not None)
+        self.loc_mon_combo.clear()
+        self.loc_mon_combo.addItem("Môn: tất cả", None)
+        if nguon is not None:
+            for ma_mon, mon in self._mon_loc.items():
+                self.loc_mon_combo.addItem(f"{ma_mon} - {mon.ten_mon}", ma_mon)
+        self.loc_giao_vien_combo.clear()
+        self.loc_giao_vien_combo.addItem("Giáo viên: bất kỳ", None)
+        self.loc_giao_vien_combo.setEnabled(False)
+        for combo in cac_combo:
+            combo.blockSignals(False)
+
+    def handle_loc_mon_changed(self):
+        """Chọn môn trên thanh lọc kết quả: liệt kê các giáo viên dạy môn đó rồi lọc lại"""
+        ma_mon = self.loc_mon_combo.currentData()
+        self.loc_giao_vien_combo.blockSignals(True)
+        self.loc_giao_vien_combo.clear()
+        self.loc_giao_vien_combo.addItem("Giáo viên: bất kỳ", None)
+        mon = self._mon_loc.get(ma_mon)
+        if mon is not None:
+            cac_giao_vien = {chuan_hoa_ten_giao_vien(lop.ten_giao_vien)
+                             for lop in mon.cac_lop_hoc if lop.ten_giao_vien}
+            for ten in sorted(cac_giao_vien):
+                self.loc_giao_vien_combo.addItem(ten, ten)
+        self.loc_giao_vien_combo.setEnabled(mon is not None)
+        self.loc_giao_vien_combo.blockSignals(False)
+        self.handle_refine_results()
+
+    def handle_refine_results(self):
+        """Lọc/sắp xếp lại các TKB đã tìm theo thanh lọc kết quả (không cần tìm lại)"""
+        if self._nguon_loc is None:
+            return
+        thu = self.loc_ngay_nghi_combo.currentData()
+        rang_buoc = RangBuocTKB(
+            ngay_nghi=(thu,) if thu is not None else (),
+            tiet_ket_thuc_toi_da=self.loc_ket_thuc_combo.currentData(),
+            so_ngay_toi_da=self.loc_so_ngay_combo.currentData(),
+        )
+        ma_mon = self.loc_mon_combo.currentData()
+        giao_vien = self.loc_giao_vien_combo.currentData()
+        bo_loc = BoLocLop(chi_giao_vien={ma_mon: [giao_vien]}) if ma_mon and giao_vien else BoLocLop()
+        ten_sap_xep, sap_xep_theo = CAC_CACH_SAP_XEP[self.sap_xep_combo.currentIndex()]
+
+        if not rang_buoc and not bo_loc and not sap_xep_theo:
+            self.danh_sach_tkb_tim_duoc = self.ket_qua_goc
+            self.log_message(f"Đã bỏ lọc kết quả: {_so_tkb(self.danh_sach_tkb_tim_duoc):,} TKB.")
+        else:
+            bat_dau = time.perf_counter()
+            self.danh_sach_tkb_tim_duoc = loc_ket_qua(self._nguon_loc, rang_buoc, bo_loc, sap_xep_theo)
+            thoi_gian = (time.perf_counter() - bat_dau) * 1000
+            mo_ta = rang_buoc.mo_ta() + bo_loc.mo_ta()
+            if sap_xep_theo:
+                mo_ta.append(f"sắp xếp: {ten_sap_xep.lower()}")
+            thong_bao = (f"Lọc kết quả ({'; '.join(mo_ta)}): còn {_so_tkb(self.danh_sach_tkb_tim_duoc):,} / "
+                         f"{_so_tkb(self._nguon_loc):,} TKB ({thoi_gian:.0f} ms)")
+            if self._nguon_loc is not self.ket_qua_goc and not isinstance(self.ket_qua_goc, list):
+                thong_bao += f", chỉ trong {self._nguon_loc.so_mau:,} kiểu giờ học đã tìm trước khi bị cắt bớt"
+            self.log_message(thong_bao + ".")
+
+        self.current_tkb_index = -1
+        if self.danh_sach_tkb_tim_duoc:
+            self.show_tkb_at_index(0)
+        else:
+            self.schedule_view.display_schedule([], self.all_courses, self._get_active_busy_times())
+            self.update_tkb_info_label()
+            self.statusBar().showMessage("Không có TKB nào thỏa điều kiện lọc")
+        self.update_nav_buttons()
+
     def update_nav_buttons(self):
         """Cập nhật trạng thái các nút điều hướng"""
         has_results = len(self.danh_sach_tkb_tim_duoc) > 0
         has_current_tkb = has_results and self.current_tkb_index >= 0
         self.prev_tkb_btn.setEnabled(has_results)
         self.next_tkb_btn.setEnabled(has_results)
+        self.goto_tkb_btn.setEnabled(has_results)
         self.save_tkb_btn.setEnabled(has_results)
         self.clear_tkb_btn.setEnabled(has_results)
 
     def handle_clear_tkb(self):
         """Xóa kết quả tìm kiếm TKB"""
         self.danh_sach_tkb_tim_duoc = []
+        self.ket_qua_goc = []
+        self._dat_lai_loc_ket_qua(None)
+        self._tieu_chi_ket_qua = None
         self.current_tkb_index = -1
         active_busy_times = self._get_active_busy_times()
         self.schedule_view.display_schedule([], self.all_courses, active_busy_times)
@@ -1151,6 +1731,9 @@ class MainWindow(QMainWindow):
             
             # Hiển thị TKB đã import
             self.danh_sach_tkb_tim_duoc = [imported_classes]
+            self.ket_qua_goc = self.danh_sach_tkb_tim_duoc
+            self._dat_lai_loc_ket_qua(None)
+            self._tieu_chi_ket_qua = None
             self.current_tkb_index = 0
             active_busy_times = self._get_active_busy_times()
             self.schedule_view.display_schedule(imported_classes, self.all_courses, active_busy_times)
@@ -1176,8 +1759,13 @@ class MainWindow(QMainWindow):
             self.tkb_info_label.setText("Chưa có thời khóa biểu")
         else:
             current = self.current_tkb_index + 1
-            total = len(self.danh_sach_tkb_tim_duoc)
-            self.tkb_info_label.setText(f"Thời khóa biểu: {current}/{total}")
+            total = _so_tkb(self.danh_sach_tkb_tim_duoc)
+            text = f"Thời khóa biểu: {current}/{total}"
+            # Kết quả tìm kiếm gom các TKB chỉ khác lớp cùng giờ học thành một mẫu
+            so_mau = getattr(self.danh_sach_tkb_tim_duoc, 'so_mau', total)
+            if so_mau < total:
+                text += f" ({so_mau} kiểu giờ học)"
+            self.tkb_info_label.setText(text)
 
     def handle_show_course_classes(self, mon_hoc):
         """Hiển thị dialog các lớp học của môn học"""